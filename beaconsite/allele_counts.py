@@ -0,0 +1,97 @@
+"""Maintenance of the precomputed allele counts for answering beacon queries.
+
+The ``AlleleCount`` table holds the allele counts summed over the latest small variant sets of the cases in
+each project, see ``variants.variant_set_counts`` for how they are maintained.
+"""
+
+from django.conf import settings
+from sqlalchemy import and_, func, literal, select, tuple_
+
+from variants.models import Case, SmallVariant
+from variants.variant_set_counts import VariantSetCounts
+from .models import AlleleCount, AlleleCountVariantSet
+
+#: The columns identifying an allele.
+ALLELE_COLUMNS = ("release", "chromosome", "start", "reference", "alternative")
+
+#: The count columns.
+COUNT_COLUMNS = ("num_hom_alt", "num_het", "num_hemi_alt")
+
+
+class AlleleCounts(VariantSetCounts):
+    """The allele counts of the variants in the latest small variant sets of the cases in each project."""
+
+    title = "beacon allele counts"
+    model = AlleleCount
+    counted_model = AlleleCountVariantSet
+    key_columns = ("project_id",) + ALLELE_COLUMNS
+    count_columns = COUNT_COLUMNS
+
+    def is_enabled(self):
+        return settings.VARFISH_ENABLE_BEACON_SITE
+
+    def counts_stmt(self, variant_set):
+        """Return statement that sums the allele counts of the variants in ``variant_set``."""
+        return (
+            select(
+                [literal(variant_set.case.project_id).label("project_id")]
+                + [getattr(SmallVariant.sa, name) for name in ALLELE_COLUMNS]
+                + [func.sum(getattr(SmallVariant.sa, name)).label(name) for name in COUNT_COLUMNS]
+            )
+            .select_from(SmallVariant.sa)
+            .where(
+                and_(
+                    SmallVariant.sa.case_id == variant_set.case_id,
+                    SmallVariant.sa.set_id == variant_set.id,
+                )
+            )
+            .group_by(*[getattr(SmallVariant.sa, name) for name in ALLELE_COLUMNS])
+        )
+
+
+#: The beacon allele counts.
+ALLELE_COUNTS = AlleleCounts()
+
+add_variant_set_allele_counts = ALLELE_COUNTS.add_variant_set
+remove_variant_set_allele_counts = ALLELE_COUNTS.remove_variant_set
+remove_case_allele_counts = ALLELE_COUNTS.remove_case
+
+
+def rebuild_allele_counts(engine, project=None):
+    """Recompute the allele counts from the latest variant sets of the cases in ``project`` or all projects."""
+    counts = AlleleCount.objects.all()
+    counted = AlleleCountVariantSet.objects.all()
+    cases = Case.objects.filter(latest_variant_set__state="active")
+    if project:
+        counts = counts.filter(project=project)
+        counted = counted.filter(variant_set__case__project=project)
+        cases = cases.filter(project=project)
+    ALLELE_COUNTS.rebuild(
+        engine,
+        (case.latest_variant_set for case in cases.select_related("latest_variant_set__case")),
+        counts=counts,
+        counted=counted,
+    )
+
+
+def query_allele_counts(engine, alleles, projects):
+    """Return ``dict`` mapping each of ``alleles`` to its summed counts in ``projects``.
+
+    ``alleles`` are tuples of the values in ``ALLELE_COLUMNS`` and the counts are tuples of the values in
+    ``COUNT_COLUMNS``.  Alleles without carriers are not contained in the result.
+    """
+    alleles = list(set(alleles))
+    project_ids = [project.pk for project in projects]
+    if not alleles or not project_ids:
+        return {}
+    table = AlleleCount.sa.table
+    allele_cols = [table.c[name] for name in ALLELE_COLUMNS]
+    stmt = (
+        select(allele_cols + [func.sum(table.c[name]).label(name) for name in COUNT_COLUMNS])
+        .where(and_(table.c.project_id.in_(project_ids), tuple_(*allele_cols).in_(alleles)))
+        .group_by(*allele_cols)
+    )
+    return {
+        tuple(row[name] for name in ALLELE_COLUMNS): tuple(row[name] for name in COUNT_COLUMNS)
+        for row in engine.execute(stmt)
+    }
@@ -0,0 +1,41 @@
+"""Django command for rebuilding the precomputed beacon allele counts."""
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from projectroles.models import Project
+from variants.helpers import get_engine
+from beaconsite.allele_counts import rebuild_allele_counts
+
+
+class Command(BaseCommand):
+    """Implementation of rebuilding the beacon allele counts.
+
+    All steps are executed in a transaction, so no stale state is used or left in the database.
+    """
+
+    #: Help message displayed on the command line.
+    help = "Rebuild the allele counts used for answering beacon queries."
+
+    def add_arguments(self, parser):
+        """Add the command's argument to the ``parser``."""
+        parser.add_argument(
+            "--project-uuid", help="UUID of the project to rebuild the counts for, default is all"
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        """Perform rebuilding the allele counts."""
+        project = None
+        if options["project_uuid"]:
+            project = self._get_project(options["project_uuid"])
+        rebuild_allele_counts(get_engine(), project)
+        self.stdout.write(self.style.SUCCESS("Done rebuilding beacon allele counts"))
+
+    def _get_project(self, project_uuid):
+        """Get query or raise appropriate exception."""
+        try:
+            return Project.objects.get(sodar_uuid=project_uuid)
+        except ObjectDoesNotExist:
+            raise CommandError("Project with UUID {} does not exist".format(project_uuid))
@@ -0,0 +1,81 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("variants", "0087_export_file_job_result_file"),
+        ("projectroles", "0020_project_has_public_children"),
+        ("beaconsite", "0004_auto_20210309_1517"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AlleleCountVariantSet",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "variant_set",
+                    models.OneToOneField(
+                        help_text="The counted variant set",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="variants.smallvariantset",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="AlleleCount",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("release", models.CharField(help_text="Variant genome release", max_length=32)),
+                ("chromosome", models.CharField(help_text="Variant chromosome", max_length=32)),
+                ("start", models.IntegerField(help_text="Variant 1-based start position")),
+                (
+                    "reference",
+                    models.CharField(help_text="Variant reference allele", max_length=512),
+                ),
+                (
+                    "alternative",
+                    models.CharField(help_text="Variant alternative allele", max_length=512),
+                ),
+                (
+                    "num_hom_alt",
+                    models.IntegerField(default=0, help_text="Number of hom. alt. carriers"),
+                ),
+                ("num_het", models.IntegerField(default=0, help_text="Number of het. carriers")),
+                (
+                    "num_hemi_alt",
+                    models.IntegerField(default=0, help_text="Number of hemi. alt. carriers"),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        help_text="Project of the cases",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="projectroles.project",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {
+                    ("release", "chromosome", "start", "reference", "alternative", "project")
+                },
+            },
+        ),
+    ]
@@ -1,9 +1,12 @@
 import hashlib
+import time
 import uuid as uuid_object
 
 from Crypto.PublicKey import RSA
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
 from django.urls import reverse
 from projectroles.models import Project
@@ -320,3 +323,64 @@ class Response(models.Model):
     )
     http_header = models.TextField(null=False, help_text="HTTP request header content")
     http_body = models.TextField(null=True, blank=True, help_text="HTTP request body content")
+
+
+#: Number of seconds that the local ``Site`` is cached in each process.
+LOCAL_SITE_CACHE_TIMEOUT = 60
+
+#: Cached local ``Site`` and the time of caching, if any.
+_local_site_cache = {}
+
+
+def get_local_site():
+    """Return the local ``Site``, cached for ``LOCAL_SITE_CACHE_TIMEOUT`` seconds."""
+    site, cached_at = _local_site_cache.get("site", (None, None))
+    now = time.monotonic()
+    if site is None or now - cached_at > LOCAL_SITE_CACHE_TIMEOUT:
+        site = Site.objects.get(role=Site.LOCAL)
+        _local_site_cache["site"] = (site, now)
+    return site
+
+
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def clear_local_site_cache(sender, instance, **_kwargs):
+    _local_site_cache.clear()
+
+
+class AlleleCount(models.Model):
+    """Summed allele counts of the small variants of the cases in a project.
+
+    The counts are kept up to date on import and deletion of variants (see ``allele_counts``), such that beacon
+    queries can be answered with an index lookup.
+    """
+
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, related_name="+", help_text="Project of the cases"
+    )
+
+    release = models.CharField(max_length=32, help_text="Variant genome release")
+    chromosome = models.CharField(max_length=32, help_text="Variant chromosome")
+    start = models.IntegerField(help_text="Variant 1-based start position")
+    reference = models.CharField(max_length=512, help_text="Variant reference allele")
+    alternative = models.CharField(max_length=512, help_text="Variant alternative allele")
+
+    num_hom_alt = models.IntegerField(default=0, help_text="Number of hom. alt. carriers")
+    num_het = models.IntegerField(default=0, help_text="Number of het. carriers")
+    num_hemi_alt = models.IntegerField(default=0, help_text="Number of hemi. alt. carriers")
+
+    class Meta:
+        unique_together = (
+            ("release", "chromosome", "start", "reference", "alternative", "project"),
+        )
+
+
+class AlleleCountVariantSet(models.Model):
+    """Small variant set whose variants are counted in ``AlleleCount``."""
+
+    variant_set = models.OneToOneField(
+        "variants.SmallVariantSet",
+        on_delete=models.CASCADE,
+        related_name="+",
+        help_text="The counted variant set",
+    )
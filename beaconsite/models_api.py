@@ -48,6 +48,18 @@ class BeaconAlleleResponse:
     error: typing.Optional[Error] = None
 
 
+@attr.s(frozen=True, auto_attribs=True)
+class BeaconAlleleBatchRequest:
+    alleleRequests: typing.List[BeaconAlleleRequest]
+
+
+@attr.s(frozen=True, auto_attribs=True)
+class BeaconAlleleBatchResponse:
+    beaconId: str
+    apiVersion: str
+    alleleResponses: typing.List[BeaconAlleleResponse]
+
+
 @attr.s(frozen=True, auto_attribs=True)
 class Organisation:
     id: str
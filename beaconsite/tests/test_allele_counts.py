@@ -0,0 +1,122 @@
+"""Tests for ``beaconsite.allele_counts``."""
+
+from test_plus.test import TestCase
+
+from variants.helpers import get_engine
+from variants.models import DeleteCase
+from variants.tests.factories import (
+    CaseWithVariantSetFactory,
+    DeleteCaseBgJobFactory,
+    ProjectFactory,
+    SmallVariantFactory,
+)
+from ..allele_counts import (
+    add_variant_set_allele_counts,
+    query_allele_counts,
+    rebuild_allele_counts,
+    remove_case_allele_counts,
+    remove_variant_set_allele_counts,
+)
+from ..models import AlleleCount, AlleleCountVariantSet
+
+
+def allele_key(small_var):
+    return (
+        small_var.release,
+        small_var.chromosome,
+        small_var.start,
+        small_var.reference,
+        small_var.alternative,
+    )
+
+
+def allele_counts():
+    return {
+        (c.project_id,)
+        + (c.release, c.chromosome, c.start, c.reference, c.alternative): (
+            c.num_hom_alt,
+            c.num_het,
+            c.num_hemi_alt,
+        )
+        for c in AlleleCount.objects.all()
+    }
+
+
+class TestAlleleCounts(TestCase):
+    def setUp(self):
+        self.project = ProjectFactory()
+        self.case1, self.variant_set1 = self._create_case()
+        self.case2, self.variant_set2 = self._create_case()
+        self.shared = allele_key(self.variant_set1.small_vars[0])
+
+    def _create_case(self):
+        case, variant_set, _ = CaseWithVariantSetFactory.get(
+            "small", project=self.project, structure="trio"
+        )
+        variant_set.small_vars = [
+            SmallVariantFactory(
+                variant_set=variant_set, chromosome="1", start=start, reference="A", alternative="G"
+            )
+            for start in (1000, 2000 + case.pk)
+        ]
+        return case, variant_set
+
+    def test_add_variant_set(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set1)
+        add_variant_set_allele_counts(get_engine(), self.variant_set2)
+        # Adding a variant set twice does not change the counts.
+        add_variant_set_allele_counts(get_engine(), self.variant_set2)
+
+        self.assertEqual(AlleleCount.objects.count(), 3)
+        self.assertEqual(AlleleCountVariantSet.objects.count(), 2)
+        self.assertEqual(
+            query_allele_counts(get_engine(), [self.shared], [self.project])[self.shared][1], 2
+        )
+
+    def test_remove_variant_set(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set1)
+        add_variant_set_allele_counts(get_engine(), self.variant_set2)
+
+        remove_variant_set_allele_counts(get_engine(), self.variant_set2)
+
+        self.assertEqual(AlleleCount.objects.count(), 2)
+        self.assertEqual(
+            query_allele_counts(get_engine(), [self.shared], [self.project])[self.shared][1], 1
+        )
+        self.assertEqual(
+            list(AlleleCountVariantSet.objects.values_list("variant_set", flat=True)),
+            [self.variant_set1.pk],
+        )
+
+    def test_remove_case(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set1)
+        add_variant_set_allele_counts(get_engine(), self.variant_set2)
+
+        remove_case_allele_counts(get_engine(), self.case1)
+        remove_case_allele_counts(get_engine(), self.case2)
+
+        self.assertEqual(AlleleCount.objects.count(), 0)
+        self.assertEqual(AlleleCountVariantSet.objects.count(), 0)
+
+    def test_delete_case(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set1)
+        add_variant_set_allele_counts(get_engine(), self.variant_set2)
+
+        self.case2.delete()
+        DeleteCase(DeleteCaseBgJobFactory(case=self.case1, user=self.make_user())).run()
+
+        self.assertEqual(AlleleCount.objects.count(), 0)
+
+    def test_rebuild(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set1)
+        add_variant_set_allele_counts(get_engine(), self.variant_set2)
+        counts = allele_counts()
+
+        rebuild_allele_counts(get_engine())
+
+        self.assertEqual(allele_counts(), counts)
+        self.assertEqual(AlleleCountVariantSet.objects.count(), 2)
+
+    def test_query_other_project(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set1)
+        self.assertEqual(query_allele_counts(get_engine(), [self.shared], [ProjectFactory()]), {})
@@ -1,9 +1,14 @@
+import json
+
 import cattr
 from django.shortcuts import reverse
+from django.test import override_settings
 
-from variants.tests.factories import SmallVariantFactory
+from variants.helpers import get_engine
+from variants.tests.factories import CaseWithVariantSetFactory, SmallVariantFactory
 from variants.tests.helpers import ApiViewTestBase
 from .test_permissions_api import AcceptHeaderMixin
+from ..allele_counts import add_variant_set_allele_counts
 from ..models import Site
 from .factories import ConsortiumWithLocalAndRemoteSiteFactory, ConsortiumAssignmentFactory
 from ..models_api import BeaconAlleleRequest
@@ -86,3 +91,68 @@ class TestBeaconQueryApiView(AcceptHeaderMixin, ApiViewTestBase):
                 "exists": False,
             },
         )
+
+
+class TestBeaconQueryBatchApiView(AcceptHeaderMixin, ApiViewTestBase):
+    def setUp(self):
+        super().setUp()
+        self.consortium = ConsortiumWithLocalAndRemoteSiteFactory()
+        self.local_site = Site.objects.get(role=Site.LOCAL)
+        self.remote_site = Site.objects.get(role=Site.REMOTE)
+        ConsortiumAssignmentFactory(
+            consortium=self.consortium, project=self.project,
+        )
+        _, variant_set, _ = CaseWithVariantSetFactory.get("small", project=self.project)
+        self.small_variants = SmallVariantFactory.create_batch(2, variant_set=variant_set)
+        add_variant_set_allele_counts(get_engine(), variant_set)
+        self.beacon_allele_requests = [
+            BeaconAlleleRequest(
+                assemblyId=small_variant.release,
+                referenceName=small_variant.chromosome,
+                start=small_variant.start,
+                referenceBases=small_variant.reference,
+                alternateBases=small_variant.alternative,
+            )
+            for small_variant in self.small_variants
+        ] + [
+            BeaconAlleleRequest(referenceName="1", referenceBases="A", start=1, alternateBases="C")
+        ]
+
+    def _post(self, allele_requests):
+        with self.login(self.superuser):
+            extra = self.get_accept_header(None, None)
+            return self.client.post(
+                reverse("beaconsite:beacon-api-query-batch"),
+                json.dumps({"alleleRequests": cattr.unstructure(allele_requests)}),
+                content_type="application/json",
+                **extra,
+            )
+
+    def test_query_batch(self):
+        response = self._post(self.beacon_allele_requests)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "beaconId": self.local_site.identifier,
+                "apiVersion": "v1.0.0",
+                "alleleResponses": [
+                    {
+                        "alleleRequest": cattr.unstructure(allele_request),
+                        "apiVersion": "v1.0.0",
+                        "beaconId": self.local_site.identifier,
+                        "datasetAlleleResponse": None,
+                        "error": None,
+                        "exists": exists,
+                    }
+                    for allele_request, exists in zip(
+                        self.beacon_allele_requests, (True, True, False)
+                    )
+                ],
+            },
+        )
+
+    @override_settings(VARFISH_BEACON_BATCH_MAX_ALLELES=2)
+    def test_query_batch_too_many_alleles(self):
+        response = self._post(self.beacon_allele_requests)
+        self.assertEqual(response.status_code, 400)
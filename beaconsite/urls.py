@@ -68,6 +68,11 @@ beacon_api_urlpatterns = [
         view=views_api.BeaconQueryApiView.as_view(),
         name="beacon-api-query",
     ),
+    url(
+        regex=r"^endpoint/query/batch/?$",
+        view=views_api.BeaconQueryBatchApiView.as_view(),
+        name="beacon-api-query-batch",
+    ),
 ]
 
 urlpatterns = ui_urlpatterns + ajax_urlpatterns + beacon_api_urlpatterns
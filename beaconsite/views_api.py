@@ -1,6 +1,7 @@
 import re
 
 import cattr
+from django.conf import settings
 from django.utils import timezone
 from django.utils.http import parse_http_date
 from httpsig import HeaderVerifier
@@ -8,11 +9,10 @@ from rest_framework.permissions import BasePermission
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import exceptions, authentication
-from sqlalchemy import select, and_
 
 from variants.helpers import get_engine
-from variants.models import Case, SmallVariant
-from .models import Site
+from .allele_counts import query_allele_counts
+from .models import Site, get_local_site
 from .models_api import (
     BeaconInfo,
     Dataset,
@@ -20,6 +20,8 @@ from .models_api import (
     BeaconAlleleRequest,
     API_VERSION,
     BeaconAlleleResponse,
+    BeaconAlleleBatchRequest,
+    BeaconAlleleBatchResponse,
 )
 
 
@@ -160,7 +162,7 @@ class BeaconInfoApiView(APIView):
         sites can query.
         """
         remote_site = request.user
-        local_site = Site.objects.get(role=Site.LOCAL)
+        local_site = get_local_site()
         if local_site.state != Site.ENABLED:
             return (
                 Response({"detail": "The site is not enabled!"}, status=400, reason="invalid site"),
@@ -190,6 +192,20 @@ class BeaconInfoApiView(APIView):
         return Response(cattr.unstructure(result))
 
 
+def _query_alleles_exist(allele_reqs, remote_site):
+    """Return ``list`` with whether each of ``allele_reqs`` is present in the projects of ``remote_site``."""
+    keys = [
+        (req.assemblyId, req.referenceName, req.start, req.referenceBases, req.alternateBases)
+        for req in allele_reqs
+    ]
+    counts = query_allele_counts(get_engine(), keys, remote_site.get_all_projects())
+    result = []
+    for key in keys:
+        num_hom_alt, num_het, num_hemi_alt = counts.get(key, (0, 0, 0))
+        result.append(num_hom_alt * 2 + num_het + num_hemi_alt > 0)
+    return result
+
+
 class BeaconQueryApiView(APIView):
     """Implementation of the GA4GH query endpoint."""
 
@@ -210,48 +226,63 @@ class BeaconQueryApiView(APIView):
         sites can query.
         """
         allele_req = cattr.structure(dict(params.items()), BeaconAlleleRequest)
-        remote_site = request.user
-        # TODO: perform one large query only
-        project_pks = [p.pk for p in remote_site.get_all_projects()]
-        result = (
-            select(
-                [SmallVariant.sa.num_hom_alt, SmallVariant.sa.num_het, SmallVariant.sa.num_hemi_alt]
-            )
-            .select_from(SmallVariant.sa)
-            .where(
-                and_(
-                    SmallVariant.sa.case_id.in_(
-                        select([Case.sa.id])
-                        .select_from(Case.sa)
-                        .where(Case.sa.project_id.in_(project_pks))
-                    ),
-                    SmallVariant.sa.release == allele_req.assemblyId,
-                    SmallVariant.sa.chromosome == allele_req.referenceName,
-                    SmallVariant.sa.start == allele_req.start,
-                    SmallVariant.sa.reference == allele_req.referenceBases,
-                    SmallVariant.sa.alternative == allele_req.alternateBases,
-                )
-            )
-        )
-        sum_hom_alt = 0
-        sum_het_alt = 0
-        sum_hemi_alt = 0
-        for row in get_engine().execute(result):
-            sum_hom_alt += row.num_hom_alt
-            sum_het_alt += row.num_het
-            sum_hemi_alt += row.num_hemi_alt
-        total_alleles = sum_hom_alt * 2 + sum_het_alt + sum_hemi_alt
-
-        site = Site.objects.get(role=Site.LOCAL)
+        site = get_local_site()
         if site.state != Site.ENABLED:
-            return (
-                Response({"detail": "The site is not enabled!"}, status=400, reason="invalid site"),
+            return Response(
+                {"detail": "The site is not enabled!"}, status=400, reason="invalid site"
             )
 
         result = BeaconAlleleResponse(
             beaconId=site.identifier,
             apiVersion=API_VERSION,
-            exists=(total_alleles > 0),
+            exists=_query_alleles_exist([allele_req], request.user)[0],
             alleleRequest=allele_req,
         )
         return Response(cattr.unstructure(result))
+
+
+class BeaconQueryBatchApiView(APIView):
+    """Query endpoint for many alleles at once.
+
+    Expects a JSON body with ``alleleRequests``, a list of GA4GH Beacon allele requests, and responds with a list
+    of GA4GH Beacon allele responses in ``alleleResponses``.
+    """
+
+    authentication_classes = (_SignedSiteAuthentication,)
+    permission_classes = (_SiteBeaconPermission, _RequestAgeAcceptable)
+    http_method_names = ("post",)
+
+    def post(self, request, *_args, **_kwargs):
+        try:
+            batch_req = cattr.structure(request.data, BeaconAlleleBatchRequest)
+        except (KeyError, TypeError, ValueError) as e:
+            return Response({"detail": "Invalid batch request: %s" % e}, status=400)
+        if len(batch_req.alleleRequests) > settings.VARFISH_BEACON_BATCH_MAX_ALLELES:
+            return Response(
+                {
+                    "detail": "Too many alleles in batch request (maximum is %d)"
+                    % settings.VARFISH_BEACON_BATCH_MAX_ALLELES
+                },
+                status=400,
+            )
+        site = get_local_site()
+        if site.state != Site.ENABLED:
+            return Response(
+                {"detail": "The site is not enabled!"}, status=400, reason="invalid site"
+            )
+
+        exists = _query_alleles_exist(batch_req.alleleRequests, request.user)
+        result = BeaconAlleleBatchResponse(
+            beaconId=site.identifier,
+            apiVersion=API_VERSION,
+            alleleResponses=[
+                BeaconAlleleResponse(
+                    beaconId=site.identifier,
+                    apiVersion=API_VERSION,
+                    exists=allele_exists,
+                    alleleRequest=allele_req,
+                )
+                for allele_req, allele_exists in zip(batch_req.alleleRequests, exists)
+            ],
+        )
+        return Response(cattr.unstructure(result))
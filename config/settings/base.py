@@ -507,6 +507,35 @@ FIELD_ENCRYPTION_KEY = env.str(
 
 # Number of cases to perform in one query for joint queries.
 QUERY_MAX_UNION = env.int("VARFISH_QUERY_MAX_UNION", 20)
+# Number of rows to fetch at a time from server-side cursors when streaming query results.
+QUERY_STREAM_FETCH_SIZE = env.int("VARFISH_QUERY_STREAM_FETCH_SIZE", 1000)
+# Number of threads (and thus database connections) for running the chunks of joint queries.
+QUERY_MAX_WORKERS = env.int("VARFISH_QUERY_MAX_WORKERS", 4)
+# Number of built query statements to cache per process, 0 to disable.
+QUERY_STATEMENT_CACHE_SIZE = env.int("VARFISH_QUERY_STATEMENT_CACHE_SIZE", 256)
+# Number of query results from which on they are stored with COPY instead of the Django ORM.
+QUERY_RESULTS_COPY_THRESHOLD = env.int("VARFISH_QUERY_RESULTS_COPY_THRESHOLD", 1000)
+# Number of threads for reading and rewriting the TSV files of one table during variant import.
+VARFISH_IMPORT_MAX_WORKERS = env.int("VARFISH_IMPORT_MAX_WORKERS", 4)
+# Number of threads (and thus database connections) for generating the per-chromosome shards of
+# project-wide file exports.
+VARFISH_EXPORT_MAX_WORKERS = env.int("VARFISH_EXPORT_MAX_WORKERS", 4)
+# Number of primary keys to delete at a time when purging variant sets and cases.
+VARFISH_PURGE_BATCH_SIZE = env.int("VARFISH_PURGE_BATCH_SIZE", 10000)
+# Seconds to pause between the batches when purging variant sets and cases.
+VARFISH_PURGE_BATCH_PAUSE = env.float("VARFISH_PURGE_BATCH_PAUSE", 0.1)
+# Truncate partitions that only contain the rows to purge instead of deleting the rows.
+VARFISH_PURGE_TRUNCATE_PARTITIONS = env.bool("VARFISH_PURGE_TRUNCATE_PARTITIONS", False)
+# Fill the typed genotype columns of small variants on import and use them in the genotype filters.
+VARFISH_GENOTYPE_COLUMNS = env.bool("VARFISH_GENOTYPE_COLUMNS", True)
+# Cache the gene information of the variant details until a new release of the gene tables is imported.
+VARFISH_GENE_INFO_CACHE = env.bool("VARFISH_GENE_INFO_CACHE", True)
+# Number of gene information entries to keep in the cache of each process.
+VARFISH_GENE_INFO_CACHE_SIZE = env.int("VARFISH_GENE_INFO_CACHE_SIZE", 2048)
+# Seconds to keep gene information entries in the shared cache.
+VARFISH_GENE_INFO_CACHE_TIMEOUT = env.int("VARFISH_GENE_INFO_CACHE_TIMEOUT", 7 * 24 * 60 * 60)
+# Seconds between checks for a new release of the gene tables.
+VARFISH_GENE_INFO_CACHE_VERSION_TTL = env.int("VARFISH_GENE_INFO_CACHE_VERSION_TTL", 60)
 
 # Varfish: Exomiser
 # ------------------------------------------------------------------------------
@@ -530,7 +559,7 @@ VARFISH_ENABLE_CADD = env.bool("VARFISH_ENABLE_CADD", default=False)
 VARFISH_CADD_REST_API_URL = env.str("VARFISH_CADD_REST_API_URL", "")
 # CADD version to use with CADD REST API.
 VARFISH_CADD_REST_API_CADD_VERSION = env.str("VARFISH_CADD_REST_API_CADD_VERSION", "v1.6")
-# Configure maximal number of genes to send to Exomiser API
+# Configure maximal number of variants to send to CADD REST API with one job
 VARFISH_CADD_MAX_VARS = env.int("VARFISH_CADD_MAX_VARS", 5000)
 
 # Enable submission of variants to CADD server.
@@ -552,6 +581,10 @@ VARFISH_ENABLE_SPANR_SUBMISSION = env.bool("VARFISH_ENABLE_SPANR_SUBMISSION", Fa
 VARFISH_UMD_REST_API_URL = env.str(
     "VARFISH_UMD_REST_API_URL", "http://umd-predictor.eu/webservice.php"
 )
+VARFISH_UMD_BATCH_VARS = env.int("VARFISH_UMD_BATCH_VARS", 100)
+
+# Varfish: Maximal number of concurrent requests to pathogenicity scoring APIs
+VARFISH_PATHO_SCORING_MAX_CONCURRENCY = env.int("VARFISH_PATHO_SCORING_MAX_CONCURRENCY", 4)
 
 # Varfish: extra annotations.
 VARFISH_ENABLE_EXTRA_ANNOS = env.bool("VARFISH_ENABLE_EXTRA_ANNOS", False)
@@ -575,6 +608,8 @@ VARFISH_ENABLE_SVS = env.bool("VARFISH_ENABLE_SVS", default=False)
 
 # Enabling or disabling Beacon site.
 VARFISH_ENABLE_BEACON_SITE = env.bool("VARFISH_ENABLE_BEACON_SITE", default=False)
+# Maximal number of alleles in one batch query to the Beacon site.
+VARFISH_BEACON_BATCH_MAX_ALLELES = env.int("VARFISH_BEACON_BATCH_MAX_ALLELES", 1000)
 
 # Your common stuff: Below this line define 3rd party library settings
 # ------------------------------------------------------------------------------
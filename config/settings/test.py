@@ -4,6 +4,10 @@ Test settings for VarFish project.
 - Used to run tests fast on the continuous integration server and locally
 """
 
+import atexit
+import shutil
+import tempfile
+
 from .base import *  # noqa
 
 # DEBUG
@@ -35,6 +39,12 @@ EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 # ------------------------------------------------------------------------------
 CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": ""}}
 
+# MEDIA CONFIGURATION
+# ------------------------------------------------------------------------------
+# Files written by the tests (e.g., exports) go to a temporary directory that is removed on exit.
+MEDIA_ROOT = tempfile.mkdtemp(prefix="varfish-test-media-")
+atexit.register(shutil.rmtree, MEDIA_ROOT, ignore_errors=True)
+
 # TESTING
 # ------------------------------------------------------------------------------
 TEST_RUNNER = "django.test.runner.DiscoverRunner"
@@ -84,6 +94,16 @@ TEMPLATES[0]["OPTIONS"]["loaders"] = [
 LOGGING_LEVEL = env.str("LOGGING_LEVEL", "CRITICAL")
 LOGGING = set_logging(LOGGING_LEVEL)
 
+# Varfish: Queries
+# ------------------------------------------------------------------------------
+
+# Worker threads use their own connections and cannot see the data of the test transaction.
+QUERY_MAX_WORKERS = 1
+VARFISH_EXPORT_MAX_WORKERS = 1
+VARFISH_PURGE_BATCH_PAUSE = 0
+# Cached gene information would leak between the tests.
+VARFISH_GENE_INFO_CACHE = False
+
 # Varfish: REST Services
 # ------------------------------------------------------------------------------
 
@@ -1,20 +1,25 @@
 import typing
 
+from variants.helpers import get_engine, load_model_records, variant_condition
 from .models import ExtraAnnoField, ExtraAnno, AugmentedExtraAnno
 
 
 class ExtraAnnosMixin:
     """Mixin for returing variant extra arguments."""
 
-    def get_extra_annos(self, query_kwargs) -> typing.Optional[AugmentedExtraAnno]:
-        """Given a variant, return the corresponding variant frequencies."""
-        fields = list(ExtraAnnoField.objects.all())
-        annos = ExtraAnno.objects.filter(
-            release=query_kwargs["release"],
-            chromosome=query_kwargs["chromosome"],
-            start=query_kwargs["start"],
-            end=query_kwargs["end"],
-            reference=query_kwargs["reference"],
-            alternative=query_kwargs["alternative"],
-        )
-        return AugmentedExtraAnno.create(annos.first(), fields) if annos else None
+    def get_extra_anno_selections(self, query_kwargs):
+        """Return the ``load_model_records()`` selection of the variant's extra annotations."""
+        return {"extra_annos": (ExtraAnno, variant_condition(ExtraAnno, query_kwargs))}
+
+    def get_extra_annos(self, query_kwargs, records=None) -> typing.Optional[AugmentedExtraAnno]:
+        """Given a variant, return the corresponding variant frequencies.
+
+        The extra annotations are loaded unless they are passed in ``records``, as loaded with
+        ``get_extra_anno_selections()``.
+        """
+        if records is None:
+            records = load_model_records(get_engine(), self.get_extra_anno_selections(query_kwargs))
+        annos = sorted(records["extra_annos"], key=lambda anno: anno.pk)
+        if not annos:
+            return None
+        return AugmentedExtraAnno.create(annos[0], list(ExtraAnnoField.objects.all()))
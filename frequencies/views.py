@@ -1,29 +1,32 @@
-from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.core.exceptions import MultipleObjectsReturned
 
+from variants.helpers import get_engine, load_model_records, variant_condition
 from .models import FREQUENCY_DB_INFO
 
 
 class FrequencyMixin:
     """Mixin for returing variant frequencies from all frequency databases."""
 
-    def get_frequencies(self, query_kwargs):
-        """Given a variant, return the corresponding variant frequencies."""
-        key = {
-            "release": query_kwargs["release"],
-            "chromosome": query_kwargs["chromosome"],
-            "start": int(query_kwargs["start"]),
-            "end": int(query_kwargs["end"]),
-            "reference": query_kwargs["reference"],
-            "alternative": query_kwargs["alternative"],
+    def get_frequency_selections(self, query_kwargs):
+        """Return the ``load_model_records()`` selections of the variant in the frequency databases."""
+        return {
+            db_name: (info["model"], variant_condition(info["model"], query_kwargs))
+            for db_name, info in FREQUENCY_DB_INFO.items()
         }
 
+    def get_frequencies(self, query_kwargs, records=None):
+        """Given a variant, return the corresponding variant frequencies.
+
+        The frequency database records are loaded in one query unless they are passed in ``records``, as
+        loaded with ``get_frequency_selections()``.
+        """
+        if records is None:
+            records = load_model_records(get_engine(), self.get_frequency_selections(query_kwargs))
+
         result = {key: {} for key in FREQUENCY_DB_INFO}
         for db_name in FREQUENCY_DB_INFO:
-            try:
-                result[db_name] = FREQUENCY_DB_INFO[db_name]["model"].objects.get(**key)
-            except ObjectDoesNotExist:
-                result[db_name] = None
-            except MultipleObjectsReturned:
+            if len(records[db_name]) > 1:
                 raise MultipleObjectsReturned
+            result[db_name] = records[db_name][0] if records[db_name] else None
 
         return result
@@ -0,0 +1,165 @@
+"""Two-tier cache for the gene information of ``geneinfo.views.get_gene_infos()``.
+
+The gene information only changes when ``import_tables`` imports a new release of the underlying tables.
+Entries are thus cached under a version token derived from the ``ImportInfo`` records of these tables.
+The first tier is an LRU cache in the process, the second tier is Django's default cache (Redis in
+production, local memory otherwise) that is shared between the processes.  The version token is re-read
+at most every ``VARFISH_GENE_INFO_CACHE_VERSION_TTL`` seconds, so repeated lookups need no query at all.
+"""
+
+from collections import OrderedDict
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from clinvar.models import Clinvar
+from geneinfo.models import (
+    EnsemblToGeneSymbol,
+    ExacConstraints,
+    GnomadConstraints,
+    Hgnc,
+    Hpo,
+    HpoName,
+    Mim2geneMedgen,
+    RefseqToEnsembl,
+    RefseqToGeneSymbol,
+    RefseqToHgnc,
+)
+from importer.models import ImportInfo
+
+#: The ``ImportInfo`` tables that the gene information is derived from.
+GENE_INFO_TABLES = tuple(
+    model.__name__
+    for model in (
+        Clinvar,
+        EnsemblToGeneSymbol,
+        ExacConstraints,
+        GnomadConstraints,
+        Hgnc,
+        Hpo,
+        HpoName,
+        Mim2geneMedgen,
+        RefseqToEnsembl,
+        RefseqToGeneSymbol,
+        RefseqToHgnc,
+    )
+)
+
+#: Prefix of the keys in the shared cache.
+CACHE_KEY_PREFIX = "geneinfo"
+
+#: Marker for missing entries, the cached values may be ``None``.
+_MISSING = object()
+
+
+class LruCache:
+    """Thread-safe in-process cache holding the ``maxsize`` most recently used entries."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+#: The in-process tier.
+_local_cache = LruCache(settings.VARFISH_GENE_INFO_CACHE_SIZE)
+
+#: The current version token and the time when it has to be re-read.
+_version = {"token": None, "expires": 0.0}
+_version_lock = threading.Lock()
+
+
+def get_gene_info_version():
+    """Return the version token of the gene information."""
+    now = time.monotonic()
+    with _version_lock:
+        if _version["token"] is not None and now < _version["expires"]:
+            return _version["token"]
+    records = (
+        ImportInfo.objects.filter(table__in=GENE_INFO_TABLES)
+        .order_by("genomebuild", "table")
+        .values_list("genomebuild", "table", "release", "timestamp")
+    )
+    token = hashlib.sha1(repr(list(records)).encode("utf-8")).hexdigest()[:16]
+    with _version_lock:
+        _version["token"] = token
+        _version["expires"] = now + settings.VARFISH_GENE_INFO_CACHE_VERSION_TTL
+    return token
+
+
+def reset_gene_info_version():
+    """Force re-reading the version token on the next lookup."""
+    with _version_lock:
+        _version["token"] = None
+
+
+@receiver(post_save, sender=ImportInfo)
+@receiver(post_delete, sender=ImportInfo)
+def import_info_reset_gene_info_version(sender, instance, **_kwargs):
+    if instance.table in GENE_INFO_TABLES:
+        reset_gene_info_version()
+
+
+def _shared_key(version, kind, key):
+    return ":".join(map(str, (CACHE_KEY_PREFIX, version, kind) + tuple(key)))
+
+
+def get_cached(kind, key, compute):
+    """Return the cached value of ``kind`` for the tuple ``key``, calling ``compute()`` on a miss."""
+    if not settings.VARFISH_GENE_INFO_CACHE:
+        return compute()
+    version = get_gene_info_version()
+    local_key = (version, kind) + tuple(key)
+    value = _local_cache.get(local_key, _MISSING)
+    if value is _MISSING:
+        shared_key = _shared_key(version, kind, key)
+        value = cache.get(shared_key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            cache.set(shared_key, value, settings.VARFISH_GENE_INFO_CACHE_TIMEOUT)
+        _local_cache.set(local_key, value)
+    return value
+
+
+def warm_cache(kind, keys, compute, chunk_size=1000):
+    """Fill the shared cache with the values of ``kind`` for the tuples ``keys`` that are not cached yet.
+
+    ``compute(key)`` returns the value of one key.  Return the number of computed values.
+    """
+    version = get_gene_info_version()
+    count = 0
+    keys = list(keys)
+    for i in range(0, len(keys), chunk_size):
+        shared_keys = {_shared_key(version, kind, key): key for key in keys[i : i + chunk_size]}
+        cached = cache.get_many(list(shared_keys))
+        values = {
+            shared_key: compute(key)
+            for shared_key, key in shared_keys.items()
+            if shared_key not in cached
+        }
+        cache.set_many(values, settings.VARFISH_GENE_INFO_CACHE_TIMEOUT)
+        count += len(values)
+    return count
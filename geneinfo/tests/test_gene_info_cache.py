@@ -0,0 +1,88 @@
+"""Tests for ``geneinfo.gene_info_cache``."""
+
+from django.core.cache import cache
+from django.test import override_settings
+from test_plus.test import TestCase
+
+from importer.models import ImportInfo
+from .factories import ExacConstraintsFactory, HgncFactory
+from ..gene_info_cache import _local_cache, LruCache, reset_gene_info_version
+from ..views import get_gene_infos, warm_gene_infos
+
+
+class TestLruCache(TestCase):
+    def testEviction(self):
+        lru = LruCache(2)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        self.assertEqual(lru.get("a"), 1)
+        lru.set("c", 3)
+        self.assertEqual(lru.get("b"), None)
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(lru.get("c"), 3)
+
+
+@override_settings(VARFISH_GENE_INFO_CACHE=True, VARFISH_GENE_INFO_CACHE_VERSION_TTL=3600)
+class TestGeneInfoCache(TestCase):
+    def setUp(self):
+        _local_cache.clear()
+        cache.clear()
+        reset_gene_info_version()
+        self.hgnc = HgncFactory(entrez_id="1234")
+        self.exac = ExacConstraintsFactory(ensembl_transcript_id="ENST0001")
+        self._import_info("1")
+
+    def tearDown(self):
+        _local_cache.clear()
+        cache.clear()
+        reset_gene_info_version()
+
+    def _import_info(self, release):
+        ImportInfo.objects.filter(table="Hgnc").delete()
+        ImportInfo.objects.create(genomebuild="GRCh37", table="Hgnc", release=release)
+
+    def testRepeatedLookup(self):
+        gene = get_gene_infos("refseq", "1234", "ENST0001.2")
+        self.assertEqual(gene["symbol"], self.hgnc.symbol)
+        self.assertEqual(gene["exac_constraints"], self.exac)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_gene_infos("refseq", "1234", "ENST0001.2"), gene)
+
+    def testSharedCache(self):
+        gene = get_gene_infos("refseq", "1234", None)
+        _local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_gene_infos("refseq", "1234", None), gene)
+
+    def testCopy(self):
+        get_gene_infos("refseq", "1234", None)["symbol"] = "CHANGED"
+        self.assertEqual(get_gene_infos("refseq", "1234", None)["symbol"], self.hgnc.symbol)
+
+    def testMissingGene(self):
+        self.assertEqual(
+            get_gene_infos("ensembl", "ENSG_MISSING", "ENST0001"),
+            {"ensembl_gene_id": "ENSG_MISSING", "symbol": None},
+        )
+        with self.assertNumQueries(0):
+            get_gene_infos("ensembl", "ENSG_MISSING", "ENST0001")
+
+    def testNewRelease(self):
+        symbol = get_gene_infos("refseq", "1234", None)["symbol"]
+        self.hgnc.symbol = "NEWSYMBOL"
+        self.hgnc.save()
+        self.assertEqual(get_gene_infos("refseq", "1234", None)["symbol"], symbol)
+        self._import_info("2")
+        self.assertEqual(get_gene_infos("refseq", "1234", None)["symbol"], "NEWSYMBOL")
+
+    def testWarm(self):
+        self.assertEqual(warm_gene_infos("refseq", ["1234", "5678"]), 2)
+        self.assertEqual(warm_gene_infos("refseq", ["1234"]), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_gene_infos("refseq", "1234", None)["symbol"], self.hgnc.symbol)
+
+    @override_settings(VARFISH_GENE_INFO_CACHE=False)
+    def testDisabled(self):
+        get_gene_infos("refseq", "1234", None)
+        self.hgnc.symbol = "NEWSYMBOL"
+        self.hgnc.save()
+        self.assertEqual(get_gene_infos("refseq", "1234", None)["symbol"], "NEWSYMBOL")
@@ -15,6 +15,7 @@ from geneinfo.models import (
     RefseqToGeneSymbol,
     EnsemblToGeneSymbol,
 )
+from geneinfo.gene_info_cache import get_cached, warm_cache
 
 
 RE_OMIM_PARSER = re.compile("^(?:#\d+ )?(.+)$")
@@ -32,6 +33,37 @@ HPO_INHERITANCE_MAPPING = {
 
 
 def get_gene_infos(database, gene_id, ensembl_transcript_id):
+    """Return the gene information of the ``database`` (``"refseq"`` or ``"ensembl"``) gene ``gene_id``.
+
+    The gene information and the ExAC constraints of ``ensembl_transcript_id`` are cached until a new release
+    of the underlying tables is imported, see ``geneinfo.gene_info_cache``.
+    """
+    gene = dict(
+        get_cached("gene", (database, gene_id), lambda: _compute_gene_infos(database, gene_id))
+    )
+    if "hgnc_id" in gene and ensembl_transcript_id:
+        transcript_id = ensembl_transcript_id.split(".")[0]
+        gene["exac_constraints"] = get_cached(
+            "exac_constraints",
+            (transcript_id,),
+            lambda: ExacConstraints.objects.filter(ensembl_transcript_id=transcript_id).first(),
+        )
+    return gene
+
+
+def warm_gene_infos(database, gene_ids):
+    """Fill the shared gene information cache with the ``database`` genes ``gene_ids``.
+
+    Return the number of genes that were not cached yet.
+    """
+    return warm_cache(
+        "gene",
+        [(database, gene_id) for gene_id in gene_ids],
+        lambda key: _compute_gene_infos(*key),
+    )
+
+
+def _compute_gene_infos(database, gene_id):
     if database == "refseq":
         # Get HGNC entry via intermediate table as HGNC is badly equipped with refseq IDs.
         hgnc = RefseqToHgnc.objects.filter(entrez_id=gene_id).first()
@@ -79,10 +111,6 @@ def get_gene_infos(database, gene_id, ensembl_transcript_id):
             gene["gnomad_constraints"] = GnomadConstraints.objects.filter(
                 ensembl_gene_id=ensembl_gene_id
             ).first()
-        if ensembl_transcript_id:
-            gene["exac_constraints"] = ExacConstraints.objects.filter(
-                ensembl_transcript_id=ensembl_transcript_id.split(".")[0]
-            ).first()
         return gene
 
 
@@ -91,7 +119,8 @@ def _handle_hpo_omim(entrez_id):
         return [], [], {}, []
     # Obtain type (``phenotype`` or ``gene``) and omim ID via entrez ID.
     # Multiple entries for one entrez ID are possible (also mutiple genes for one entrez ID!).
-    mim2gene = Mim2geneMedgen.objects.filter(entrez_id=entrez_id)
+    mim2gene = list(Mim2geneMedgen.objects.filter(entrez_id=entrez_id))
+    hpo_mapping = _get_hpo_mapping([mim for mim in mim2gene if mim.omim_type != "gene"])
     omim = dict()
     hpoterms = set()
     hpoinheritance = set()
@@ -103,7 +132,7 @@ def _handle_hpo_omim(entrez_id):
         # Handle omim phenotypes
         else:
             # Get HPO info for the current omim ID
-            for hpo_id, hpo_name, omim_name in _get_hpo_mapping(mim):
+            for hpo_id, hpo_name, omim_name in hpo_mapping.get("OMIM:{}".format(mim.omim_id), []):
                 if hpo_id in HPO_INHERITANCE_MAPPING:
                     hpoinheritance.add((hpo_id, HPO_INHERITANCE_MAPPING[hpo_id]))
                 else:
@@ -120,11 +149,25 @@ def _handle_hpo_omim(entrez_id):
     return hpoterms, hpoinheritance, omim, omim_genes
 
 
-def _get_hpo_mapping(mim):
-    """Given one omim ID, obtain HPO entries with the associated HPO name and parsed OMIM name."""
-    for h in Hpo.objects.filter(database_id="OMIM:{}".format(mim.omim_id)):
-        hponame = HpoName.objects.filter(hpo_id=h.hpo_id).first()
-        yield h.hpo_id, hponame.name if hponame else "unknown", list(_parse_omim_name(h.name))
+def _get_hpo_mapping(mims):
+    """Given omim IDs, obtain HPO entries with the associated HPO name and parsed OMIM name.
+
+    Return ``dict`` mapping the HPO database IDs of the omim IDs to lists of ``(hpo_id, hpo_name, omim_name)``.
+    """
+    hpos = list(
+        Hpo.objects.filter(
+            database_id__in={"OMIM:{}".format(mim.omim_id) for mim in mims}
+        ).order_by("pk")
+    )
+    hponames = {}
+    for hponame in HpoName.objects.filter(hpo_id__in={h.hpo_id for h in hpos}).order_by("pk"):
+        hponames.setdefault(hponame.hpo_id, hponame.name)
+    result = {}
+    for h in hpos:
+        result.setdefault(h.database_id, []).append(
+            (h.hpo_id, hponames.get(h.hpo_id, "unknown"), list(_parse_omim_name(h.name)))
+        )
+    return result
 
 
 def _parse_omim_name(name):
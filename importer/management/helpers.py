@@ -1,9 +1,20 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import copy
 import gzip
+from itertools import chain
+import queue
+import threading
+
+from django.conf import settings
+from postgres_copy import CopyMapping
 
 
 def open_file(path, mode):
     """Open gzip or normal file."""
     if hasattr(path, "open"):
+        # (Re-)open the file, which also rewinds it if it was read before.
+        path.open(mode="rb")
         try:
             return gzip.open(path, "rt")
         except gzip.BadGzipFile:
@@ -34,3 +45,201 @@ def tsv_reader(path):
         for line in fh:
             if not line.startswith("#"):
                 yield dict(zip(keys, line.rstrip("\n").split("\t")))
+
+
+#: Number of lines to pass to the database at once with ``COPY ... FROM STDIN``.
+COPY_CHUNK_LINES = 5000
+#: Number of rewritten chunks to buffer in ``copy_tsv_files()`` before the reading threads wait for the database.
+COPY_BUFFER_CHUNKS = 8
+
+
+class CopyChunkReader:
+    """File-like object for ``COPY ... FROM STDIN`` that reads from an iterable of text chunks.
+
+    An exception raised by the iterable aborts the ``COPY`` and is kept in ``error`` so callers can raise it
+    instead of the database error.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self._chunk = ""
+        self._offset = 0
+        #: The exception raised by the iterable, if any.
+        self.error = None
+
+    def read(self, size=-1):
+        while self._offset >= len(self._chunk):
+            try:
+                chunk = next(self.chunks, None)
+            except BaseException as e:
+                self.error = e
+                raise
+            if chunk is None:
+                return ""
+            self._chunk, self._offset = chunk, 0
+        if size is None or size < 0:
+            size = len(self._chunk) - self._offset
+        result = self._chunk[self._offset : self._offset + size]
+        self._offset += len(result)
+        return result
+
+
+def _iter_queue_chunks(chunks, num_producers):
+    """Yield the text chunks from the queue ``chunks`` until all ``num_producers`` producers are done.
+
+    The producers put text chunks into the queue, followed by ``None`` when done or by an exception on failure.
+    """
+    while num_producers:
+        item = chunks.get()
+        if item is None:
+            num_producers -= 1
+        elif isinstance(item, BaseException):
+            raise item
+        else:
+            yield item
+
+
+class _StreamCopyMapping(CopyMapping):
+    """``CopyMapping`` for a stream where the headers are known in advance and cannot be read ahead.
+
+    The columns in ``computed`` are filled with the SQL expressions evaluated on the rows of the temporary table.
+    They are mapped like the columns of the stream, using the expressions as the ``copy_template`` of their fields.
+    """
+
+    def __init__(self, model, stream, headers, computed=None, **kwargs):
+        self.stream_headers = headers
+        self.computed = computed or {}
+        super().__init__(model, stream, None, **kwargs)
+
+    def get_headers(self):
+        return self.stream_headers
+
+    def get_mapping(self, mapping):
+        result = OrderedDict(super().get_mapping(mapping))
+        # Any header passes ``validate_mapping()``, the templates of the computed columns do not use it.
+        result.update((name, self.headers[0]) for name in self.computed)
+        return result
+
+    def get_field(self, name):
+        field = super().get_field(name)
+        if field is None or name not in self.computed:
+            return field
+        field = copy.copy(field)
+        field.copy_template = self.computed[name].replace("%", "%%")
+        return field
+
+
+def _get_tsv_header(path, token, replace, default_values):
+    """Return header columns of the TSV file at ``path`` and the suffix of default values to append to lines."""
+    with open_file(path, "rt") as inputf:
+        header = inputf.readline().strip().split("\t")
+    missing = [column for column in replace if column not in header]
+    if missing:
+        raise RuntimeError(
+            "Column %s not found in %s TSV" % (" or ".join("'%s'" % c for c in missing), token)
+        )
+    # Extend header for fields in default_values and build suffix to append to every line.
+    default_suffix = []
+    for field, value in default_values.items():
+        if field not in header:
+            header.append(field)
+            default_suffix.append(str(value))
+    return header, default_suffix
+
+
+def _rewrite_tsv_file(path, token, replace, check, default_values, put):
+    """Rewrite the lines of the TSV file at ``path`` for import and pass them to ``put()`` in chunks."""
+    header, default_suffix = _get_tsv_header(path, token, replace, default_values)
+    replace_idx = {header.index(column): value for column, value in replace.items()}
+    check_idx = {header.index(column): (column, value) for column, value in check.items()}
+    # Only split off the leading columns that are replaced or checked.
+    max_split = max(chain(replace_idx, check_idx)) + 1
+    suffix = "".join("\t%s" % value for value in default_suffix) + "\n"
+    lines = []
+    with open_file(path, "rt") as inputf:
+        inputf.readline()
+        for line in inputf:
+            line = line.strip()
+            if not line:
+                break
+            arr = line.split("\t", max_split)
+            for idx, (column, value) in check_idx.items():
+                if arr[idx] != value:
+                    raise RuntimeError(
+                        "Incompatible %s in %s TSV: %s vs %s" % (column, token, arr[idx], value)
+                    )
+            for idx, value in replace_idx.items():
+                arr[idx] = value
+            lines.append("\t".join(arr) + suffix)
+            if len(lines) >= COPY_CHUNK_LINES:
+                put("".join(lines))
+                lines = []
+    if lines:
+        put("".join(lines))
+
+
+def copy_tsv_files(
+    model_class,
+    paths,
+    token,
+    replace,
+    check=None,
+    default_values=None,
+    computed=None,
+    max_workers=None,
+    **kwargs
+):
+    """Import the TSV files at ``paths`` into the table of ``model_class`` with ``COPY ... FROM STDIN``.
+
+    The values of the columns in ``replace`` are replaced, the values of the columns in ``check`` must match, and
+    the columns of ``default_values`` are added if missing.  The columns in ``computed`` are filled with SQL
+    expressions on the columns of the files.  The files are read and rewritten by up to
+    ``max_workers`` threads (default: ``VARFISH_IMPORT_MAX_WORKERS``) that pass the lines through a bounded
+    buffer to the database without intermediate files.  Further keyword arguments are passed to ``CopyMapping``.
+    """
+    check = check or {}
+    default_values = default_values or {}
+    paths = list(paths)
+    if not paths:
+        return 0
+    header, _ = _get_tsv_header(paths[0], token, replace, default_values)
+    chunks = queue.Queue(maxsize=COPY_BUFFER_CHUNKS)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise RuntimeError("Import of %s TSV was aborted" % token)
+
+    def produce(path):
+        try:
+            _rewrite_tsv_file(path, token, replace, check, default_values, put)
+        except Exception as e:
+            if not stop.is_set():
+                put(e)
+        finally:
+            if not stop.is_set():
+                put(None)
+
+    num_workers = min(max_workers or settings.VARFISH_IMPORT_MAX_WORKERS, len(paths))
+    reader = CopyChunkReader(
+        chain(["\t".join(header) + "\n"], _iter_queue_chunks(chunks, len(paths)))
+    )
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        try:
+            for path in paths:
+                executor.submit(produce, path)
+            return _StreamCopyMapping(
+                model_class, reader, header, computed=computed, **kwargs
+            ).save(silent=True)
+        except Exception as e:
+            # Raise errors from reading the files rather than the aborted ``COPY``.
+            if reader.error is not None:
+                raise reader.error from e
+            raise
+        finally:
+            stop.set()
@@ -1,7 +1,6 @@
 from enum import Enum
 import json
 import re
-import tempfile
 import uuid as uuid_object
 
 import aldjemy
@@ -12,9 +11,8 @@ from django.db.models.signals import post_delete
 from django.urls import reverse
 from django.utils import timezone
 from projectroles.models import Project
-from sqlalchemy import and_
 
-from importer.management.helpers import open_file, tsv_reader
+from importer.management.helpers import copy_tsv_files, tsv_reader
 from svs.models import StructuralVariant, StructuralVariantGeneAnnotation, SvAnnotationReleaseInfo
 from varfish.utils import receiver_subclasses
 from variants.models import (
@@ -24,10 +22,14 @@ from variants.models import (
     SmallVariant,
     AnnotationReleaseInfo,
     CaseAlignmentStats,
+    ProjectVariantStats,
     SmallVariantSet,
 )
+from variants.genotype_columns import genotype_column_expressions, get_genotype_samples
 from variants.helpers import get_engine
 from variants.helpers import get_meta
+from variants.purge import purge_rows
+from variants.variant_set_counts import add_variant_set_counts, remove_variant_set_counts
 
 User = auth.get_user_model()
 
@@ -339,6 +341,7 @@ class CaseImporter:
         CaseVariantType.STRUCTURAL.name: (
             ("svs_structuralvariant", "set_id"),
             ("svs_structuralvariantgeneannotation", "set_id"),
+            ("svs_structuralvariantpublicdatabasecounts", "set_id"),
         ),
     }
     latest_set_map = {
@@ -443,19 +446,19 @@ class CaseImporter:
 
     def _purge_variant_set(self, variant_set, table_names):
         self.import_job.add_log_entry("Performing variant set purge ...")
+        if isinstance(variant_set, SmallVariantSet):
+            self.import_job.add_log_entry("... removing in-house and beacon allele counts.")
+            remove_variant_set_counts(get_engine(), variant_set)
         self.import_job.add_log_entry("... setting state to 'deleting'.")
         variant_set.__class__.objects.filter(pk=variant_set.id).update(state="deleting")
         self.import_job.add_log_entry("... removing linked entries in tables:")
         for table_name, variant_set_attr in table_names:
             self.import_job.add_log_entry("... - %s" % table_name)
-            table = get_meta().tables[table_name]
-            get_engine().execute(
-                table.delete().where(
-                    and_(
-                        getattr(table.c, variant_set_attr) == variant_set.id,
-                        table.c.case_id == variant_set.case.id,
-                    )
-                )
+            purge_rows(
+                get_engine(),
+                get_meta().tables[table_name],
+                {variant_set_attr: variant_set.id, "case_id": variant_set.case.id},
+                logger=self.import_job.add_log_entry,
             )
         self.import_job.add_log_entry("... deleting variant set %d" % variant_set.pk)
         variant_set.__class__.objects.filter(pk=variant_set.id).delete()
@@ -477,67 +480,36 @@ class CaseImporter:
         )
 
     def _import_table(
-        self, variant_set_info, variant_set, token, path_attr, model_class, default_values=None
+        self,
+        variant_set_info,
+        variant_set,
+        token,
+        path_attr,
+        model_class,
+        default_values=None,
+        computed=None,
     ):
-        default_values = default_values or {}
         before = timezone.now()
-        self.import_job.add_log_entry("Creating temporary %s file..." % token)
-        case_genomebuild = self.case.release
-        with tempfile.NamedTemporaryFile("w+t") as tempf:
-            for i, import_variant_set_url in enumerate(getattr(variant_set_info, path_attr).all()):
-                self.import_job.add_log_entry("Importing from %s" % import_variant_set_url.name)
-                with open_file(import_variant_set_url.file, "rt") as inputf:
-                    header = inputf.readline().strip()
-                    header_arr = header.split("\t")
-                    try:
-                        release_idx = header_arr.index("release")
-                        case_idx = header_arr.index("case_id")
-                        set_idx = header_arr.index("set_id")
-                    except ValueError as e:
-                        raise RuntimeError(
-                            "Column 'release', 'case_id' or 'set_id' not found in %s TSV" % token
-                        ) from e
-                    # Extend header for fields in self.default_values and build suffix to append to every line.
-                    default_suffix = []
-                    for field, value in default_values.items():
-                        if field not in header_arr:
-                            header += "\t%s" % field
-                            default_suffix.append(str(value))
-                    if i == 0:
-                        tempf.write(header)
-                        tempf.write("\n")
-                    while True:
-                        line = inputf.readline().strip()
-                        if not line:
-                            break
-                        arr = line.split("\t")
-                        if arr[release_idx] != case_genomebuild:
-                            raise RuntimeError(
-                                "Incompatible genome build in %s TSV: %s vs %s from case"
-                                % (token, arr[release_idx], case_genomebuild)
-                            )
-                        arr[case_idx] = str(variant_set.case.pk)
-                        arr[set_idx] = str(variant_set.pk)
-                        tempf.write("\t".join(arr + default_suffix))
-                        tempf.write("\n")
-            tempf.flush()
-            elapsed = timezone.now() - before
-            self.import_job.add_log_entry("Wrote file in %.2f s" % elapsed.total_seconds())
-
-            before = timezone.now()
-            self.import_job.add_log_entry("Importing %s file..." % token)
-            model_class.objects.from_csv(
-                tempf.name,
-                delimiter="\t",
-                null=".",
-                ignore_conflicts=False,
-                drop_constraints=False,
-                drop_indexes=False,
-            )
-            elapsed = timezone.now() - before
-            self.import_job.add_log_entry(
-                "Finished importing %s in %.2f s" % (token, elapsed.total_seconds())
-            )
+        self.import_job.add_log_entry("Importing %s file..." % token)
+        import_variant_set_urls = list(getattr(variant_set_info, path_attr).all())
+        for import_variant_set_url in import_variant_set_urls:
+            self.import_job.add_log_entry("Importing from %s" % import_variant_set_url.name)
+        copy_tsv_files(
+            model_class,
+            [import_variant_set_url.file for import_variant_set_url in import_variant_set_urls],
+            token,
+            replace={"case_id": str(variant_set.case.pk), "set_id": str(variant_set.pk)},
+            check={"release": self.case.release},
+            default_values=default_values,
+            computed=computed,
+            delimiter="\t",
+            null=".",
+            ignore_conflicts=False,
+        )
+        elapsed = timezone.now() - before
+        self.import_job.add_log_entry(
+            "Finished importing %s in %.2f s" % (token, elapsed.total_seconds())
+        )
 
     def _perform_import(self, variant_set, variant_set_info):
         if variant_set_info.genomebuild != self.case.release:
@@ -560,6 +532,7 @@ class CaseImporter:
                 "genotypefile_set",
                 SmallVariant,
                 default_values,
+                self._genotype_columns(variant_set),
             )
         else:
             assert variant_set_info.variant_type == CaseVariantType.STRUCTURAL.name
@@ -577,10 +550,23 @@ class CaseImporter:
                 StructuralVariantGeneAnnotation,
             )
 
+    def _genotype_columns(self, variant_set):
+        """Store the samples of the genotype columns with ``variant_set`` and return the column expressions."""
+        samples = get_genotype_samples(self.import_info.pedigree)
+        if samples is None:
+            return None
+        variant_set.genotype_samples = samples
+        variant_set.save(update_fields=["genotype_samples"])
+        return genotype_column_expressions(samples)
+
     def _post_import(self, variant_set, variant_type):
         self.import_job.add_log_entry("Performing post import routine ...")
         if variant_type == CaseVariantType.SMALL.name:
             self._rebuild_small_variants_stats(variant_set)
+            self._update_project_variants_stats(variant_set)
+            self._add_variant_set_counts(variant_set)
+        elif variant_type == CaseVariantType.STRUCTURAL.name:
+            self._count_public_database_overlaps(variant_set)
 
     def _rebuild_small_variants_stats(self, variant_set):
         """Rebuild small variant statistics."""
@@ -597,6 +583,46 @@ class CaseImporter:
             "Finished computing variant statistics in %.2f s" % elapsed.total_seconds()
         )
 
+    def _update_project_variants_stats(self, variant_set):
+        """Add the samples of the imported case to the project-wide statistics, if these exist."""
+        # This must be imported here to circumvent cyclic dependencies
+        from variants.variant_stats import update_project_variant_stats  # noqa
+
+        project = variant_set.case.project
+        if not ProjectVariantStats.objects.filter(project=project).exists():
+            return
+        before = timezone.now()
+        self.import_job.add_log_entry("Updating project-wide variant statistics...")
+
+        update_project_variant_stats(
+            get_engine(), project, self.import_job.bg_job.user, logger=self.import_job.add_log_entry
+        )
+
+        elapsed = timezone.now() - before
+        self.import_job.add_log_entry(
+            "Finished updating project-wide variant statistics in %.2f s" % elapsed.total_seconds()
+        )
+
+    def _add_variant_set_counts(self, variant_set):
+        """Add the variants of the imported case to the in-house and beacon allele counts."""
+        add_variant_set_counts(get_engine(), variant_set, logger=self.import_job.add_log_entry)
+
+    def _count_public_database_overlaps(self, variant_set):
+        """Precompute the overlap counts of the structural variants with the public SV databases."""
+        # This must be imported here to circumvent cyclic dependencies
+        from svs.public_databases import count_public_database_overlaps  # noqa
+
+        before = timezone.now()
+        self.import_job.add_log_entry("Counting overlaps with public SV databases...")
+
+        count_public_database_overlaps(get_engine(), variant_set)
+
+        elapsed = timezone.now() - before
+        self.import_job.add_log_entry(
+            "Finished counting overlaps with public SV databases in %.2f s"
+            % elapsed.total_seconds()
+        )
+
     def _import_annotation_release_info(
         self, variant_set_info: VariantSetImportInfo, variant_set, release_info
     ):
@@ -0,0 +1,63 @@
+"""Tests for ``importer.models``."""
+
+from bgjobs.models import BackgroundJob
+from test_plus.test import TestCase
+
+from var_stats_qc.models import ReferenceSite
+from variants.helpers import get_engine
+from variants.models import ProjectVariantStats
+from variants.tests.factories import (
+    CaseWithVariantSetFactory,
+    ProjectFactory,
+    SmallVariantFactory,
+)
+from variants.variant_stats import rebuild_project_variant_stats
+
+from ..models import CaseImporter, CaseVariantType, ImportCaseBgJob
+
+
+class TestCaseImporterPostImport(TestCase):
+    def setUp(self):
+        self.user = self.make_user("superuser")
+        self.project = ProjectFactory()
+        self.sites = list(
+            ReferenceSite.objects.filter(release="GRCh37", chromosome="1").order_by("start")[:5]
+        )
+        self.case1, self.variant_set1 = self._create_case()
+        bg_job = BackgroundJob.objects.create(
+            name="Import of case",
+            project=self.project,
+            job_type=ImportCaseBgJob.spec_name,
+            user=self.user,
+        )
+        self.import_job = ImportCaseBgJob.objects.create(bg_job=bg_job, project=self.project)
+
+    def _create_case(self):
+        case, variant_set, _ = CaseWithVariantSetFactory.get(
+            "small", project=self.project, structure="trio"
+        )
+        for site in self.sites:
+            SmallVariantFactory(
+                variant_set=variant_set,
+                chromosome=site.chromosome,
+                start=site.start,
+                reference=site.reference,
+                alternative=site.alternative,
+            )
+        return case, variant_set
+
+    def test_post_import_updates_project_variant_stats(self):
+        rebuild_project_variant_stats(get_engine(), self.project, self.user)
+        _, variant_set2 = self._create_case()
+
+        CaseImporter(self.import_job)._post_import(variant_set2, CaseVariantType.SMALL.name)
+
+        stats = ProjectVariantStats.objects.get(project=self.project)
+        self.assertIn(variant_set2, stats.variant_sets.all())
+        # Pairs of the six samples of both cases.
+        self.assertEqual(stats.relatedness.count(), 15)
+
+    def test_post_import_without_project_variant_stats(self):
+        CaseImporter(self.import_job)._post_import(self.variant_set1, CaseVariantType.SMALL.name)
+
+        self.assertFalse(ProjectVariantStats.objects.filter(project=self.project).exists())
@@ -0,0 +1,49 @@
+"""Django command for filling the typed genotype columns of small variant sets imported without them."""
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from projectroles.models import Project
+from variants.genotype_columns import build_genotype_columns
+from variants.helpers import get_engine
+from variants.models import SmallVariantSet
+
+
+class Command(BaseCommand):
+    """Implementation of filling the genotype columns.
+
+    Each variant set is converted in its own transaction.
+    """
+
+    #: Help message displayed on the command line.
+    help = "Fill the typed genotype columns of the active small variant sets that do not have them yet."
+
+    def add_arguments(self, parser):
+        """Add the command's argument to the ``parser``."""
+        parser.add_argument(
+            "--project-uuid",
+            help="UUID of the project to convert the variant sets of, default is all",
+        )
+
+    def handle(self, *args, **options):
+        """Perform filling the genotype columns."""
+        variant_sets = SmallVariantSet.objects.filter(
+            state="active", genotype_samples__isnull=True
+        ).select_related("case")
+        if options["project_uuid"]:
+            variant_sets = variant_sets.filter(
+                case__project=self._get_project(options["project_uuid"])
+            )
+        count = 0
+        for variant_set in variant_sets:
+            self.stdout.write("Filling genotype columns of case %s" % variant_set.case.name)
+            build_genotype_columns(get_engine(), variant_set)
+            count += 1
+        self.stdout.write(self.style.SUCCESS("Filled genotype columns of %d variant sets" % count))
+
+    def _get_project(self, project_uuid):
+        """Get query or raise appropriate exception."""
+        try:
+            return Project.objects.get(sodar_uuid=project_uuid)
+        except ObjectDoesNotExist:
+            raise CommandError("Project with UUID {} does not exist".format(project_uuid))
@@ -0,0 +1,115 @@
+"""Django command for profiling the time spent importing modules at process startup."""
+
+from collections import defaultdict
+import os
+import subprocess
+import sys
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+#: Modules imported by default after ``django.setup()``; these are the modules loaded by the web and worker
+#: processes at startup.
+DEFAULT_MODULES = ("config.urls", "config.celery")
+
+
+def parse_importtime(lines):
+    """Parse the output of ``python -X importtime``.
+
+    Yield tuples of module name, self time and cumulative time in microseconds.
+    """
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # header line
+        yield name.strip(), int(self_us), int(cumulative_us)
+
+
+def group_by_app(records, app_names):
+    """Sum up the self times of ``records`` per app in ``app_names`` or per top-level package.
+
+    Return ``dict`` mapping group name to pair of module count and self time in microseconds.
+    """
+    app_names = sorted(app_names, key=len, reverse=True)
+    result = defaultdict(lambda: [0, 0])
+    for name, self_us, _ in records:
+        for app_name in app_names:
+            if name == app_name or name.startswith(app_name + "."):
+                group = app_name
+                break
+        else:
+            group = name.split(".")[0]
+        result[group][0] += 1
+        result[group][1] += self_us
+    return {key: tuple(value) for key, value in result.items()}
+
+
+class Command(BaseCommand):
+    """Implementation of profiling module import times."""
+
+    #: Help message displayed on the command line.
+    help = (
+        "Report the time spent importing modules after setting up Django, using 'python -X importtime' in a "
+        "subprocess."
+    )
+
+    def add_arguments(self, parser):
+        """Add the command's argument to the ``parser``."""
+        parser.add_argument(
+            "--module",
+            action="append",
+            dest="modules",
+            help="Module to import after setting up Django, may be given multiple times (default: %s)."
+            % ", ".join(DEFAULT_MODULES),
+        )
+        parser.add_argument(
+            "--by-module",
+            action="store_true",
+            help="Report cumulative times of the individual modules instead of self times per app.",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=25, help="Number of entries to report (default: 25)."
+        )
+
+    def handle(self, *args, **options):
+        """Run the import in a subprocess and report the import times."""
+        modules = options["modules"] or DEFAULT_MODULES
+        code = "import importlib, django; django.setup(); %s" % "; ".join(
+            "importlib.import_module(%r)" % module for module in modules
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        records = list(parse_importtime(proc.stderr.splitlines()))
+        if proc.returncode != 0:
+            raise CommandError(
+                "Importing failed:\n%s"
+                % "\n".join(
+                    line for line in proc.stderr.splitlines() if not line.startswith("import time:")
+                )
+            )
+        total_us = sum(self_us for _, self_us, _ in records)
+
+        if options["by_module"]:
+            self.stdout.write("%12s  %s" % ("cumul. [ms]", "module"))
+            for name, _, cumulative_us in sorted(records, key=lambda r: -r[2])[: options["limit"]]:
+                self.stdout.write("%12.1f  %s" % (cumulative_us / 1000, name))
+        else:
+            app_names = [app_config.name for app_config in apps.get_app_configs()]
+            groups = group_by_app(records, app_names)
+            self.stdout.write("%12s  %8s  %s" % ("self [ms]", "modules", "app / package"))
+            for group, (count, self_us) in sorted(groups.items(), key=lambda x: -x[1][1])[
+                : options["limit"]
+            ]:
+                self.stdout.write("%12.1f  %8d  %s" % (self_us / 1000, count, group))
+        self.stdout.write(
+            self.style.SUCCESS("Imported %d modules in %.1f ms" % (len(records), total_us / 1000))
+        )
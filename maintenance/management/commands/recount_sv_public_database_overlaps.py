@@ -0,0 +1,58 @@
+"""Django command for recomputing the precomputed overlap counts of SVs with the public SV databases."""
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+
+from projectroles.models import Project
+from svs.models import StructuralVariantSet
+from svs.public_databases import count_public_database_overlaps, has_current_public_database_counts
+from variants.helpers import get_engine
+
+
+class Command(BaseCommand):
+    """Implementation of recomputing the public database overlap counts.
+
+    Each variant set is counted in its own transaction.
+    """
+
+    #: Help message displayed on the command line.
+    help = (
+        "Recompute the public database overlap counts of the active SV sets that are missing or "
+        "outdated after importing public databases."
+    )
+
+    def add_arguments(self, parser):
+        """Add the command's argument to the ``parser``."""
+        parser.add_argument(
+            "--project-uuid",
+            help="UUID of the project to recompute the counts of, default is all",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            default=False,
+            help="Also recompute the counts that are up to date",
+        )
+
+    def handle(self, *args, **options):
+        """Perform recomputing the overlap counts."""
+        variant_sets = StructuralVariantSet.objects.filter(state="active").select_related("case")
+        if options["project_uuid"]:
+            variant_sets = variant_sets.filter(
+                case__project=self._get_project(options["project_uuid"])
+            )
+        count = 0
+        for variant_set in variant_sets:
+            if not options["all"] and has_current_public_database_counts(variant_set):
+                continue
+            self.stdout.write("Counting overlaps of case %s" % variant_set.case.name)
+            count_public_database_overlaps(get_engine(), variant_set)
+            count += 1
+        self.stdout.write(self.style.SUCCESS("Recomputed overlap counts of %d SV sets" % count))
+
+    def _get_project(self, project_uuid):
+        """Get query or raise appropriate exception."""
+        try:
+            return Project.objects.get(sodar_uuid=project_uuid)
+        except ObjectDoesNotExist:
+            raise CommandError("Project with UUID {} does not exist".format(project_uuid))
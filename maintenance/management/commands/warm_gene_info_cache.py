@@ -0,0 +1,53 @@
+"""Django command for filling the shared gene information cache, e.g., after importing new gene tables."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from geneinfo.models import Hgnc, RefseqToHgnc
+from geneinfo.views import warm_gene_infos
+
+#: The gene IDs to warm the cache with by default.
+DEFAULT_GENE_IDS = {
+    "refseq": lambda: RefseqToHgnc.objects.values_list("entrez_id", flat=True),
+    "ensembl": lambda: Hgnc.objects.filter(ensembl_gene_id__isnull=False).values_list(
+        "ensembl_gene_id", flat=True
+    ),
+}
+
+
+class Command(BaseCommand):
+    """Implementation of filling the gene information cache.
+
+    Genes that are already cached for the current release of the gene tables are skipped.
+    """
+
+    #: Help message displayed on the command line.
+    help = "Fill the shared gene information cache with the RefSeq and ENSEMBL genes."
+
+    def add_arguments(self, parser):
+        """Add the command's argument to the ``parser``."""
+        parser.add_argument(
+            "--database",
+            choices=sorted(DEFAULT_GENE_IDS),
+            action="append",
+            help="Gene database to fill the cache for, default is all",
+        )
+        parser.add_argument(
+            "--gene-id",
+            action="append",
+            help="Gene ID to fill the cache for, default is all genes of the HGNC tables",
+        )
+
+    def handle(self, *args, **options):
+        """Perform filling the gene information cache."""
+        if not settings.VARFISH_GENE_INFO_CACHE:
+            raise CommandError("The gene information cache is disabled (VARFISH_GENE_INFO_CACHE)")
+        for database in options["database"] or sorted(DEFAULT_GENE_IDS):
+            gene_ids = options["gene_id"] or sorted(set(DEFAULT_GENE_IDS[database]()))
+            self.stdout.write(
+                "Filling gene information cache for %d %s genes" % (len(gene_ids), database)
+            )
+            count = warm_gene_infos(database, gene_ids)
+            self.stdout.write(
+                self.style.SUCCESS("Cached gene information of %d %s genes" % (count, database))
+            )
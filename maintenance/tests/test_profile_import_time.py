@@ -0,0 +1,47 @@
+"""Tests for the ``profile_import_time`` management command."""
+
+from django.test import TestCase
+
+from ..management.commands.profile_import_time import group_by_app, parse_importtime
+
+
+class ParseImportTimeTest(TestCase):
+    """Tests for ``parse_importtime()``"""
+
+    def testParse(self):
+        lines = [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   _io",
+            "import time:      1503 |       2816 | variants.models",
+            "some other output",
+            "import time:        42 |         42 |     variants.models.sub",
+        ]
+        self.assertEqual(
+            list(parse_importtime(lines)),
+            [("_io", 120, 120), ("variants.models", 1503, 2816), ("variants.models.sub", 42, 42)],
+        )
+
+
+class GroupByAppTest(TestCase):
+    """Tests for ``group_by_app()``"""
+
+    def testGroup(self):
+        records = [
+            ("variants", 10, 10),
+            ("variants.models", 100, 150),
+            ("variants_extra", 5, 5),
+            ("django.contrib.auth", 20, 20),
+            ("django.contrib.auth.models", 30, 30),
+            ("django.db", 40, 40),
+            ("numpy.core", 200, 200),
+        ]
+        self.assertEqual(
+            group_by_app(records, ["variants", "django.contrib.auth"]),
+            {
+                "variants": (2, 110),
+                "variants_extra": (1, 5),
+                "django.contrib.auth": (2, 50),
+                "django": (1, 40),
+                "numpy": (1, 200),
+            },
+        )
@@ -0,0 +1,55 @@
+"""Tests for the ``recount_sv_public_database_overlaps`` management command."""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from importer.models import ImportInfo
+from svs.models import StructuralVariantPublicDatabaseCounts, StructuralVariantSet
+from svs.public_databases import count_public_database_overlaps, get_public_database_version
+from svs.tests.factories import StructuralVariantFactory, StructuralVariantSetFactory
+from svdbs.tests.factories import GnomAdSvFactory
+from variants.helpers import get_engine
+
+
+class RecountSvPublicDatabaseOverlapsTest(TestCase):
+    """Tests for the ``recount_sv_public_database_overlaps`` command"""
+
+    def setUp(self):
+        self.variant_set = StructuralVariantSetFactory()
+        self.sv = StructuralVariantFactory(variant_set=self.variant_set)
+        count_public_database_overlaps(get_engine(), self.variant_set)
+        GnomAdSvFactory(
+            release=self.sv.release,
+            chromosome=self.sv.chromosome,
+            start=self.sv.start,
+            end=self.sv.end,
+        )
+
+    def _recount(self, *args):
+        out = StringIO()
+        call_command("recount_sv_public_database_overlaps", *args, stdout=out)
+        return out.getvalue()
+
+    def _gnomad_count(self):
+        return StructuralVariantPublicDatabaseCounts.objects.get(
+            sv_uuid=self.sv.sv_uuid
+        ).gnomad_overlap_count
+
+    def testUpToDate(self):
+        self.assertIn("of 0 SV sets", self._recount())
+        self.assertEqual(self._gnomad_count(), 0)
+
+    def testAll(self):
+        self.assertIn("of 1 SV sets", self._recount("--all"))
+        self.assertEqual(self._gnomad_count(), 1)
+
+    def testAfterDatabaseImport(self):
+        ImportInfo.objects.create(genomebuild="GRCh37", table="GnomAdSv", release="v2.1")
+        self.assertIn("of 1 SV sets", self._recount())
+        self.assertEqual(self._gnomad_count(), 1)
+        self.assertEqual(
+            StructuralVariantSet.objects.get(pk=self.variant_set.pk).public_database_version,
+            get_public_database_version(),
+        )
@@ -1,14 +1,15 @@
 """Implementation of regmaps management commands."""
 
-import json
 import pathlib
 import sys
+import uuid as uuid_object
 
 import binning
-from django.db import transaction
+from django.db import connection, transaction
 from django.core.management.base import CommandError
 import yaml
 
+from importer.management.helpers import COPY_CHUNK_LINES, CopyChunkReader
 from importer.models import ImportInfo
 from .models import RegMapCollection, RegElementType, RegMap, RegElement, RegInteraction
 
@@ -125,69 +126,151 @@ class CollectionImportImpl:
             self.stderr.write(self.style.SUCCESS("... done"))
 
     def _import_elements(self, element_types, reg_map, path_bed):
-        header = None
-        with path_bed.open("rt") as inputf:
-            for line in inputf:
-                line = line.strip()
-                arr = line.split("\t")
-                if not header:
-                    header = arr
-                    continue
-                chrom, begin, end, et_slug, score = arr[:5]
-                begin = int(begin)
-                end = int(end)
-                elem_type = element_types[et_slug]
-                score = float("NaN") if score in ("", ".", "-") else float(score)
-                if len(arr) > 5:
-                    extra_data = json.loads(arr[5])
-                else:
-                    extra_data = None
-                RegElement.objects.create(
-                    reg_map=reg_map,
-                    elem_type=elem_type,
-                    release=reg_map.collection.release,
-                    chromosome=chrom,
-                    start=begin + 1,
-                    end=end,
-                    bin=binning.assign_bin(begin, end),
-                    score=score,
-                    extra_data=extra_data,
-                )
+        release = reg_map.collection.release
+
+        def yield_rows(arr):
+            chrom, begin, end, et_slug, score = arr[:5]
+            begin = int(begin)
+            end = int(end)
+            yield (
+                uuid_object.uuid4(),
+                reg_map.pk,
+                element_types[et_slug].pk,
+                release,
+                chrom,
+                begin + 1,
+                end,
+                binning.assign_bin(begin, end),
+                _parse_score(score),
+                arr[5] if len(arr) > 5 else None,
+            )
+
+        copy_bed_file(
+            RegElement,
+            (
+                "sodar_uuid",
+                "reg_map_id",
+                "elem_type_id",
+                "release",
+                "chromosome",
+                "start",
+                "end",
+                "bin",
+                "score",
+                "extra_data",
+            ),
+            path_bed,
+            yield_rows,
+            self._progress("elements"),
+        )
 
     def _import_interactions(self, reg_map, path_bed):
-        header = None
+        release = reg_map.collection.release
+
+        def yield_rows(arr):
+            chrom, begin, end, score, chrom1, begin1, end1, chrom2, begin2, end2 = arr[:10]
+            begin = int(begin)
+            end = int(end)
+            yield (
+                uuid_object.uuid4(),
+                reg_map.pk,
+                release,
+                chrom,
+                begin + 1,
+                end,
+                binning.assign_bin(begin, end),
+                _parse_score(score),
+                chrom1,
+                int(begin1) + 1,
+                int(end1),
+                chrom2,
+                int(begin2) + 1,
+                int(end2),
+                arr[10] if len(arr) > 10 else None,
+            )
+
+        copy_bed_file(
+            RegInteraction,
+            (
+                "sodar_uuid",
+                "reg_map_id",
+                "release",
+                "chromosome",
+                "start",
+                "end",
+                "bin",
+                "score",
+                "chromosome1",
+                "start1",
+                "end1",
+                "chromosome2",
+                "start2",
+                "end2",
+                "extra_data",
+            ),
+            path_bed,
+            yield_rows,
+            self._progress("interactions"),
+        )
+
+    def _progress(self, token):
+        """Return progress reporter for the number of imported ``token``."""
+
+        def report(count):
+            print("    ... imported %d %s" % (count, token), file=self.stderr)
+
+        return report
+
+
+def _parse_score(score):
+    return float("NaN") if score in ("", ".", "-") else float(score)
+
+
+def _copy_value(value):
+    """Return ``value`` in the text format of ``COPY``."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_bed_file(model, columns, path_bed, yield_rows, progress=lambda _: None):
+    """Import the BED file at ``path_bed`` into the table of ``model`` with ``COPY ... FROM STDIN``.
+
+    ``yield_rows`` is called with the fields of each line after the header and yields the rows with the values of
+    ``columns``.  The lines are passed to the database in chunks of ``COPY_CHUNK_LINES`` while the file is read
+    and ``progress`` is called with the number of rows after each chunk.
+    """
+
+    def yield_chunks():
+        count = 0
+        lines = []
         with path_bed.open("rt") as inputf:
+            inputf.readline()  # skip header
             for line in inputf:
                 line = line.strip()
-                arr = line.split("\t")
-                if not header:
-                    header = arr
+                if not line:
                     continue
-                chrom, begin, end, score, chrom1, begin1, end1, chrom2, begin2, end2 = arr[:10]
-                begin = int(begin)
-                end = int(end)
-                begin1 = int(begin1)
-                end1 = int(end1)
-                begin2 = int(begin2)
-                end2 = int(end2)
-                score = float("NaN") if score in ("", ".", "-") else float(score)
-                if len(arr) > 5:
-                    extra_data = json.loads(arr[10])
-                else:
-                    extra_data = None
-                RegInteraction.objects.create(
-                    reg_map=reg_map,
-                    release=reg_map.collection.release,
-                    chromosome=chrom,
-                    start=begin + 1,
-                    end=end,
-                    bin=binning.assign_bin(begin, end),
-                    chromosome1=chrom1,
-                    start1=begin1 + 1,
-                    end1=end1,
-                    chromosome2=chrom2,
-                    start2=begin2 + 1,
-                    end2=end2,
-                    score=score,
-                    extra_data=extra_data,
-                )
+                for row in yield_rows(line.split("\t")):
+                    lines.append("\t".join(map(_copy_value, row)) + "\n")
+                if len(lines) >= COPY_CHUNK_LINES:
+                    count += len(lines)
+                    yield "".join(lines)
+                    lines = []
+                    progress(count)
+        if lines:
+            count += len(lines)
+            yield "".join(lines)
+            progress(count)
+
+    quote_name = connection.ops.quote_name
+    sql = "COPY {table} ({columns}) FROM STDIN".format(
+        table=quote_name(model._meta.db_table), columns=", ".join(map(quote_name, columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.copy_expert(sql, CopyChunkReader(yield_chunks()))
@@ -5,6 +5,7 @@ import io
 import sys
 import types
 import uuid
+from unittest.mock import patch
 
 from django.test import TestCase
 
@@ -157,3 +158,19 @@ class CollectionImportImplTest(TestCase):
             }
         ]
         self.assertEquals(expected, vals)
+
+    def testImportChunked(self):
+        path = pathlib.Path(__file__).parent / "ex_coll"
+        style = types.SimpleNamespace(SUCCESS=lambda x: x)
+        f = io.StringIO()
+        with patch("regmaps.cmds.COPY_CHUNK_LINES", 1):
+            CollectionImportImpl(path=str(path), stderr=f, style=style).run()
+
+        self.assertEqual(RegElement.objects.count(), 2)
+        self.assertEqual(RegInteraction.objects.count(), 1)
+        self.assertEqual(
+            [elem.extra_data for elem in RegElement.objects.all()], [None, {"key": "value"}]
+        )
+        self.assertIn("... imported 1 elements", f.getvalue())
+        self.assertIn("... imported 2 elements", f.getvalue())
+        self.assertIn("... imported 1 interactions", f.getvalue())
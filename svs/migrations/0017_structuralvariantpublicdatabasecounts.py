@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("svs", "0016_structuralvariantset_release"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StructuralVariantPublicDatabaseCounts",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("case_id", models.IntegerField()),
+                ("set_id", models.IntegerField()),
+                (
+                    "sv_uuid",
+                    models.UUIDField(help_text="Structural variant UUID foreign key", unique=True),
+                ),
+                ("dgv_overlap_count", models.IntegerField()),
+                ("dgv_gs_overlap_count", models.IntegerField()),
+                ("g1k_overlap_count", models.IntegerField()),
+                ("exac_overlap_count", models.IntegerField()),
+                ("dbvar_overlap_count", models.IntegerField()),
+                ("gnomad_overlap_count", models.IntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="structuralvariantset",
+            name="public_database_min_overlap",
+            field=models.FloatField(
+                blank=True,
+                help_text="Minimal reciprocal overlap of precomputed public database overlap counts",
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="structuralvariantpublicdatabasecounts",
+            index=models.Index(fields=["set_id"], name="svs_structu_set_id_444d63_idx"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("svs", "0017_structuralvariantpublicdatabasecounts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="structuralvariantset",
+            name="public_database_version",
+            field=models.CharField(
+                blank=True,
+                help_text="Version of the public databases of the precomputed overlap counts",
+                max_length=16,
+                null=True,
+            ),
+        ),
+    ]
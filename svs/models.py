@@ -12,15 +12,20 @@ from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.urls import reverse
 from django.db import models
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from projectroles.models import Project
 from projectroles.plugins import get_backend_api
-from sqlalchemy import and_
 
-from variants.models import Case, VARIANT_RATING_CHOICES, VariantImporterBase
+from variants.models import (
+    Case,
+    VARIANT_RATING_CHOICES,
+    VariantImporterBase,
+    invalidate_project_case_summary,
+)
 from variants.helpers import get_meta
+from variants.purge import purge_rows
 
 #: Django user model.
 AUTH_USER_MODEL = getattr(settings, "AUTH_USER_MODEL", "auth.User")
@@ -132,6 +137,19 @@ class StructuralVariantSet(models.Model):
         null=False,
         blank=False,
     )
+    #: The minimal reciprocal overlap of the precomputed public database overlap counts, if any.
+    public_database_min_overlap = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Minimal reciprocal overlap of precomputed public database overlap counts",
+    )
+    #: The version of the public databases that the precomputed overlap counts are for, if any.
+    public_database_version = models.CharField(
+        max_length=16,
+        null=True,
+        blank=True,
+        help_text="Version of the public databases of the precomputed overlap counts",
+    )
 
 
 class StructuralVariant(models.Model):
@@ -257,6 +275,38 @@ class StructuralVariantGeneAnnotation(models.Model):
         db_table = "svs_structuralvariantgeneannotation"
 
 
+class StructuralVariantPublicDatabaseCounts(models.Model):
+    """Overlap counts of a ``StructuralVariant`` with the public SV databases.
+
+    The counts are computed on import for the reciprocal overlap in ``StructuralVariantSet.public_database_min_overlap``
+    such that queries with this overlap do not need to join with the public databases.
+    """
+
+    #: Foreign key to case ID
+    case_id = models.IntegerField()
+    #: The StructuralVariantSet ID
+    set_id = models.IntegerField()
+
+    #: Foreign key into ``StructuralVariant.sv_uuid``.
+    sv_uuid = models.UUIDField(unique=True, help_text="Structural variant UUID foreign key")
+
+    #: Observed gains and losses in DGV
+    dgv_overlap_count = models.IntegerField()
+    #: Carriers in DGV gold standard
+    dgv_gs_overlap_count = models.IntegerField()
+    #: Variant alleles in 1000 genomes
+    g1k_overlap_count = models.IntegerField()
+    #: CNVs in ExAC
+    exac_overlap_count = models.IntegerField()
+    #: Carriers in dbVar
+    dbvar_overlap_count = models.IntegerField()
+    #: Carriers in gnomAD-SV
+    gnomad_overlap_count = models.IntegerField()
+
+    class Meta:
+        indexes = (models.Index(fields=["set_id"]),)
+
+
 @receiver(pre_delete)
 def delete_case_cascaded(sender, instance, **kwargs):
     """Signal handler when attempting to delete a case
@@ -272,11 +322,12 @@ def delete_case_cascaded(sender, instance, **kwargs):
     ```
     """
     if sender == Case:
-        # TODO: delete with SQL alchemy...
-        uuids = [obj.sv_uuid for obj in StructuralVariant.objects.filter(case_id=instance.id)]
-        for uuid in uuids:
-            StructuralVariantGeneAnnotation.objects.filter(sv_uuid=uuid).delete()
-        StructuralVariant.objects.filter(case_id=instance.id).delete()
+        for model in (
+            StructuralVariantGeneAnnotation,
+            StructuralVariantPublicDatabaseCounts,
+            StructuralVariant,
+        ):
+            purge_rows(get_engine(), model.sa.table, {"case_id": instance.id})
 
 
 class _UserAnnotation(models.Model):
@@ -447,6 +498,14 @@ class StructuralVariantFlags(_UserAnnotation):
         )
 
 
+@receiver(post_save, sender=StructuralVariantComment)
+@receiver(post_delete, sender=StructuralVariantComment)
+@receiver(post_save, sender=StructuralVariantFlags)
+@receiver(post_delete, sender=StructuralVariantFlags)
+def annotation_invalidate_project_case_summary(sender, instance, **_kwargs):
+    invalidate_project_case_summary(("annotations",), project__case=instance.case_id)
+
+
 class ImportStructuralVariantBgJob(JobModelMessageMixin, models.Model):
     """Background job for importing structural variants."""
 
@@ -542,6 +601,7 @@ class VariantImporter(VariantImporterBase):
     table_names = (
         ("svs_structuralvariant", "set_id"),
         ("svs_structuralvariantgeneannotation", "set_id"),
+        ("svs_structuralvariantpublicdatabasecounts", "set_id"),
     )
     latest_set = "latest_structural_variant_set"
     release_info = SvAnnotationReleaseInfo
@@ -557,7 +617,21 @@ class VariantImporter(VariantImporterBase):
         )
 
     def _post_import(self, variant_set):
-        pass
+        self._count_public_database_overlaps(variant_set)
+
+    def _count_public_database_overlaps(self, variant_set):
+        """Precompute the overlap counts with the public SV databases."""
+        # This must be imported here to circumvent cyclic dependencies
+        from .public_databases import count_public_database_overlaps  # noqa
+
+        before = timezone.now()
+        self.import_job.add_log_entry("Counting overlaps with public SV databases...")
+        count_public_database_overlaps(get_engine(), variant_set)
+        elapsed = timezone.now() - before
+        self.import_job.add_log_entry(
+            "Finished counting overlaps with public SV databases in %.2f s"
+            % elapsed.total_seconds()
+        )
 
 
 def cleanup_variant_sets(min_age_hours=12):
@@ -567,14 +641,17 @@ def cleanup_variant_sets(min_age_hours=12):
             date_created__lte=datetime.now() - timedelta(hours=min_age_hours)
         ).exclude(state="active")
     )
-    table_names = ("svs_structuralvariant", "svs_structuralvariantgeneannotation")
+    table_names = (
+        "svs_structuralvariant",
+        "svs_structuralvariantgeneannotation",
+        "svs_structuralvariantpublicdatabasecounts",
+    )
     for variant_set in variant_sets:
         for table_name in table_names:
-            table = get_meta().tables[table_name]
-            get_engine().execute(
-                table.delete().where(
-                    and_(table.c.set_id == variant_set.id, table.c.case_id == variant_set.case.id)
-                )
+            purge_rows(
+                get_engine(),
+                get_meta().tables[table_name],
+                {"set_id": variant_set.id, "case_id": variant_set.case.id},
             )
         variant_set.delete()
 
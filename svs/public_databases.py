@@ -0,0 +1,135 @@
+"""Counting overlaps of structural variants with the public SV databases.
+
+The counts of a variant set are precomputed on import.  They are only used while the version token
+of the ``ImportInfo`` records of the databases is unchanged, i.e., until ``import_tables`` imports
+another release of one of the databases.  Use ``python manage.py recount_sv_public_database_overlaps``
+to recompute them then.
+"""
+
+import hashlib
+
+from django.db import transaction
+from sqlalchemy import and_, literal, select, true
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import func
+
+from importer.models import ImportInfo
+from svdbs.models import ThousandGenomesSv, DbVarSv, ExacCnv, DgvSvs, DgvGoldStandardSvs, GnomAdSv
+from .models import StructuralVariant, StructuralVariantPublicDatabaseCounts
+
+#: The minimal reciprocal overlap that the overlap counts are precomputed for on import (the default in the filter
+#: form).
+PUBLIC_DATABASE_MIN_OVERLAP = 0.75
+
+#: The public databases with their token, model, and count of observed events.
+PUBLIC_DATABASES = (
+    ("dgv", DgvSvs, func.sum(DgvSvs.sa.observed_gains) + func.sum(DgvSvs.sa.observed_losses)),
+    ("dgv_gs", DgvGoldStandardSvs, func.sum(DgvGoldStandardSvs.sa.num_carriers)),
+    ("g1k", ThousandGenomesSv, func.sum(ThousandGenomesSv.sa.num_var_alleles)),
+    ("exac", ExacCnv, func.count()),
+    ("dbvar", DbVarSv, func.sum(DbVarSv.sa.num_carriers)),
+    ("gnomad", GnomAdSv, func.sum(GnomAdSv.sa.n_het + GnomAdSv.sa.n_homalt)),
+)
+
+#: The ``ImportInfo`` tables of the public databases.
+PUBLIC_DATABASE_TABLES = tuple(model.__name__ for _, model, _ in PUBLIC_DATABASES)
+
+
+def get_public_database_version():
+    """Return the version token of the imported public databases."""
+    records = (
+        ImportInfo.objects.filter(table__in=PUBLIC_DATABASE_TABLES)
+        .order_by("genomebuild", "table")
+        .values_list("genomebuild", "table", "release", "timestamp")
+    )
+    return hashlib.sha1(repr(list(records)).encode("utf-8")).hexdigest()[:16]
+
+
+def has_current_public_database_counts(variant_set, min_overlap=PUBLIC_DATABASE_MIN_OVERLAP):
+    """Return whether ``variant_set`` has counts for ``min_overlap`` and the imported public databases."""
+    return (
+        variant_set.public_database_min_overlap == min_overlap
+        and variant_set.public_database_version == get_public_database_version()
+    )
+
+
+def public_database_subquery(token, model, observed_events, min_overlap):
+    """Return lateral subquery with the ``observed_events`` in ``model`` overlapping a ``StructuralVariant``."""
+    # This must be imported here to circumvent cyclic dependencies
+    from .queries import overlaps  # noqa
+
+    if hasattr(model, "start_outer"):
+        model_start = model.sa.start_outer
+        model_end = model.sa.end_inner
+    else:
+        model_start = model.sa.start
+        model_end = model.sa.end
+    return (
+        select([observed_events.label("observed_events")])
+        .select_from(model.sa)
+        .where(
+            and_(
+                # TODO: type mapping -- interesting/necessary?
+                # StructuralVariant.sa.sv_type == model.sa.sv_type,
+                overlaps(
+                    StructuralVariant,
+                    model,
+                    min_overlap=min_overlap,
+                    rhs_start=model_start,
+                    rhs_end=model_end,
+                )
+            )
+        )
+        .alias("subquery_%s_inner" % token)
+    ).lateral("subquery_%s_outer" % token)
+
+
+def count_public_database_overlaps(engine, variant_set, min_overlap=PUBLIC_DATABASE_MIN_OVERLAP):
+    """Store the overlap counts of the structural variants in ``variant_set`` with the public databases.
+
+    Previously stored counts of ``variant_set`` are replaced.
+    """
+    version = get_public_database_version()
+    subqueries = {
+        token: public_database_subquery(token, model, observed_events, min_overlap)
+        for token, model, observed_events in PUBLIC_DATABASES
+    }
+    selectable = StructuralVariant.sa.table
+    for subquery in subqueries.values():
+        selectable = selectable.outerjoin(subquery, true())
+    stmt = (
+        select(
+            [
+                literal(variant_set.case_id).label("case_id"),
+                literal(variant_set.id).label("set_id"),
+                StructuralVariant.sa.sv_uuid,
+            ]
+            + [
+                func.coalesce(subquery.c.observed_events, 0).label("%s_overlap_count" % token)
+                for token, subquery in subqueries.items()
+            ]
+        )
+        .select_from(selectable)
+        .where(
+            and_(
+                StructuralVariant.sa.case_id == variant_set.case_id,
+                StructuralVariant.sa.set_id == variant_set.id,
+            )
+        )
+    )
+    table = StructuralVariantPublicDatabaseCounts.sa.table
+    columns = ["case_id", "set_id", "sv_uuid"] + [
+        "%s_overlap_count" % token for token, _, _ in PUBLIC_DATABASES
+    ]
+    with transaction.atomic():
+        StructuralVariantPublicDatabaseCounts.objects.filter(set_id=variant_set.id).delete()
+        engine.execute(
+            insert(table)
+            .from_select(columns, stmt)
+            .on_conflict_do_nothing(index_elements=["sv_uuid"])
+        )
+        variant_set.__class__.objects.filter(pk=variant_set.pk).update(
+            public_database_min_overlap=min_overlap, public_database_version=version
+        )
+        variant_set.public_database_min_overlap = min_overlap
+        variant_set.public_database_version = version
@@ -20,8 +20,15 @@ from .models import (
     StructuralVariantGeneAnnotation,
     StructuralVariantComment,
     StructuralVariantFlags,
+    StructuralVariantPublicDatabaseCounts,
     StructuralVariantSet,
 )
+from .public_databases import (
+    PUBLIC_DATABASE_MIN_OVERLAP,
+    PUBLIC_DATABASES,
+    get_public_database_version,
+    public_database_subquery,
+)
 from genomicfeatures.models import (
     EnsemblRegulatoryFeature,
     GeneInterval,
@@ -31,7 +38,6 @@ from genomicfeatures.models import (
     VistaEnhancer,
 )
 from geneinfo.models import Hgnc
-from svdbs.models import ThousandGenomesSv, DbVarSv, ExacCnv, DgvSvs, DgvGoldStandardSvs, GnomAdSv
 from variants.queries import (
     QueryParts,
     QueryPartsBuilder,
@@ -306,58 +312,61 @@ class ExtendQueryPartsSvTypeFilter(ExtendQueryPartsBase):
 
 
 class ExtendQueryPartsPublicDatabaseFrequencyJoinAndFilter(ExtendQueryPartsBase):
-    """Extend ``QueryParts`` for filtering for public database overlap and filter."""
+    """Extend ``QueryParts`` for filtering for public database overlap and filter.
+
+    The overlap counts precomputed on import are used for the databases where the minimal reciprocal overlap
+    matches, the others are joined.
+    """
 
     #: Information for processing the public databases.
-    TOKEN_MODEL_FIELD = (
-        ("dgv", DgvSvs, func.sum(DgvSvs.sa.observed_gains) + func.sum(DgvSvs.sa.observed_losses)),
-        ("dgv_gs", DgvGoldStandardSvs, func.sum(DgvGoldStandardSvs.sa.num_carriers)),
-        ("g1k", ThousandGenomesSv, func.sum(ThousandGenomesSv.sa.num_var_alleles)),
-        ("exac", ExacCnv, func.count()),
-        ("dbvar", DbVarSv, func.sum(DbVarSv.sa.num_carriers)),
-        ("gnomad", GnomAdSv, func.sum(GnomAdSv.sa.n_het + GnomAdSv.sa.n_homalt)),
-    )
+    TOKEN_MODEL_FIELD = PUBLIC_DATABASES
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.precomputed_tokens = self._get_precomputed_tokens()
         self.subqueries = self._build_subqueries()
         self.fields = self._build_fields(self.subqueries)
 
+    def _get_min_overlap(self, token):
+        return float(self.kwargs.get("%s_min_overlap" % token, PUBLIC_DATABASE_MIN_OVERLAP))
+
+    def _get_precomputed_tokens(self):
+        variant_set = (
+            StructuralVariantSet.objects.filter(case=self.case, state="active")
+            .order_by("-date_created")
+            .first()
+        )
+        if not variant_set or variant_set.public_database_min_overlap is None:
+            return set()
+        if variant_set.public_database_version != get_public_database_version():
+            # The counts are for another release of the public databases.
+            return set()
+        return {
+            token
+            for token, _, _ in self.TOKEN_MODEL_FIELD
+            if self._get_min_overlap(token) == variant_set.public_database_min_overlap
+        }
+
     def _build_subqueries(self):
         result = {}
         for token, model, observed_events in self.TOKEN_MODEL_FIELD:
-            if hasattr(model, "start_outer"):
-                model_start = model.sa.start_outer
-                model_end = model.sa.end_inner
-            else:
-                model_start = model.sa.start
-                model_end = model.sa.end
-            min_overlap = float(self.kwargs.get("%s_min_overlap" % token, "0.75"))
-            result[token] = (
-                select([observed_events.label("observed_events")])
-                .select_from(model.sa)
-                .where(
-                    and_(
-                        # TODO: type mapping -- interesting/necessary?
-                        # StructuralVariant.sa.sv_type == model.sa.sv_type,
-                        overlaps(
-                            StructuralVariant,
-                            model,
-                            min_overlap=min_overlap,
-                            rhs_start=model_start,
-                            rhs_end=model_end,
-                        )
-                    )
+            if token not in self.precomputed_tokens:
+                result[token] = public_database_subquery(
+                    token, model, observed_events, self._get_min_overlap(token)
                 )
-                .alias("subquery_%s_inner" % token)
-            ).lateral("subquery_%s_outer" % token)
         return result
 
     def _build_fields(self, subqueries):
         # NB: subqueries is given as a parameter here to highlight the dependency between the two helper functions
         fields = {}
         for token, _, observed_events in self.TOKEN_MODEL_FIELD:
-            field = func.coalesce(subqueries[token].c.observed_events, 0)
+            if token in self.precomputed_tokens:
+                observed_events = getattr(
+                    StructuralVariantPublicDatabaseCounts.sa, "%s_overlap_count" % token
+                )
+            else:
+                observed_events = subqueries[token].c.observed_events
+            field = func.coalesce(observed_events, 0)
             fields["%s_overlap_count" % token] = field.label("%s_overlap_count" % token)
         return fields
 
@@ -380,6 +389,11 @@ class ExtendQueryPartsPublicDatabaseFrequencyJoinAndFilter(ExtendQueryPartsBase)
 
     def extend_selectable(self, query_parts):
         result = query_parts.selectable
+        if self.precomputed_tokens:
+            result = result.outerjoin(
+                StructuralVariantPublicDatabaseCounts.sa.table,
+                StructuralVariantPublicDatabaseCounts.sa.sv_uuid == StructuralVariant.sa.sv_uuid,
+            )
         for subquery in self.subqueries.values():
             result = result.outerjoin(subquery, true())
         return result
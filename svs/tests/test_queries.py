@@ -9,15 +9,24 @@ from genomicfeatures.tests.factories import (
     TadBoundaryIntervalFactory,
     VistaEnhancerFactory,
 )
+from importer.models import ImportInfo
 from regmaps.tests.factories import RegElementFactory, RegMapFactory, RegElementTypeFactory
+from svdbs.models import GnomAdSv
 from svdbs.tests.factories import GnomAdSvFactory
+from variants.helpers import get_engine
 from .factories import (
     StructuralVariantFactory,
     StructuralVariantGeneAnnotationFactory,
     StructuralVariantSetFactory,
 )
 from .helpers import QueryTestBase
-from ..models import SV_TYPE_CHOICES, SV_SUB_TYPE_CHOICES, StructuralVariant
+from ..models import (
+    SV_TYPE_CHOICES,
+    SV_SUB_TYPE_CHOICES,
+    StructuralVariant,
+    StructuralVariantPublicDatabaseCounts,
+)
+from ..public_databases import count_public_database_overlaps, get_public_database_version
 from ..queries import SingleCaseFilterQuery
 
 
@@ -618,6 +627,65 @@ class SvDatabaseFrequencyAnnotationTest(QueryTestBase):
         self.assertEquals(result[0].gnomad_overlap_count, 0)
 
 
+class SvDatabaseFrequencyPrecomputedAnnotationTest(QueryTestBase):
+    """Test for annotation with database entries that were counted on import."""
+
+    def setUp(self):
+        super().setUp()
+        self.variant_set = StructuralVariantSetFactory(
+            case__structure="trio", case__inheritance="denovo"
+        )
+        self.case = self.variant_set.case
+        self.sv = StructuralVariantFactory(variant_set=self.variant_set)
+        GnomAdSvFactory(
+            release=self.sv.release,
+            chromosome=self.sv.chromosome,
+            start=self.sv.start + (self.sv.end - self.sv.start) * 0.20,
+            end=self.sv.end + (self.sv.end - self.sv.start) * 0.20,
+        )
+        count_public_database_overlaps(get_engine(), self.variant_set, min_overlap=0.50)
+        # The precomputed counts are used instead of the database for the same overlap.
+        GnomAdSv.objects.all().delete()
+
+    def testCounts(self):
+        counts = StructuralVariantPublicDatabaseCounts.objects.get(sv_uuid=self.sv.sv_uuid)
+        self.assertEqual(counts.gnomad_overlap_count, 1)
+        self.assertEqual(counts.dgv_overlap_count, 0)
+
+    def testGnomadAnnotationPrecomputed(self):
+        result = self.run_query(
+            SingleCaseFilterQuery,
+            {"gnomad_enabled": True, "gnomad_min_overlap": 0.50, "gnomad_max_carriers": 1},
+            1,
+        )
+        self.assertUUIDEquals(result[0].sv_uuid, self.sv.sv_uuid)
+        self.assertEquals(result[0].gnomad_overlap_count, 1)
+
+    def testGnomadFilterPrecomputed(self):
+        self.run_query(
+            SingleCaseFilterQuery,
+            {"gnomad_enabled": True, "gnomad_min_overlap": 0.50, "gnomad_max_carriers": 0},
+            0,
+        )
+
+    def testGnomadAnnotationOtherOverlap(self):
+        result = self.run_query(SingleCaseFilterQuery, {"gnomad_min_overlap": 0.60}, 1)
+        self.assertEquals(result[0].gnomad_overlap_count, 0)
+
+    def testGnomadAnnotationOtherDatabaseRelease(self):
+        # The precomputed counts are not used after importing another release of a database.
+        ImportInfo.objects.create(genomebuild="GRCh37", table="GnomAdSv", release="v2.1")
+        result = self.run_query(SingleCaseFilterQuery, {"gnomad_min_overlap": 0.50}, 1)
+        self.assertEquals(result[0].gnomad_overlap_count, 0)
+
+    def testRecount(self):
+        ImportInfo.objects.create(genomebuild="GRCh37", table="GnomAdSv", release="v2.1")
+        count_public_database_overlaps(get_engine(), self.variant_set, min_overlap=0.50)
+        counts = StructuralVariantPublicDatabaseCounts.objects.get(sv_uuid=self.sv.sv_uuid)
+        self.assertEqual(counts.gnomad_overlap_count, 0)
+        self.assertEqual(self.variant_set.public_database_version, get_public_database_version())
+
+
 class RegionFilterQueryTest(QueryTestBase):
     def setUp(self):
         super().setUp()
@@ -1,13 +1,14 @@
 """QC metric computation contained in this package."""
 
-from itertools import chain
+from itertools import islice
 
-import numpy as np
-from sqlalchemy import or_
 from sqlalchemy.sql import select, and_, not_, func
 
+from varfish.utils import LazyModule
 from .models import ReferenceSite
 
+np = LazyModule("numpy")
+
 
 def _compute_het_hom_chrx_stmt(variant_model, variant_set):
     """Build SQL Alchemy statement given the variant model class and the case object."""
@@ -103,11 +104,98 @@ def _compute_relatedness_stmt(variant_model, variant_set):
     )
 
 
-def _normalize_gt(gt):
-    if gt == "1/0":
-        return "0/1"
-    else:
-        return gt
+#: Genotype codes for relatedness computation, further genotypes are assigned codes on the fly.
+GT_CODES = {"./.": -1, "0/0": 0, "0/1": 1, "1/0": 1, "1/1": 2}
+#: Genotype code for no-call.
+GT_NOCALL = GT_CODES["./."]
+#: Genotype codes of het. and hom. alt. calls.
+GT_HET, GT_HOM_ALT = GT_CODES["0/1"], GT_CODES["1/1"]
+#: Number of sites to decode and process at once when computing relatedness.
+RELATEDNESS_BLOCK_SIZE = 4096
+
+
+def _count_pairs(a, b):
+    """Count sites where both indicators are set for all pairs of columns of ``a`` and ``b``."""
+    return np.rint(a.T.astype(np.float64) @ b.astype(np.float64)).astype(np.int64)
+
+
+def _decode_genotype_block(rows, sample_idx, gt_codes):
+    """Decode the ``jsonb_agg()``-ed genotypes of ``rows`` into genotype code and depth matrices (sites x samples).
+
+    Later parts of a row's genotype take precedence, as when merging them into one ``dict``.
+    """
+    gts = np.full((len(rows), len(sample_idx)), GT_NOCALL, dtype=np.int8)
+    dps = np.full((len(rows), len(sample_idx)), -1, dtype=np.int32)
+    for i, row in enumerate(rows):
+        for part in row.genotype:
+            for sample, call in part.items():
+                j = sample_idx.get(sample)
+                if j is None:
+                    continue
+                gt = call.get("gt", "./.")
+                if gt not in gt_codes:
+                    gt_codes[gt] = len(gt_codes) - 1
+                gts[i, j] = gt_codes[gt]
+                dp = call.get("dp", -1)
+                dps[i, j] = -1 if dp is None else dp
+    return gts, dps
+
+
+def _compute_relatedness_genotypes(rows, samples, min_depth, n_sites):
+    """Compute relatedness statistics from the genotype rows of ``_compute_relatedness_stmt*()``.
+
+    The genotypes are processed in blocks of ``RELATEDNESS_BLOCK_SIZE`` sites that are decoded into a
+    genotype matrix.  The pairwise counts are then obtained with matrix products of the genotype indicator
+    matrices.  No-calls are assumed to be hom. ref. unless both samples of a pair are no-calls.
+
+    Return ``het, het_shared, ibs0, ibs1, ibs2``.
+    """
+    samples = list(samples)
+    sample_idx = {sample: j for j, sample in enumerate(samples)}
+    gt_codes = dict(GT_CODES)
+    n_het = np.zeros(len(samples), dtype=np.int64)
+    n_het_shared = np.zeros((len(samples), len(samples)), dtype=np.int64)
+    n_ibs0 = np.zeros((len(samples), len(samples)), dtype=np.int64)
+    n_ibs2 = np.zeros((len(samples), len(samples)), dtype=np.int64)
+    n_compared = np.zeros((len(samples), len(samples)), dtype=np.int64)
+
+    kept = 0
+    rows = iter(rows)
+    while samples and kept <= n_sites:
+        block = list(islice(rows, RELATEDNESS_BLOCK_SIZE))
+        if not block:
+            break
+        gts, dps = _decode_genotype_block(block, sample_idx, gt_codes)
+        # Skip sites where depth is not sufficient and stop once enough sites are kept.
+        gts = gts[(dps >= min_depth).all(axis=1)][: n_sites + 1 - kept]
+        kept += gts.shape[0]
+        # Compute statistics
+        nocall = gts == GT_NOCALL
+        gts[nocall] = GT_CODES["0/0"]  # assume HOM_REF
+        n_het += (gts == GT_HET).sum(axis=0)
+        both_nocall = _count_pairs(nocall, nocall)
+        n_compared += gts.shape[0] - both_nocall
+        for code in np.unique(gts):
+            is_code = gts == code
+            n_code = _count_pairs(is_code, is_code)
+            n_ibs2 += n_code
+            if code == GT_HET:
+                n_het_shared += n_code
+        hom_ref, hom_alt = gts == GT_CODES["0/0"], gts == GT_HOM_ALT
+        n_ibs0 += _count_pairs(hom_ref, hom_alt) + _count_pairs(hom_alt, hom_ref)
+        n_ibs2 -= both_nocall
+
+    # Build result.
+    sample_pairs = [(i, j) for i in range(len(samples)) for j in range(len(samples)) if i > j]
+    het = {s: int(n_het[i]) for i, s in enumerate(samples)}
+    het_shared = {(samples[i], samples[j]): int(n_het_shared[i, j]) for i, j in sample_pairs}
+    ibs0 = {(samples[i], samples[j]): int(n_ibs0[i, j]) for i, j in sample_pairs}
+    ibs1 = {
+        (samples[i], samples[j]): int(n_compared[i, j] - n_ibs0[i, j] - n_ibs2[i, j])
+        for i, j in sample_pairs
+    }
+    ibs2 = {(samples[i], samples[j]): int(n_ibs2[i, j]) for i, j in sample_pairs}
+    return het, het_shared, ibs0, ibs1, ibs2
 
 
 def compute_relatedness(connection, variant_model, variant_set, min_depth=7, n_sites=10000):
@@ -118,81 +206,20 @@ def compute_relatedness(connection, variant_model, variant_set, min_depth=7, n_s
     # Obtain the genotypes.
     stmt = _compute_relatedness_stmt(variant_model, variant_set)
     result = connection.execute(stmt)
-
-    # Compute sample pairs to consider.
     samples = variant_set.case.get_members_with_samples()
-    sample_pairs = [(s, t) for i, s in enumerate(samples) for j, t in enumerate(samples) if i > j]
-    # Statistics.
-    het = {s: 0 for s in samples}
-    het_shared = {p: 0 for p in sample_pairs}
-    ibs0 = {p: 0 for p in sample_pairs}
-    ibs1 = {p: 0 for p in sample_pairs}
-    ibs2 = {p: 0 for p in sample_pairs}
-
-    # Iterate over genotypes of pseudo-autosomal regions on chrX.
-    kept = 0
-    for row in result.fetchall():
-        genotype = {}
-        for part in row.genotype:
-            genotype = {**genotype, **part}
-        # Skip if too few samples are called.
-        gts = {
-            sample: _normalize_gt(genotype.get(sample, {}).get("gt", "./.")) for sample in samples
-        }
-        nocalls = [gt for gt in gts if gt == "./."]
-        if not gts:
-            continue
-        if len(nocalls) / len(gts) > 0.1 and len(gts) - len(nocalls) < 5:
-            continue  # skip, too few calls
-        # Skip if depth not sufficient.
-        # TODO: will fail without depth annotation
-        gt_depths = np.asarray([genotype.get(sample, {}).get("dp", -1) for sample in samples])
-        if any(gt_depths < min_depth):
-            continue  # skip, coverage too low
-        # Compute statistics
-        for sample in samples:
-            het[sample] += gts[sample] in ("0/1", "1/0")
-        for s, t in sample_pairs:
-            gt1 = gts[s]
-            gt2 = gts[t]
-            if gt1 == "./." and gt2 == "./.":
-                continue  # skip if both no-call
-            if gt1 == "./.":  # assume HOM_REF
-                gt1 = "0/0"
-            if gt2 == "./.":  # assume HOM_REF
-                gt2 = "0/0"
-            gt_set = {gt1, gt2}
-            if len(gt_set) == 1:
-                ibs2[(s, t)] += 1
-                if gt1 == "0/1":
-                    het_shared[(s, t)] += 1
-            elif gt_set == {"0/0", "1/1"}:
-                ibs0[(s, t)] += 1
-            else:
-                ibs1[(s, t)] += 1
-        kept += 1
-        if kept > n_sites:
-            break
+    return _compute_relatedness_genotypes(result, samples, min_depth, n_sites)
 
-    # Return result.
-    return het, het_shared, ibs0, ibs1, ibs2
 
+#: Site genotype code for sites that are not called with sufficient depth in a sample.
+SITE_GT_MISSING = -2
+#: Site genotype code for genotypes other than those in ``GT_CODES``.
+SITE_GT_OTHER = 3
 
-def _compute_relatedness_stmt_many(variant_model, cases):
-    """Build SQL Alchemy statement given the variant model class and multiple case objects."""
-    variant_set_conditions = []
-    for case in cases:
-        variant_set = case.latest_variant_set
-        if variant_set:
-            variant_set_conditions.append(
-                and_(
-                    variant_model.sa.set_id == variant_set.id,
-                    variant_model.sa.case_id == variant_set.case.id,
-                )
-            )
 
+def _compute_site_genotypes_stmt(variant_model, variant_set):
+    """Build SQL Alchemy statement for the genotypes of ``variant_set`` at the reference sites."""
     return (
-        select([func.jsonb_agg(variant_model.sa.genotype).label("genotype")])
+        select([variant_model.sa.chromosome, variant_model.sa.start, variant_model.sa.genotype])
         .select_from(
             variant_model.sa.table.join(
                 ReferenceSite.sa.table,
@@ -204,86 +231,124 @@ def _compute_relatedness_stmt_many(variant_model, cases):
             )
         )
         .where(
-            and_(or_(*variant_set_conditions), not_(variant_model.sa.chromosome.in_(("X", "Y"))))
+            and_(
+                variant_model.sa.set_id == variant_set.id,
+                variant_model.sa.case_id == variant_set.case.id,
+                not_(variant_model.sa.chromosome.in_(("X", "Y"))),
+            )
         )
-        .group_by(
-            variant_model.sa.chromosome,
-            variant_model.sa.start,
-            variant_model.sa.end,
-            variant_model.sa.reference,
-            variant_model.sa.alternative,
+    )
+
+
+def get_reference_site_index(connection, release):
+    """Return ``dict`` mapping ``(chromosome, start)`` of the autosomal reference sites to their index."""
+    stmt = (
+        select([ReferenceSite.sa.chromosome, ReferenceSite.sa.start])
+        .select_from(ReferenceSite.sa.table)
+        .where(
+            and_(
+                ReferenceSite.sa.release == release,
+                not_(ReferenceSite.sa.chromosome.in_(("X", "Y"))),
+            )
         )
+        .order_by(ReferenceSite.sa.chromosome, ReferenceSite.sa.start)
     )
+    return {
+        (row.chromosome, row.start): i for i, row in enumerate(connection.execute(stmt).fetchall())
+    }
 
 
-def compute_relatedness_many(connection, variant_model, cases, min_depth=7, n_sites=10000):
-    """Compute relatedness between pairs over a set of cases.
+def compute_site_genotypes(connection, variant_model, variant_set, min_depth=7, site_index=None):
+    """Compute the genotype vectors of the samples of ``variant_set`` at the reference sites.
 
-    Return ``het, het_shared, ibs0, ibs1, ibs2``.
-    """
-    # Obtain the genotypes.
-    stmt = _compute_relatedness_stmt_many(variant_model, cases)
-    result = connection.execute(stmt)
+    The vectors are ``int8`` arrays with one entry per site of ``get_reference_site_index()`` holding the
+    genotype code of ``GT_CODES``, ``SITE_GT_OTHER``, or ``SITE_GT_MISSING`` for sites that are not called
+    with ``min_depth``.
 
-    # Collect project-wide samples and sample pairs.
-    samples = set(chain(*(case.get_members_with_samples() for case in cases)))
-    sample_pairs = [(s, t) for i, s in enumerate(samples) for j, t in enumerate(samples) if i > j]
-
-    # Statistics.
-    het = {s: 0 for s in samples}
-    het_shared = {p: 0 for p in sample_pairs}
-    ibs0 = {p: 0 for p in sample_pairs}
-    ibs1 = {p: 0 for p in sample_pairs}
-    ibs2 = {p: 0 for p in sample_pairs}
-
-    # Return defaults if project is empty
-    if result.rowcount == 0:
-        return het, het_shared, ibs0, ibs1, ibs2
-    # Iterate over genotypes of pseudo-autosomal regions on chrX.
-    kept = 0
-    for row in result.fetchall():
-        # Merge the genotype dictionaries.
-        genotype = {}
-        for part in row.genotype:
-            genotype = {**genotype, **part}
-        # Skip if too few samples are called.
-        gts = {
-            sample: _normalize_gt(genotype.get(sample, {}).get("gt", "./.")) for sample in samples
-        }
-        nocalls = [gt for gt in gts if gt == "./."]
-        if not gts:
+    Return ``dict`` mapping sample name to genotype vector.
+    """
+    if site_index is None:
+        site_index = get_reference_site_index(connection, variant_set.release)
+    samples = variant_set.case.get_members_with_samples()
+    gts = np.full((len(site_index), len(samples)), SITE_GT_MISSING, dtype=np.int8)
+    stmt = _compute_site_genotypes_stmt(variant_model, variant_set)
+    for row in connection.execute(stmt):
+        i = site_index.get((row.chromosome, row.start))
+        if i is None:
             continue
-        if len(nocalls) / len(gts) > 0.1 and len(gts) - len(nocalls) < 5:
-            continue  # skip, too few calls
-        # Skip if depth not sufficient.
-        # TODO: will fail without depth annotation
-        gt_depths = np.asarray([genotype.get(sample, {}).get("dp", -1) for sample in samples])
-        if any(gt_depths < min_depth):
-            continue  # skip, coverage too low
-        # Compute statistics
-        for sample in samples:
-            het[sample] += gts[sample] in ("0/1", "1/0")
-        for s, t in sample_pairs:
-            gt1 = gts[s]
-            gt2 = gts[t]
-            if gt1 == "./." and gt2 == "./.":
-                continue  # skip if both no-call
-            if gt1 == "./.":  # assume HOM_REF
-                gt1 = "0/0"
-            if gt2 == "./.":  # assume HOM_REF
-                gt2 = "0/0"
-            gt_set = {gt1, gt2}
-            if len(gt_set) == 1:
-                ibs2[(s, t)] += 1
-                if gt1 == "0/1":
-                    het_shared[(s, t)] += 1
-            elif gt_set == {"0/0", "1/1"}:
-                ibs0[(s, t)] += 1
+        for j, sample in enumerate(samples):
+            call = row.genotype.get(sample, {})
+            dp = call.get("dp")
+            if dp is None or dp < min_depth:
+                gts[i, j] = SITE_GT_MISSING
             else:
-                ibs1[(s, t)] += 1
-        kept += 1
-        if kept > n_sites:
-            break
+                gts[i, j] = GT_CODES.get(call.get("gt", "./."), SITE_GT_OTHER)
+    return {sample: gts[:, j].copy() for j, sample in enumerate(samples)}
 
-    # Return result.
-    return het, het_shared, ibs0, ibs1, ibs2
+
+def compute_site_genotype_relatedness(genotypes, other_genotypes=None):
+    """Compute relatedness between pairs of samples from their genotype vectors.
+
+    The vectors are given as ``dict``s mapping sample name to the vectors of ``compute_site_genotypes()``.  If
+    ``other_genotypes`` is given then all pairs between ``genotypes`` and ``other_genotypes`` are considered,
+    otherwise the pairs within ``genotypes``.  Sites are only considered for a pair if they are called with
+    sufficient depth and with a genotype of ``GT_CODES`` in both samples.  As in ``compute_relatedness()``,
+    no-calls are assumed to be hom. ref. unless both samples of a pair are no-calls.
+
+    Return ``dict`` mapping sample pairs to ``dict`` with the fields of ``BaseRelatedness``.
+    """
+    samples = list(genotypes)
+    other_samples = samples if other_genotypes is None else list(other_genotypes)
+    if not samples or not other_samples:
+        return {}
+    gts = np.stack([genotypes[s] for s in samples], axis=1)
+    other_gts = (
+        gts
+        if other_genotypes is None
+        else np.stack([other_genotypes[s] for s in other_samples], axis=1)
+    )
+    shape = (len(samples), len(other_samples))
+    counts = {
+        key: np.zeros(shape, dtype=np.int64)
+        for key in ("het_1_2", "het_1", "het_2", "n_ibs0", "n_ibs2", "n_compared")
+    }
+    for begin in range(0, gts.shape[0], RELATEDNESS_BLOCK_SIZE):
+        block = gts[begin : begin + RELATEDNESS_BLOCK_SIZE]
+        other_block = other_gts[begin : begin + RELATEDNESS_BLOCK_SIZE]
+        # Genotypes other than those in ``GT_CODES`` cannot be compared, exclude them as missing.
+        called = (block != SITE_GT_MISSING) & (block != SITE_GT_OTHER)
+        other_called = (other_block != SITE_GT_MISSING) & (other_block != SITE_GT_OTHER)
+        nocall, other_nocall = block == GT_NOCALL, other_block == GT_NOCALL
+        # Assume HOM_REF for no-calls, sites with missing calls are excluded by ``called``.
+        block = np.where(nocall, GT_CODES["0/0"], block)
+        other_block = np.where(other_nocall, GT_CODES["0/0"], other_block)
+        het, other_het = block == GT_HET, other_block == GT_HET
+        hom_ref, other_hom_ref = block == GT_CODES["0/0"], other_block == GT_CODES["0/0"]
+        hom_alt, other_hom_alt = block == GT_HOM_ALT, other_block == GT_HOM_ALT
+        both_nocall = _count_pairs(nocall, other_nocall)
+        het_shared = _count_pairs(het, other_het)
+        counts["het_1_2"] += het_shared
+        counts["het_1"] += _count_pairs(het, other_called)
+        counts["het_2"] += _count_pairs(called, other_het)
+        counts["n_ibs0"] += _count_pairs(hom_ref, other_hom_alt) + _count_pairs(
+            hom_alt, other_hom_ref
+        )
+        counts["n_ibs2"] += (
+            _count_pairs(hom_ref, other_hom_ref)
+            + het_shared
+            + _count_pairs(hom_alt, other_hom_alt)
+            - both_nocall
+        )
+        counts["n_compared"] += _count_pairs(called, other_called) - both_nocall
+
+    if other_genotypes is None:
+        pairs = [(i, j) for i in range(len(samples)) for j in range(len(samples)) if i > j]
+    else:
+        pairs = [(i, j) for i in range(len(samples)) for j in range(len(other_samples))]
+    result = {}
+    for i, j in pairs:
+        values = {key: int(value[i, j]) for key, value in counts.items()}
+        n_compared = values.pop("n_compared")
+        values["n_ibs1"] = n_compared - values["n_ibs0"] - values["n_ibs2"]
+        result[(samples[i], other_samples[j])] = values
+    return result
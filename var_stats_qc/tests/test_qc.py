@@ -0,0 +1,186 @@
+"""Tests for the QC metric computation in ``qc``."""
+
+import random
+import types
+from unittest.mock import patch
+
+import numpy as np
+from django.test import TestCase
+
+from ..qc import (
+    GT_CODES,
+    SITE_GT_MISSING,
+    SITE_GT_OTHER,
+    _compute_relatedness_genotypes,
+    compute_site_genotype_relatedness,
+)
+
+
+def _reference_relatedness(rows, samples, min_depth, n_sites):
+    """Straightforward per-site and per-pair computation of the relatedness statistics."""
+    sample_pairs = [(s, t) for i, s in enumerate(samples) for j, t in enumerate(samples) if i > j]
+    het = {s: 0 for s in samples}
+    het_shared = {p: 0 for p in sample_pairs}
+    ibs0 = {p: 0 for p in sample_pairs}
+    ibs1 = {p: 0 for p in sample_pairs}
+    ibs2 = {p: 0 for p in sample_pairs}
+    kept = 0
+    for row in rows:
+        genotype = {}
+        for part in row.genotype:
+            genotype = {**genotype, **part}
+        gts = {
+            sample: genotype.get(sample, {}).get("gt", "./.").replace("1/0", "0/1")
+            for sample in samples
+        }
+        if any(genotype.get(sample, {}).get("dp", -1) < min_depth for sample in samples):
+            continue
+        for sample in samples:
+            het[sample] += gts[sample] == "0/1"
+        for s, t in sample_pairs:
+            gt1, gt2 = gts[s], gts[t]
+            if gt1 == "./." and gt2 == "./.":
+                continue
+            gt1 = "0/0" if gt1 == "./." else gt1
+            gt2 = "0/0" if gt2 == "./." else gt2
+            if gt1 == gt2:
+                ibs2[(s, t)] += 1
+                het_shared[(s, t)] += gt1 == "0/1"
+            elif {gt1, gt2} == {"0/0", "1/1"}:
+                ibs0[(s, t)] += 1
+            else:
+                ibs1[(s, t)] += 1
+        kept += 1
+        if kept > n_sites:
+            break
+    return het, het_shared, ibs0, ibs1, ibs2
+
+
+def _row(*parts):
+    return types.SimpleNamespace(genotype=list(parts))
+
+
+def _call(gt, dp=30):
+    return {"gt": gt, "dp": dp}
+
+
+class ComputeRelatednessGenotypesTest(TestCase):
+    """Tests for ``_compute_relatedness_genotypes()``"""
+
+    samples = ["index", "father", "mother"]
+
+    def _assert_matches_reference(self, rows, min_depth=7, n_sites=10000):
+        self.assertEqual(
+            _compute_relatedness_genotypes(rows, self.samples, min_depth, n_sites),
+            _reference_relatedness(rows, self.samples, min_depth, n_sites),
+        )
+
+    def test_fixed_genotypes(self):
+        rows = [
+            _row({"index": _call("0/1"), "father": _call("0/1"), "mother": _call("0/0")}),
+            _row({"index": _call("1/0"), "father": _call("1/1"), "mother": _call("0/1")}),
+            _row({"index": _call("1/1"), "father": _call("0/0"), "mother": _call("1/1")}),
+            _row({"index": _call("1/2"), "father": _call("1/2"), "mother": _call("0/2")}),
+        ]
+        het, het_shared, ibs0, ibs1, ibs2 = _compute_relatedness_genotypes(
+            rows, self.samples, 7, 10000
+        )
+        self.assertEqual(het, {"index": 2, "father": 1, "mother": 1})
+        self.assertEqual(
+            het_shared, {("father", "index"): 1, ("mother", "index"): 1, ("mother", "father"): 0}
+        )
+        self.assertEqual(
+            ibs0, {("father", "index"): 1, ("mother", "index"): 0, ("mother", "father"): 1}
+        )
+        self.assertEqual(
+            ibs1, {("father", "index"): 1, ("mother", "index"): 2, ("mother", "father"): 3}
+        )
+        self.assertEqual(
+            ibs2, {("father", "index"): 2, ("mother", "index"): 2, ("mother", "father"): 0}
+        )
+        self._assert_matches_reference(rows)
+
+    def test_nocalls(self):
+        rows = [
+            # Both no-call: pair is skipped.
+            _row({"index": _call("./."), "father": _call("./."), "mother": _call("1/1")}),
+            # One no-call: assumed to be hom. ref.
+            _row({"index": _call("./."), "father": _call("0/0"), "mother": _call("1/1")}),
+            # Missing sample in genotype: no-call.
+            _row({"index": _call("0/1"), "mother": _call("0/1")}, {"father": _call("./.")}),
+        ]
+        het, het_shared, ibs0, ibs1, ibs2 = _compute_relatedness_genotypes(
+            rows, self.samples, 7, 10000
+        )
+        self.assertEqual(
+            ibs0, {("father", "index"): 0, ("mother", "index"): 2, ("mother", "father"): 2}
+        )
+        self.assertEqual(
+            ibs2, {("father", "index"): 1, ("mother", "index"): 1, ("mother", "father"): 0}
+        )
+        self._assert_matches_reference(rows)
+
+    def test_depth_filter(self):
+        rows = [
+            _row({"index": _call("0/1"), "father": _call("0/1", dp=6), "mother": _call("0/0")}),
+            _row({"index": _call("0/1"), "father": _call("0/1", dp=7), "mother": _call("0/0")}),
+            _row({"index": _call("1/1"), "father": {"gt": "1/1"}, "mother": _call("1/1")}),
+        ]
+        het, het_shared, _, _, ibs2 = _compute_relatedness_genotypes(rows, self.samples, 7, 10000)
+        self.assertEqual(het, {"index": 1, "father": 1, "mother": 0})
+        self.assertEqual(het_shared[("father", "index")], 1)
+        self.assertEqual(ibs2[("mother", "index")], 0)
+        self._assert_matches_reference(rows)
+
+    def test_n_sites(self):
+        rows = [
+            _row({"index": _call("0/1"), "father": _call("0/1"), "mother": _call("0/1")})
+            for _ in range(10)
+        ]
+        het, *_ = _compute_relatedness_genotypes(rows, self.samples, 7, 3)
+        self.assertEqual(het, {"index": 4, "father": 4, "mother": 4})
+        self._assert_matches_reference(rows, n_sites=3)
+
+    def test_random_genotypes(self):
+        rng = random.Random(42)
+        gts = ["0/0", "0/1", "1/0", "1/1", "./.", "1/2", "0/2"]
+
+        def random_part(samples):
+            return {s: _call(rng.choice(gts), rng.randint(0, 40)) for s in samples}
+
+        rows = []
+        for _ in range(500):
+            samples = [s for s in self.samples if rng.random() > 0.05]
+            split = rng.randint(0, len(samples))
+            rows.append(_row(random_part(samples[:split]), random_part(samples[split:])))
+        for min_depth in (0, 5):
+            for n_sites in (0, 17, 100, 10000):
+                with self.subTest(min_depth=min_depth, n_sites=n_sites):
+                    self._assert_matches_reference(rows, min_depth, n_sites)
+                    with patch("var_stats_qc.qc.RELATEDNESS_BLOCK_SIZE", 7):
+                        self._assert_matches_reference(rows, min_depth, n_sites)
+
+
+class ComputeSiteGenotypeRelatednessTest(TestCase):
+    """Tests for ``compute_site_genotype_relatedness()``"""
+
+    def test_other_genotypes_are_excluded(self):
+        hom_ref, het, hom_alt, nocall = (GT_CODES[gt] for gt in ("0/0", "0/1", "1/1", "./."))
+        genotypes = {
+            # Sites: shared het., IBS0, both other, one other, both no-call, one missing.
+            "index": np.array([het, hom_alt, SITE_GT_OTHER, SITE_GT_OTHER, nocall, SITE_GT_MISSING]),
+            "father": np.array([het, hom_ref, SITE_GT_OTHER, het, nocall, hom_ref]),
+        }
+        self.assertEqual(
+            compute_site_genotype_relatedness(genotypes),
+            {
+                ("father", "index"): {
+                    "het_1_2": 1,
+                    "het_1": 1,
+                    "het_2": 1,
+                    "n_ibs0": 1,
+                    "n_ibs2": 1,
+                    "n_ibs1": 0,
+                }
+            },
+        )
@@ -0,0 +1,27 @@
+"""Tests for ``varfish.utils``."""
+
+import json
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from ..utils import LazyModule
+
+
+class LazyModuleTest(TestCase):
+    """Tests for ``LazyModule``"""
+
+    @patch("varfish.utils.importlib.import_module", return_value=json)
+    def testImportOnFirstAttributeAccess(self, mock_import_module):
+        lazy_json = LazyModule("json")
+        mock_import_module.assert_not_called()
+        self.assertEqual(repr(lazy_json), "<LazyModule 'json'>")
+        self.assertEqual(lazy_json.dumps([1]), "[1]")
+        mock_import_module.assert_called_once_with("json")
+        self.assertIs(lazy_json.loads, json.loads)
+        mock_import_module.assert_called_once_with("json")
+        self.assertEqual(repr(lazy_json), "<LazyModule 'json' (loaded)>")
+
+    def testMissingAttribute(self):
+        with self.assertRaises(AttributeError):
+            LazyModule("json").does_not_exist
@@ -1,5 +1,6 @@
 """Shared utility code."""
 
+import importlib
 import json
 
 import django.db.models.fields.json
@@ -65,6 +66,30 @@ class JSONField(django.db.models.fields.json.JSONField):
 django.db.models.fields.json.JSONField.from_db_value = JSONField.from_db_value
 
 
+class LazyModule:
+    """Proxy for the module ``name`` that is imported on first attribute access.
+
+    Assign it to a module-level name in place of ``import name`` for heavyweight modules that only few code paths
+    need.  This speeds up the startup of the web and worker processes as the module is not imported until the
+    first attribute access.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return "<LazyModule %r%s>" % (self._name, "" if self._module is None else " (loaded)")
+
+
 class VarFishKioskUserMiddleware:
     """Automatically assigns the ``kiosk_user`` to ``request.user``."""
 
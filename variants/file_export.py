@@ -1,25 +1,32 @@
 """This module contains the code for file export"""
 
 import datetime
+import itertools
 import math
+import os
+import shutil
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
 from tempfile import NamedTemporaryFile
 import contextlib
 
 from variants.helpers import get_engine
+from django.core.files import File
+from django.db import connections
 from django.utils import timezone
 from django.conf import settings
-import vcfpy
 import wrapt
-import xlsxwriter
 
 from cohorts.models import Cohort
 from .models import (
+    CHROMOSOME_STR_TO_CHROMOSOME_INT,
+    EXPORT_FILE_EXTENSIONS,
     Case,
     CaseAwareProject,
     ExportFileJobResult,
     ExportProjectCasesFileBgJobResult,
+    SmallVariant,
     SmallVariantComment,
     annotate_with_phenotype_scores,
     annotate_with_pathogenicity_scores,
@@ -29,6 +36,7 @@ from .models import (
 )
 from .templatetags.variants_tags import flag_class
 from projectroles.plugins import get_backend_api
+from varfish.utils import LazyModule
 from .queries import (
     CaseExportTableQuery,
     CaseExportVcfQuery,
@@ -36,6 +44,9 @@ from .queries import (
     ProjectExportVcfQuery,
 )
 
+vcfpy = LazyModule("vcfpy")
+xlsxwriter = LazyModule("xlsxwriter")
+
 #: Color to use for variants flagged as positive.
 BG_COLOR_POSITIVE = "#dc3848"
 
@@ -53,6 +64,12 @@ BG_COLORS = {
 }
 
 
+#: The 28 bytes empty BGZF block that marks the end of a BGZF file.
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+#: Number of bytes to copy at a time when concatenating export shards.
+SHARD_COPY_SIZE = 1024 * 1024
+
 #: Constant that determines how many days generated files should stay.  Note for the actual removal, a separate
 #: Celery job must be ran.
 EXPIRY_DAYS = 14
@@ -232,8 +249,12 @@ class CaseExporterBase:
     query_class_single_case = None
     #: The query class to use for building project-wide queries.
     query_class_project_cases = None
+    #: Whether project-wide exports can be generated in per-chromosome shards.
+    shardable = False
+    #: Whether the output is BGZF compressed.
+    bgzf = False
 
-    def __init__(self, job, case_or_project_or_cohort):
+    def __init__(self, job, case_or_project_or_cohort, query_args=None):
         #: The ``ExportFileBgJob``, ``CADDSubmissionBgJob``, or ``DistillerSubmissionBgJob`` to use for logging.
         #: Variants are obtained from ``case_or_project``.
         self.job = job
@@ -248,9 +269,11 @@ class CaseExporterBase:
         #: The SQL Alchemy connection to use.
         self._alchemy_engine = None
         #: The query arguments.
-        self.query_args = job.query_args
+        self.query_args = job.query_args if query_args is None else query_args
         #: The named temporary file object to use for file handling.
         self.tmp_file = None
+        #: The offset in the temporary file at which the per-variant data starts.
+        self.data_offset = 0
         #: The wrapper for running queries.
         self.query = None
         if self.project_or_cohort:
@@ -343,55 +366,67 @@ class CaseExporterBase:
                     "fixed": False,
                 }
 
+    def _is_scoring_enabled(self):
+        """Return whether rows are scored and thus ranked in this export."""
+        return self._is_prioritization_enabled() or self._is_pathogenicity_enabled()
+
     def _yield_smallvars(self):
-        """Use this for yielding the resulting small variants one-by-one."""
-        prev_chrom = None
+        """Use this for yielding the resulting small variants one-by-one.
+
+        The rows are streamed from a server-side cursor in genomic order.  Only when scoring is
+        enabled, all rows must be loaded for ranking them.
+        """
         self.job.add_log_entry("Executing database query...")
-        with contextlib.closing(self.query.run(self.query_args)) as result:
-            self.job.add_log_entry("Executing phenotype score query...")
-            _result = list(result)
-            if self._is_prioritization_enabled():
-                gene_scores = self._fetch_gene_scores([entry.entrez_id for entry in _result])
-                _result = annotate_with_phenotype_scores(_result, gene_scores)
-            if self._is_pathogenicity_enabled():
-                variant_scores = self._fetch_variant_scores(
-                    [
-                        (
-                            entry["chromosome"],
-                            entry["start"],
-                            entry["reference"],
-                            entry["alternative"],
-                        )
-                        for entry in _result
-                    ]
-                )
-                _result = annotate_with_pathogenicity_scores(_result, variant_scores)
-            if self._is_prioritization_enabled() and self._is_pathogenicity_enabled():
-                _result = annotate_with_joint_scores(_result)
-            self.job.add_log_entry("Writing output file...")
-            total = len(_result)
-            steps = math.ceil(total / 10)
-            for i, small_var in enumerate(_result):
-                if self._is_prioritization_enabled() or self._is_pathogenicity_enabled():
-                    if i % steps == 0:
-                        self.job.add_log_entry("{}%".format(int(100 * i / total)))
-                else:
-                    if small_var.chromosome != prev_chrom:
-                        self.job.add_log_entry(
-                            "Now on chromosome chr{} ({}%)".format(
-                                small_var.chromosome, int(100 * i / total)
-                            )
-                        )
-                    prev_chrom = small_var.chromosome
+        with contextlib.closing(self.query.stream(self.query_args)) as result:
+            if self._is_scoring_enabled():
+                rows = self._yield_scored_smallvars(result)
+            else:
+                rows = self._yield_ordered_smallvars(result)
+            for small_var in rows:
                 if self.project_or_cohort:
-                    for sample in sorted(small_var.genotype.keys()):
-                        if self.query_class_project_cases is ProjectExportVcfQuery:
-                            yield RowWithJoinProxy(small_var)
-                        else:
+                    if self.query_class_project_cases is ProjectExportVcfQuery:
+                        yield RowWithJoinProxy(small_var)
+                    else:
+                        for sample in sorted(small_var.genotype.keys()):
                             yield RowWithSampleProxy(small_var, sample)
                 else:
                     yield small_var
 
+    def _yield_ordered_smallvars(self, result):
+        """Yield the rows from ``result`` and log the progress by chromosome."""
+        self.job.add_log_entry("Writing output file...")
+        prev_chrom = None
+        for small_var in result:
+            if small_var.chromosome != prev_chrom:
+                self.job.add_log_entry("Now on chromosome chr{}".format(small_var.chromosome))
+                prev_chrom = small_var.chromosome
+            yield small_var
+
+    def _yield_scored_smallvars(self, result):
+        """Load all rows from ``result``, annotate them with scores and yield them by rank."""
+        self.job.add_log_entry("Executing phenotype score query...")
+        _result = list(result)
+        if self._is_prioritization_enabled():
+            gene_scores = self._fetch_gene_scores([entry.entrez_id for entry in _result])
+            _result = annotate_with_phenotype_scores(_result, gene_scores)
+        if self._is_pathogenicity_enabled():
+            variant_scores = self._fetch_variant_scores(
+                [
+                    (entry["chromosome"], entry["start"], entry["reference"], entry["alternative"],)
+                    for entry in _result
+                ]
+            )
+            _result = annotate_with_pathogenicity_scores(_result, variant_scores)
+        if self._is_prioritization_enabled() and self._is_pathogenicity_enabled():
+            _result = annotate_with_joint_scores(_result)
+        self.job.add_log_entry("Writing output file...")
+        total = len(_result)
+        steps = math.ceil(total / 10)
+        for i, small_var in enumerate(_result):
+            if i % steps == 0:
+                self.job.add_log_entry("{}%".format(int(100 * i / total)))
+            yield small_var
+
     def _fetch_gene_scores(self, entrez_ids):
         if self._is_prioritization_enabled():
             try:
@@ -462,6 +497,25 @@ class CaseExporterBase:
         self.tmp_file.seek(0)
         return self.tmp_file
 
+    def is_shardable(self):
+        """Return whether the export can be generated in per-chromosome shards."""
+        return bool(self.shardable and self.project_or_cohort and not self._is_scoring_enabled())
+
+    def write_shard(self, out_file, with_header):
+        """Generate the data and write it to ``out_file`` for concatenation with other shards.
+
+        The header is only written ``with_header`` and the BGZF EOF marker is never written.
+        """
+        tmp_file = self.write_tmp_file()
+        end = tmp_file.seek(0, os.SEEK_END)
+        if self.bgzf:
+            end -= len(BGZF_EOF)
+        remaining = end - tmp_file.seek(0 if with_header else self.data_offset)
+        while remaining > 0:
+            chunk = tmp_file.read(min(remaining, SHARD_COPY_SIZE))
+            out_file.write(chunk)
+            remaining -= len(chunk)
+
     def _open(self):
         """Override with action on opening the file."""
 
@@ -506,11 +560,13 @@ class CaseExporterTsv(CaseExporterBase):
 
     query_class_single_case = CaseExportTableQuery
     query_class_project_cases = ProjectExportTableQuery
+    shardable = True
 
     def _write_variants_header(self):
         """Fill with actions to write the variant header."""
         line = "\t".join([x["title"] for x in self.columns]) + "\n"
         self.tmp_file.write(line.encode("utf-8"))
+        self.data_offset = self.tmp_file.tell()
 
     def _write_variants_data(self):
         """Fill with actions to write the variant data."""
@@ -540,8 +596,8 @@ class CaseExporterXlsx(CaseExporterBase):
     query_class_single_case = CaseExportTableQuery
     query_class_project_cases = ProjectExportTableQuery
 
-    def __init__(self, job, case_or_project_or_cohort):
-        super().__init__(job, case_or_project_or_cohort)
+    def __init__(self, job, case_or_project_or_cohort, query_args=None):
+        super().__init__(job, case_or_project_or_cohort, query_args)
         #: The ``Workbook`` object to use for writing.
         self.workbook = None
         #: The sheet with the variants.
@@ -555,7 +611,11 @@ class CaseExporterXlsx(CaseExporterBase):
         return {"suffix": ".xlsx"}
 
     def _open(self):
-        self.workbook = xlsxwriter.Workbook(self.tmp_file.name, {"remove_timezone": True})
+        # Rows are flushed to disk once a later row is written, so all sheets must be written row
+        # by row.
+        self.workbook = xlsxwriter.Workbook(
+            self.tmp_file.name, {"remove_timezone": True, "constant_memory": True}
+        )
         # setup formats
         self.header_format = self.workbook.add_format({"bold": True})
         # setup sheets
@@ -630,31 +690,24 @@ class CaseExporterXlsx(CaseExporterBase):
                 ]
                 if self.project_or_cohort:
                     row.insert(0, case.name)
-                self.variant_sheet.write_row(offset, 0, row)
+                self.comment_sheet.write_row(offset, 0, row)
                 offset += 1
 
     def _write_metadata_sheet(self):
         # Write out meta data sheet.
-        self.meta_data_sheet.write_column(
-            0,
-            0,
-            ["Case", "", "Date", "", "Versions", "", "Settings"] + list(self.query_args.keys()),
-            self.header_format,
-        )
-        self.meta_data_sheet.write_column(
-            0,
-            1,
-            [
-                "TODO: URL to case",
-                "",
-                str(datetime.datetime.now()),
-                "",
-                "TODO: Write out software and all database versions etc." "",
-                "",
-                "",
-            ]
-            + list(map(self.__class__._unblank, map(str, self.query_args.values()))),
-        )
+        keys = ["Case", "", "Date", "", "Versions", "", "Settings"] + list(self.query_args.keys())
+        values = [
+            "TODO: URL to case",
+            "",
+            str(datetime.datetime.now()),
+            "",
+            "TODO: Write out software and all database versions etc." "",
+            "",
+            "",
+        ] + list(map(self.__class__._unblank, map(str, self.query_args.values())))
+        for row, (key, value) in enumerate(zip(keys, values)):
+            self.meta_data_sheet.write(row, 0, key, self.header_format)
+            self.meta_data_sheet.write(row, 1, value)
 
     def _write_variants_header(self):
         """Fill with actions to write the variant header."""
@@ -696,9 +749,11 @@ class CaseExporterVcf(CaseExporterBase):
 
     query_class_single_case = CaseExportVcfQuery
     query_class_project_cases = ProjectExportVcfQuery
+    shardable = True
+    bgzf = True
 
-    def __init__(self, job, case_or_project_or_cohort, members=None):
-        super().__init__(job, case_or_project_or_cohort)
+    def __init__(self, job, case_or_project_or_cohort, members=None, query_args=None):
+        super().__init__(job, case_or_project_or_cohort, query_args)
         #: The ``vcfpy.Writer`` to use for writing the VCF file.
         self.vcf_writer = None
         #: Make overriding member possible here, e.g., to upload only variants without genotypes.
@@ -746,6 +801,9 @@ class CaseExporterVcf(CaseExporterBase):
         header = vcfpy.Header(lines=lines, samples=vcfpy.SamplesInfos(self.members))
         # Open VCF writer
         self.vcf_writer = vcfpy.Writer.from_path(self.tmp_file.name, header)
+        # Write the header into its own BGZF blocks so shards can be concatenated without it.
+        self.vcf_writer.stream.flush()
+        self.data_offset = self.vcf_writer.stream.tell() >> 16
 
     def _end_write_variants(self):
         self.vcf_writer.close()
@@ -753,7 +811,8 @@ class CaseExporterVcf(CaseExporterBase):
     def _yield_smallvars(self):
         if self.case:
             yield from super()._yield_smallvars()
-        else:
+        elif self._is_scoring_enabled():
+            # Rows are ranked by score, so the rows of one variant are not adjacent.
             joined_variants = OrderedDict()
             for i in super()._yield_smallvars():
                 key = (i.release, i.chromosome, i.start, i.end, i.reference, i.alternative)
@@ -761,8 +820,21 @@ class CaseExporterVcf(CaseExporterBase):
                     joined_variants[key].add_genotype(i.genotype)
                 else:
                     joined_variants[key] = i
-            for key, value in joined_variants.items():
-                yield value
+            yield from joined_variants.values()
+        else:
+            # Rows are ordered by position, so the rows of one variant are adjacent and can be
+            # joined one group at a time.
+            for _, group in itertools.groupby(
+                super()._yield_smallvars(),
+                key=lambda i: (i.chromosome, i.start, i.end, i.reference, i.alternative),
+            ):
+                joined_variants = OrderedDict()
+                for i in group:
+                    if i.release in joined_variants:
+                        joined_variants[i.release].add_genotype(i.genotype)
+                    else:
+                        joined_variants[i.release] = i
+                yield from joined_variants.values()
 
     def _write_variants_data(self):
         for small_var in self._yield_smallvars():
@@ -824,6 +896,82 @@ class CaseExporterVcf(CaseExporterBase):
 EXPORTERS = {"tsv": CaseExporterTsv, "vcf": CaseExporterVcf, "xlsx": CaseExporterXlsx}
 
 
+def get_export_shards(query_args, cases):
+    """Return list of ``genomic_region`` values, one for each chromosome, in genomic order.
+
+    If ``query_args`` already limit the export to genomic regions, these are split up by chromosome.
+    Otherwise, the shards are built from the chromosomes of the small variants of ``cases`` such
+    that variants on any contig are exported.  Chromosomes with the same ``chromosome_no`` (e.g.,
+    unplaced contigs) go into one shard as the rows are ordered by ``chromosome_no`` first.
+    """
+    shards = OrderedDict()
+    if query_args.get("genomic_region"):
+        for region in sorted(
+            query_args["genomic_region"],
+            key=lambda r: CHROMOSOME_STR_TO_CHROMOSOME_INT.get(r[0], 0),
+        ):
+            shards.setdefault(region[0], []).append(region)
+    else:
+        chromosomes = (
+            SmallVariant.objects.filter(case_id__in=[case.id for case in cases])
+            .values_list("chromosome_no", "chromosome")
+            .distinct()
+            .order_by("chromosome_no", "chromosome")
+        )
+        for chromosome_no, chromosome in chromosomes:
+            shards.setdefault(chromosome_no, []).append((chromosome, None, None))
+    return list(shards.values())
+
+
+def generate_sharded(klass, job, project_or_cohort, out_file, max_workers=None):
+    """Generate the export with exporter ``klass`` in per-chromosome shards and write to ``out_file``.
+
+    The shards are generated by ``max_workers`` threads (default: ``VARFISH_EXPORT_MAX_WORKERS``),
+    each with its own database connection.  They are then concatenated in genomic order.  BGZF
+    compressed VCF files are thus sorted and can be indexed with tabix.
+    """
+    max_workers = max_workers or settings.VARFISH_EXPORT_MAX_WORKERS
+    cases = klass(job, project_or_cohort).query.cases
+    # Without any variants, one (empty) shard still provides the header.
+    shards = get_export_shards(job.query_args, cases) or [[]]
+    job.add_log_entry("Exporting {} shards with {} workers...".format(len(shards), max_workers))
+    with contextlib.ExitStack() as stack:
+        parts = [stack.enter_context(NamedTemporaryFile()) for _ in shards]
+
+        def write_shard(i):
+            try:
+                query_args = {**job.query_args, "genomic_region": shards[i]}
+                with klass(job, project_or_cohort, query_args=query_args) as exporter:
+                    exporter.write_shard(parts[i], with_header=(i == 0))
+            finally:
+                if max_workers > 1:
+                    # Release the connection of this worker thread.
+                    connections.close_all()
+
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for future in [executor.submit(write_shard, i) for i in range(len(shards))]:
+                    future.result()
+        else:
+            for i in range(len(shards)):
+                write_shard(i)
+
+        for part in parts:
+            part.seek(0)
+            shutil.copyfileobj(part, out_file, SHARD_COPY_SIZE)
+        if klass.bgzf:
+            out_file.write(BGZF_EOF)
+        out_file.flush()
+        out_file.seek(0)
+
+
+def _save_export_result(model, job, export_file):
+    """Create the ``model`` result of ``job`` and save ``export_file`` into the file storage."""
+    result = model(job=job, expiry_time=timezone.now() + timedelta(days=EXPIRY_DAYS))
+    result.file.save("varfish_export%s" % EXPORT_FILE_EXTENSIONS[job.file_type], File(export_file))
+    return result
+
+
 def export_case(job):
     """Export a ``Case`` object, store result in a new ``ExportFileJobResult``."""
     job.mark_start()
@@ -841,11 +989,7 @@ def export_case(job):
     try:
         klass = EXPORTERS[job.file_type]
         with klass(job, job.case) as exporter:
-            ExportFileJobResult.objects.create(
-                job=job,
-                expiry_time=timezone.now() + timedelta(days=EXPIRY_DAYS),
-                payload=exporter.generate(),
-            )
+            _save_export_result(ExportFileJobResult, job, exporter.write_tmp_file())
     except Exception as e:
         job.mark_error(e)
         if timeline:
@@ -858,7 +1002,7 @@ def export_case(job):
 
 
 def clear_expired_exported_files():
-    """Clear expired exported files."""
+    """Clear expired exported files, their files are removed from the storage on deletion."""
     ExportFileJobResult.objects.filter(expiry_time__lt=timezone.now()).delete()
     ExportProjectCasesFileBgJobResult.objects.filter(expiry_time__lt=timezone.now()).delete()
 
@@ -879,12 +1023,16 @@ def export_project_cases(job):
     try:
         klass = EXPORTERS[job.file_type]
         project_or_cohort = job.cohort or CaseAwareProject.objects.get(pk=job.project.pk)
-        with klass(job, project_or_cohort) as exporter:
-            ExportProjectCasesFileBgJobResult.objects.create(
-                job=job,
-                expiry_time=timezone.now() + timedelta(days=EXPIRY_DAYS),
-                payload=exporter.generate(),
-            )
+        exporter = klass(job, project_or_cohort)
+        if exporter.is_shardable():
+            with NamedTemporaryFile() as tmp_file:
+                generate_sharded(klass, job, project_or_cohort, tmp_file)
+                _save_export_result(ExportProjectCasesFileBgJobResult, job, tmp_file)
+        else:
+            with exporter:
+                _save_export_result(
+                    ExportProjectCasesFileBgJobResult, job, exporter.write_tmp_file()
+                )
     except Exception as e:
         job.mark_error(e)
         if timeline:
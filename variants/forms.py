@@ -5,7 +5,6 @@ import io
 import os
 import tempfile
 
-import vcfpy
 from django.conf import settings
 from django import forms
 from django.core.files.storage import FileSystemStorage
@@ -17,9 +16,11 @@ from .templatetags.variants_tags import only_source_name, get_term_description
 from geneinfo.models import Hgnc, HpoName, Hpo
 from django.db.models import Q
 from projectroles.app_settings import AppSettingAPI
+from varfish.utils import LazyModule
 
 import re
 
+vcfpy = LazyModule("vcfpy")
 
 app_settings = AppSettingAPI()
 
@@ -1270,11 +1271,7 @@ class SmallVariantPrioritizerFormMixin:
 
         self.fields["patho_enabled"] = forms.BooleanField(
             label="Enable variant pathogenicity-based prioritization",
-            help_text=(
-                "First try to filter your variants without pathogenicity-based prioritization before enabling it. "
-                "Note well that only the first %d variants returned by your query will be prioritized!"
-            )
-            % settings.VARFISH_CADD_MAX_VARS,
+            help_text="First try to filter your variants without pathogenicity-based prioritization before enabling it.",
             required=False,
             widget=forms.CheckboxInput(),
         )
@@ -0,0 +1,103 @@
+"""Typed genotype columns of ``SmallVariant``.
+
+Besides the ``genotype`` JSONB column, the genotypes of the samples can be stored in the parallel arrays
+``genotype_gt`` (genotype codes from ``GENOTYPE_CODES``), ``genotype_gq``, ``genotype_dp``, and ``genotype_ad``.
+The array entries follow the order of ``SmallVariantSet.genotype_samples`` and are ``NULL`` for samples without
+genotype.  The genotype filters index into these arrays instead of extracting and casting the JSONB values per
+sample and row.  Variant sets without ``genotype_samples`` are queried through the ``genotype`` column.
+"""
+
+import json
+
+from django.conf import settings
+from django.db import transaction
+from sqlalchemy import and_, text, update
+
+from .models import SmallVariant, SmallVariantSet
+
+#: Codes of the genotype strings in ``SmallVariant.genotype_gt``.  Other genotype strings are stored as
+#: ``GENOTYPE_CODE_OTHER``.
+GENOTYPE_CODES = {
+    "0/0": 0,
+    "0|0": 1,
+    "0": 2,
+    "0/1": 3,
+    "0|1": 4,
+    "1/0": 5,
+    "1|0": 6,
+    "1": 7,
+    "1/1": 8,
+    "1|1": 9,
+    "./.": 10,
+    ".|.": 11,
+}
+
+#: Code of genotype strings not in ``GENOTYPE_CODES``.
+GENOTYPE_CODE_OTHER = -1
+
+#: The integer genotype fields stored in the ``genotype_<key>`` columns.
+GENOTYPE_INT_KEYS = ("gq", "dp", "ad")
+
+
+def _quote(value):
+    return "'%s'" % value.replace("'", "''")
+
+
+def genotype_column_expressions(samples, genotype='"genotype"'):
+    """Return ``dict`` mapping the ``genotype_*`` column names to SQL expressions computing them.
+
+    The expressions compute the arrays for ``samples`` from the SQL expression ``genotype`` holding the genotype
+    JSON as text or ``jsonb``.  Each expression parses the JSON once.
+    """
+    codes = _quote(json.dumps(GENOTYPE_CODES))
+
+    def array(element, type_):
+        elements = ", ".join(element % {"entry": "g -> %s" % _quote(sample)} for sample in samples)
+        return "(SELECT ARRAY[%s]::%s[] FROM (SELECT %s::jsonb AS g) AS parsed)" % (
+            elements,
+            type_,
+            genotype,
+        )
+
+    result = {
+        "genotype_gt": array(
+            "CASE WHEN %%(entry)s IS NOT NULL THEN coalesce((%s::jsonb ->> (%%(entry)s ->> 'gt'))::smallint, %d) END"
+            % (codes, GENOTYPE_CODE_OTHER),
+            "smallint",
+        )
+    }
+    for key in GENOTYPE_INT_KEYS:
+        result["genotype_%s" % key] = array(
+            "CASE WHEN %%(entry)s ->> '%s' ~ '^-?[0-9]{1,9}$' THEN (%%(entry)s ->> '%s')::integer END"
+            % (key, key),
+            "integer",
+        )
+    return result
+
+
+def get_genotype_samples(pedigree):
+    """Return the samples to store in the genotype columns for ``pedigree`` or ``None`` if disabled."""
+    if not settings.VARFISH_GENOTYPE_COLUMNS:
+        return None
+    return [line["patient"] for line in pedigree]
+
+
+def build_genotype_columns(engine, variant_set):
+    """Fill the genotype columns of the variants in ``variant_set``, e.g., for sets imported without them."""
+    samples = [line["patient"] for line in variant_set.case.pedigree]
+    table = SmallVariant.sa.table
+    with transaction.atomic():
+        engine.execute(
+            update(table)
+            .values(
+                {
+                    name: text(expression)
+                    for name, expression in genotype_column_expressions(
+                        samples, genotype=table.c.genotype.name
+                    ).items()
+                }
+            )
+            .where(and_(table.c.case_id == variant_set.case_id, table.c.set_id == variant_set.id))
+        )
+        SmallVariantSet.objects.filter(pk=variant_set.pk).update(genotype_samples=samples)
+    variant_set.genotype_samples = samples
@@ -1,8 +1,12 @@
+import contextlib
 import json
 
 import aldjemy.core
 import aldjemy.table
+from django.conf import settings
+from django.db import transaction
 import sqlalchemy
+from sqlalchemy import Text, and_, cast, func, literal, literal_column, select, union_all
 
 
 class Cache:
@@ -18,6 +22,23 @@ def get_engine(alias="default", **kwargs):
     return result
 
 
+@contextlib.contextmanager
+def stream_connection(engine, fetch_size=None):
+    """Yield a connection of ``engine`` that reads results through server-side cursors.
+
+    The rows are fetched ``fetch_size`` at a time (default: ``QUERY_STREAM_FETCH_SIZE``).  psycopg2 only allows
+    the named cursors of server-side cursors within a transaction while Django connections are in autocommit
+    mode, so the connection is used within ``transaction.atomic()`` until the context is left.
+    """
+    with transaction.atomic():
+        with contextlib.closing(
+            engine.connect().execution_options(
+                stream_results=True, max_row_buffer=fetch_size or settings.QUERY_STREAM_FETCH_SIZE
+            )
+        ) as connection:
+            yield connection
+
+
 # Cache value for metatadata
 _METADATA = None
 
@@ -28,3 +49,54 @@ def get_meta():
         Cache.metadata = sqlalchemy.MetaData()
         aldjemy.table.generate_tables(Cache.metadata)
     return Cache.metadata
+
+
+#: The fields identifying a small variant.
+VARIANT_KEYS = ("release", "chromosome", "start", "end", "reference", "alternative")
+
+
+def variant_condition(model, kwargs, keys=VARIANT_KEYS):
+    """Return SQLAlchemy condition selecting the records of ``model`` at the variant described by ``kwargs``."""
+    return and_(
+        *[
+            getattr(model.sa, key) == (int(kwargs[key]) if key in ("start", "end") else kwargs[key])
+            for key in keys
+        ]
+    )
+
+
+def load_model_records(engine, selections):
+    """Load the records of several Django models in one database round trip.
+
+    ``selections`` maps names to pairs of a Django model and an SQLAlchemy condition on its table.  The selected
+    rows of all models are fetched as JSON with one ``UNION ALL`` query and converted back into model instances.
+    Return ``dict`` mapping the names to the lists of their records.
+    """
+    result = {name: [] for name in selections}
+    if not selections:
+        return result
+    stmt = union_all(
+        *[
+            select(
+                [
+                    literal(name).label("name"),
+                    cast(func.to_jsonb(literal_column(model._meta.db_table)), Text).label("record"),
+                ]
+            )
+            .select_from(model.sa.table)
+            .where(condition)
+            for name, (model, condition) in selections.items()
+        ]
+    )
+    for name, record in engine.execute(stmt):
+        model = selections[name][0]
+        values = json.loads(record)
+        fields = model._meta.concrete_fields
+        result[name].append(
+            model.from_db(
+                "default",
+                [field.attname for field in fields],
+                [field.to_python(values.get(field.column)) for field in fields],
+            )
+        )
+    return result
@@ -0,0 +1,88 @@
+"""Maintenance of the in-house counts of the small variants (``SmallVariantSummary``).
+
+The ``SmallVariantSummary`` table holds the genotype counts of each variant summed over the active small variant
+sets, see ``variant_set_counts`` for how they are maintained.  Concurrent updates are serialized with an advisory
+lock, so the upserts of overlapping variants cannot deadlock.
+"""
+
+from sqlalchemy import and_, func, select, text
+
+from .models import (
+    SmallVariant,
+    SmallVariantSet,
+    SmallVariantSummary,
+    SmallVariantSummaryVariantSet,
+)
+from .variant_set_counts import VariantSetCounts
+
+#: The columns identifying a variant.
+VARIANT_COLUMNS = ("release", "chromosome", "start", "end", "reference", "alternative")
+
+#: Mapping from the ``SmallVariantSummary`` count columns to the ``SmallVariant`` columns.
+COUNT_COLUMNS = {
+    "count_hom_ref": "num_hom_ref",
+    "count_het": "num_het",
+    "count_hom_alt": "num_hom_alt",
+    "count_hemi_ref": "num_hemi_ref",
+    "count_hemi_alt": "num_hemi_alt",
+}
+
+#: Key of the advisory lock serializing updates of the in-house counts.
+INHOUSE_COUNTS_LOCK_KEY = 0x696E686F
+
+
+class InhouseCounts(VariantSetCounts):
+    """The in-house counts of the variants in the active small variant sets."""
+
+    title = "in-house counts"
+    model = SmallVariantSummary
+    counted_model = SmallVariantSummaryVariantSet
+    key_columns = VARIANT_COLUMNS
+    extra_columns = ("bin",)
+    count_columns = tuple(COUNT_COLUMNS)
+
+    def lock(self, engine):
+        engine.execute(text("SELECT pg_advisory_xact_lock(:key)"), key=INHOUSE_COUNTS_LOCK_KEY)
+
+    def counts_stmt(self, variant_set):
+        """Return statement that sums the genotype counts of the distinct variants in ``variant_set``."""
+        variants = (
+            select(
+                [getattr(SmallVariant.sa, name) for name in VARIANT_COLUMNS + ("bin",)]
+                + [getattr(SmallVariant.sa, name) for name in COUNT_COLUMNS.values()]
+            )
+            .distinct()
+            .where(
+                and_(
+                    SmallVariant.sa.case_id == variant_set.case_id,
+                    SmallVariant.sa.set_id == variant_set.id,
+                )
+            )
+            .alias("variants")
+        )
+        key_columns = [variants.c[name] for name in VARIANT_COLUMNS]
+        return (
+            select(
+                key_columns
+                + [func.min(variants.c.bin).label("bin")]
+                + [
+                    func.sum(variants.c[variant_name]).label(name)
+                    for name, variant_name in COUNT_COLUMNS.items()
+                ]
+            )
+            .group_by(*key_columns)
+            .order_by(*key_columns)
+        )
+
+
+#: The in-house counts.
+INHOUSE_COUNTS = InhouseCounts()
+
+add_variant_set_inhouse_counts = INHOUSE_COUNTS.add_variant_set
+remove_variant_set_inhouse_counts = INHOUSE_COUNTS.remove_variant_set
+remove_case_inhouse_counts = INHOUSE_COUNTS.remove_case
+
+
+def rebuild_inhouse_counts(engine):
+    """Recompute the in-house counts from the active variant sets."""
+    INHOUSE_COUNTS.rebuild(engine, SmallVariantSet.objects.filter(state="active"))
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("variants", "0084_auto_20220112_0657"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="caddpathogenicityscorecache",
+            index=models.Index(
+                fields=["chromosome", "start", "reference", "alternative"],
+                name="variants_ca_chromos_53cd0d_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="mutationtasterpathogenicityscorecache",
+            index=models.Index(
+                fields=["chromosome", "start", "reference", "alternative"],
+                name="variants_mu_chromos_30eaeb_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="umdpathogenicityscorecache",
+            index=models.Index(
+                fields=["chromosome", "start", "reference", "alternative"],
+                name="variants_um_chromos_d906d9_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("variants", "0085_auto_20261018_2053"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectvariantstats",
+            name="variant_sets",
+            field=models.ManyToManyField(
+                help_text="The variant sets included in the project-wide relatedness",
+                related_name="_variants_projectvariantstats_variant_sets_+",
+                to="variants.SmallVariantSet",
+            ),
+        ),
+        migrations.CreateModel(
+            name="SampleSiteGenotypes",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("sample_name", models.CharField(max_length=200)),
+                ("genotypes", models.BinaryField()),
+                (
+                    "variant_set",
+                    models.ForeignKey(
+                        help_text="The variant set of the genotypes",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="site_genotypes",
+                        to="variants.smallvariantset",
+                    ),
+                ),
+            ],
+            options={"unique_together": {("variant_set", "sample_name")},},
+        ),
+    ]
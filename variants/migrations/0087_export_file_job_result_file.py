@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:40
+
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+import variants.models
+
+#: File name extensions of the export file types.
+EXPORT_FILE_EXTENSIONS = {"tsv": ".tsv", "xlsx": ".xlsx", "vcf": ".vcf.gz"}
+
+
+def move_payloads_to_files(apps, _schema_editor):
+    """Write the payloads of existing export results into the file storage."""
+    for model_name in ("ExportFileJobResult", "ExportProjectCasesFileBgJobResult"):
+        model = apps.get_model("variants", model_name)
+        for result in model.objects.select_related("job").iterator():
+            result.file.save(
+                "varfish_export%s" % EXPORT_FILE_EXTENSIONS[result.job.file_type],
+                ContentFile(bytes(result.payload)),
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("variants", "0086_auto_20261018_2106"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="exportfilejobresult",
+            name="file",
+            field=models.FileField(
+                default="",
+                help_text="Resulting exported file",
+                upload_to=variants.models.export_file_job_result_upload_to,
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="exportprojectcasesfilebgjobresult",
+            name="file",
+            field=models.FileField(
+                default="",
+                help_text="Resulting exported file",
+                upload_to=variants.models.export_file_job_result_upload_to,
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(move_payloads_to_files, migrations.RunPython.noop),
+        migrations.RemoveField(model_name="exportfilejobresult", name="payload",),
+        migrations.RemoveField(model_name="exportprojectcasesfilebgjobresult", name="payload",),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+import varfish.utils
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("projectroles", "0020_project_has_public_children"),
+        ("variants", "0087_export_file_job_result_file"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProjectCaseSummary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("num_cases", models.IntegerField(help_text="Number of cases", null=True)),
+                (
+                    "num_cases_with_variants",
+                    models.IntegerField(help_text="Number of cases with small variants", null=True),
+                ),
+                (
+                    "num_small_vars",
+                    models.IntegerField(help_text="Total number of small variants", null=True),
+                ),
+                (
+                    "annotation_count",
+                    models.IntegerField(help_text="Number of annotated variants", null=True),
+                ),
+                (
+                    "sex_errors",
+                    varfish.utils.JSONField(help_text="Sex errors of the cases", null=True),
+                ),
+                (
+                    "sex_errors_to_fix",
+                    models.BooleanField(
+                        help_text="Whether any case has sex errors to fix", null=True
+                    ),
+                ),
+                (
+                    "project",
+                    models.OneToOneField(
+                        help_text="The project that the summary is for",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="case_summary",
+                        to="projectroles.project",
+                    ),
+                ),
+            ],
+        ),
+    ]
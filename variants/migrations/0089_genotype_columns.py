@@ -0,0 +1,62 @@
+"""Add the typed genotype columns ``SmallVariant.genotype_{gt,gq,dp,ad}`` and
+``SmallVariantSet.genotype_samples``."""
+import django.contrib.postgres.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+if not settings.IS_TESTING:
+    # Operations using raw SQL.
+    operations = [
+        migrations.RunSQL("ALTER TABLE variants_smallvariant ADD genotype_gt smallint[] NULL"),
+        migrations.RunSQL("ALTER TABLE variants_smallvariant ADD genotype_gq int[] NULL"),
+        migrations.RunSQL("ALTER TABLE variants_smallvariant ADD genotype_dp int[] NULL"),
+        migrations.RunSQL("ALTER TABLE variants_smallvariant ADD genotype_ad int[] NULL"),
+    ]
+else:
+    # Operations using the Django ORM.
+    operations = [
+        migrations.AddField(
+            model_name="smallvariant",
+            name="genotype_gt",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.SmallIntegerField(null=True), null=True, size=None
+            ),
+        ),
+        migrations.AddField(
+            model_name="smallvariant",
+            name="genotype_gq",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.IntegerField(null=True), null=True, size=None
+            ),
+        ),
+        migrations.AddField(
+            model_name="smallvariant",
+            name="genotype_dp",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.IntegerField(null=True), null=True, size=None
+            ),
+        ),
+        migrations.AddField(
+            model_name="smallvariant",
+            name="genotype_ad",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.IntegerField(null=True), null=True, size=None
+            ),
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("variants", "0088_project_case_summary")]
+
+    operations = operations + [
+        migrations.AddField(
+            model_name="smallvariantset",
+            name="genotype_samples",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=512), blank=True, null=True, size=None
+            ),
+        ),
+    ]
@@ -0,0 +1,114 @@
+"""Replace the ``variants_smallvariantsummary`` materialized view by an incrementally maintained table."""
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+#: Create the table in place of the materialized view and fill it from the active variant sets.  In testing, the
+#: model is managed and the table is altered by the Django ORM.
+SQL_CREATE_TABLE = r"""
+DROP MATERIALIZED VIEW IF EXISTS variants_smallvariantsummary;
+
+CREATE TABLE variants_smallvariantsummary (
+    id bigserial PRIMARY KEY,
+    release varchar(32) NOT NULL,
+    chromosome varchar(32) NOT NULL,
+    start integer NOT NULL,
+    "end" integer NOT NULL,
+    bin integer NOT NULL,
+    reference varchar(512) NOT NULL,
+    alternative varchar(512) NOT NULL,
+    count_hom_ref integer NOT NULL DEFAULT 0,
+    count_het integer NOT NULL DEFAULT 0,
+    count_hom_alt integer NOT NULL DEFAULT 0,
+    count_hemi_ref integer NOT NULL DEFAULT 0,
+    count_hemi_alt integer NOT NULL DEFAULT 0,
+    CONSTRAINT variants_smallvariantsummary_variant_uniq
+        UNIQUE (release, chromosome, start, "end", reference, alternative)
+);
+
+INSERT INTO variants_smallvariantsummaryvariantset (variant_set_id)
+SELECT id FROM variants_smallvariantset WHERE state = 'active';
+
+INSERT INTO variants_smallvariantsummary (
+    release, chromosome, start, "end", reference, alternative, bin,
+    count_hom_ref, count_het, count_hom_alt, count_hemi_ref, count_hemi_alt
+)
+SELECT
+    release, chromosome, start, "end", reference, alternative, min(bin),
+    sum(num_hom_ref), sum(num_het), sum(num_hom_alt), sum(num_hemi_ref), sum(num_hemi_alt)
+FROM (
+    SELECT DISTINCT
+        variants.release,
+        variants.chromosome,
+        variants.start,
+        variants."end",
+        variants.bin,
+        variants.reference,
+        variants.alternative,
+        variants.num_hom_ref,
+        variants.num_het,
+        variants.num_hom_alt,
+        variants.num_hemi_ref,
+        variants.num_hemi_alt,
+        variants.case_id,
+        variants.set_id
+    FROM variants_smallvariant AS variants
+    JOIN variants_smallvariantset AS variant_sets
+        ON variant_sets.id = variants.set_id AND variant_sets.case_id = variants.case_id
+    WHERE variant_sets.state = 'active'
+) AS variants_per_case
+GROUP BY release, chromosome, start, "end", reference, alternative;
+"""
+
+
+operations = [
+    migrations.CreateModel(
+        name="SmallVariantSummaryVariantSet",
+        fields=[
+            (
+                "id",
+                models.AutoField(
+                    auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                ),
+            ),
+            (
+                "variant_set",
+                models.OneToOneField(
+                    help_text="The counted variant set",
+                    on_delete=django.db.models.deletion.CASCADE,
+                    related_name="+",
+                    to="variants.smallvariantset",
+                ),
+            ),
+        ],
+    ),
+    # The model is unmanaged outside of testing, where the following only alter the migration state.
+    migrations.AlterField(
+        model_name="smallvariantsummary",
+        name="id",
+        field=models.BigAutoField(primary_key=True, serialize=False),
+    ),
+]
+for name in ("count_hom_ref", "count_het", "count_hom_alt", "count_hemi_ref", "count_hemi_alt"):
+    operations.append(
+        migrations.AlterField(
+            model_name="smallvariantsummary", name=name, field=models.IntegerField(default=0)
+        )
+    )
+operations.append(
+    migrations.AlterUniqueTogether(
+        name="smallvariantsummary",
+        unique_together={("release", "chromosome", "start", "end", "reference", "alternative")},
+    )
+)
+if not settings.IS_TESTING:
+    operations.append(migrations.RunSQL(SQL_CREATE_TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("variants", "0089_genotype_columns")]
+
+    operations = operations
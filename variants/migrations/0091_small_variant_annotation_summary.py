@@ -0,0 +1,214 @@
+"""Add the ``SmallVariantAnnotationSummary`` table and fill it from the existing annotations."""
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+#: The columns identifying an annotated variant in a case.
+KEY = 'case_id, release, chromosome, start, "end", reference, alternative'
+
+#: Fill the summary table from the comments, flags and ACMG ratings.
+FILL_SQL = """
+INSERT INTO variants_smallvariantannotationsummary (
+    {key},
+    date_modified,
+    comment_count,
+    flag_count,
+    flag_bookmarked,
+    flag_candidate,
+    flag_final_causative,
+    flag_for_validation,
+    flag_no_disease_association,
+    flag_segregates,
+    flag_doesnt_segregate,
+    flag_visual,
+    flag_molecular,
+    flag_validation,
+    flag_phenotype_match,
+    flag_summary,
+    acmg_class_auto,
+    acmg_class_override
+)
+SELECT
+    {key},
+    GREATEST(comments.date_modified, flags.date_modified, ratings.date_modified),
+    COALESCE(comments.comment_count, 0),
+    COALESCE(flags.flag_count, 0),
+    flags.flag_bookmarked,
+    flags.flag_candidate,
+    flags.flag_final_causative,
+    flags.flag_for_validation,
+    flags.flag_no_disease_association,
+    flags.flag_segregates,
+    flags.flag_doesnt_segregate,
+    flags.flag_visual,
+    flags.flag_molecular,
+    flags.flag_validation,
+    flags.flag_phenotype_match,
+    flags.flag_summary,
+    ratings.acmg_class_auto,
+    ratings.acmg_class_override
+FROM (
+    SELECT {key} FROM variants_smallvariantcomment
+    UNION SELECT {key} FROM variants_smallvariantflags
+    UNION SELECT {key} FROM variants_acmgcriteriarating
+) AS variants
+LEFT OUTER JOIN (
+    SELECT {key}, COUNT(*) AS comment_count, MAX(date_modified) AS date_modified
+    FROM variants_smallvariantcomment
+    GROUP BY {key}
+) AS comments USING ({key})
+LEFT OUTER JOIN (
+    SELECT
+        {key},
+        COUNT(*) AS flag_count,
+        MAX(date_modified) AS date_modified,
+        BOOL_OR(flag_bookmarked) AS flag_bookmarked,
+        BOOL_OR(flag_candidate) AS flag_candidate,
+        BOOL_OR(flag_final_causative) AS flag_final_causative,
+        BOOL_OR(flag_for_validation) AS flag_for_validation,
+        BOOL_OR(flag_no_disease_association) AS flag_no_disease_association,
+        BOOL_OR(flag_segregates) AS flag_segregates,
+        BOOL_OR(flag_doesnt_segregate) AS flag_doesnt_segregate,
+        MAX(flag_visual) AS flag_visual,
+        MAX(flag_molecular) AS flag_molecular,
+        MAX(flag_validation) AS flag_validation,
+        MAX(flag_phenotype_match) AS flag_phenotype_match,
+        MAX(flag_summary) AS flag_summary
+    FROM variants_smallvariantflags
+    GROUP BY {key}
+) AS flags USING ({key})
+LEFT OUTER JOIN (
+    SELECT
+        {key},
+        MAX(class_auto) AS acmg_class_auto,
+        MAX(class_override) AS acmg_class_override,
+        MAX(date_modified) AS date_modified
+    FROM variants_acmgcriteriarating
+    GROUP BY {key}
+) AS ratings USING ({key})
+""".format(
+    key=KEY
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("variants", "0090_smallvariantsummary_table"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SmallVariantAnnotationSummary",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                ("release", models.CharField(max_length=32)),
+                ("chromosome", models.CharField(max_length=32)),
+                ("start", models.IntegerField()),
+                ("end", models.IntegerField()),
+                ("reference", models.CharField(max_length=512)),
+                ("alternative", models.CharField(max_length=512)),
+                (
+                    "date_modified",
+                    models.DateTimeField(help_text="DateTime of last modification of annotations"),
+                ),
+                ("comment_count", models.IntegerField(default=0)),
+                ("flag_count", models.IntegerField(default=0)),
+                ("flag_bookmarked", models.BooleanField(null=True)),
+                ("flag_candidate", models.BooleanField(null=True)),
+                ("flag_final_causative", models.BooleanField(null=True)),
+                ("flag_for_validation", models.BooleanField(null=True)),
+                ("flag_no_disease_association", models.BooleanField(null=True)),
+                ("flag_segregates", models.BooleanField(null=True)),
+                ("flag_doesnt_segregate", models.BooleanField(null=True)),
+                (
+                    "flag_visual",
+                    models.CharField(
+                        choices=[
+                            ("positive", "positive"),
+                            ("uncertain", "uncertain"),
+                            ("negative", "negative"),
+                            ("empty", "empty"),
+                        ],
+                        max_length=32,
+                        null=True,
+                    ),
+                ),
+                (
+                    "flag_molecular",
+                    models.CharField(
+                        choices=[
+                            ("positive", "positive"),
+                            ("uncertain", "uncertain"),
+                            ("negative", "negative"),
+                            ("empty", "empty"),
+                        ],
+                        max_length=32,
+                        null=True,
+                    ),
+                ),
+                (
+                    "flag_validation",
+                    models.CharField(
+                        choices=[
+                            ("positive", "positive"),
+                            ("uncertain", "uncertain"),
+                            ("negative", "negative"),
+                            ("empty", "empty"),
+                        ],
+                        max_length=32,
+                        null=True,
+                    ),
+                ),
+                (
+                    "flag_phenotype_match",
+                    models.CharField(
+                        choices=[
+                            ("positive", "positive"),
+                            ("uncertain", "uncertain"),
+                            ("negative", "negative"),
+                            ("empty", "empty"),
+                        ],
+                        max_length=32,
+                        null=True,
+                    ),
+                ),
+                (
+                    "flag_summary",
+                    models.CharField(
+                        choices=[
+                            ("positive", "positive"),
+                            ("uncertain", "uncertain"),
+                            ("negative", "negative"),
+                            ("empty", "empty"),
+                        ],
+                        max_length=32,
+                        null=True,
+                    ),
+                ),
+                ("acmg_class_auto", models.IntegerField(null=True)),
+                ("acmg_class_override", models.IntegerField(null=True)),
+                (
+                    "case",
+                    models.ForeignKey(
+                        help_text="Case that this variant is annotated in",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="variants.case",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {
+                    ("case", "release", "chromosome", "start", "end", "reference", "alternative")
+                },
+            },
+        ),
+        migrations.RunSQL(FILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("variants", "0091_small_variant_annotation_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="projectcasesummary",
+            name="generation",
+            field=models.IntegerField(default=0, help_text="Number of invalidations"),
+        ),
+    ]
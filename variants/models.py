@@ -1,11 +1,13 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import functools
 import itertools
+import operator
 import os
 import shlex
 import shutil
 import subprocess
-import tempfile
-import time
 from datetime import datetime, timedelta
 import json
 from collections import defaultdict
@@ -18,26 +20,28 @@ import re
 import requests
 from django.utils.timezone import localtime
 
-from varfish.utils import JSONField
+from varfish.utils import JSONField, LazyModule
 from variants.helpers import get_engine
 from bgjobs.plugins import BackgroundJobsPluginPoint
 from django.contrib.auth import get_user_model
 from django.forms import model_to_dict
 from django.utils.html import strip_tags
-from sqlalchemy import select, func, and_, delete
+from sqlalchemy import select, func, and_
 import uuid as uuid_object
 
 from postgres_copy import CopyManager
 
-from django.db import models, transaction, connection, utils
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.aggregates import BoolOr
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ValidationError
 from django.urls import reverse
 from django.dispatch import receiver
 from django.conf import settings
-from django.db.models.signals import pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.utils import timezone
 
 from projectroles.models import Project
@@ -55,11 +59,13 @@ from geneinfo.models import Hgnc, EnsemblToGeneSymbol
 from genomicfeatures.models import GeneInterval
 
 #: The SQL Alchemy engine to use
-from importer.management.helpers import open_file, tsv_reader
+from importer.management.helpers import copy_tsv_files, open_file, tsv_reader
 
 from variants.helpers import get_meta
+from variants.purge import purge_rows
 from projectroles.app_settings import AppSettingAPI
 
+np = LazyModule("numpy")
 
 app_settings = AppSettingAPI()
 
@@ -172,16 +178,10 @@ class CaseAwareProject(Project):
         )
         if disable_sex_check:
             return result
-        for case in self.case_set.all():
-            result.update(case.sex_errors(disable_sex_check))
-        return result
+        return get_project_case_summary(self).sex_errors
 
     def sex_errors_to_fix(self):
-        for case in self.case_set.all():
-            fix_case = case.sex_errors_variant_stats(lambda x: x)
-            if fix_case:
-                return True
-        return False
+        return get_project_case_summary(self).sex_errors_to_fix
 
     def get_case_pks(self):
         """Return PKs for cases."""
@@ -197,32 +197,28 @@ class CaseAwareProject(Project):
 
     def num_small_vars(self):
         """Return total number of small vars in a project."""
-        return sum(
-            case.num_small_vars for case in self.case_set.all() if case.num_small_vars is not None
-        )
+        return get_project_case_summary(self).num_small_vars
 
     def has_variants_and_variant_sets(self):
-        return all(case.has_variants_and_variant_set() for case in self.case_set.all())
+        summary = get_project_case_summary(self)
+        return summary.num_cases_with_variants == summary.num_cases
 
     def casealignmentstats(self):
-        stats = []
-        for case in self.case_set.all():
-            variant_set = case.latest_variant_set
-            if variant_set:
-                stats.append(variant_set.casealignmentstats)
-        return stats
+        return list(
+            CaseAlignmentStats.objects.filter(
+                variant_set__case_of_latest_variant_set__project=self
+            ).order_by("-case__date_modified")
+        )
 
     def get_annotation_count(self):
-        return sum(case.get_annotation_count() for case in self.case_set.all())
+        return get_project_case_summary(self).annotation_count
 
     def sample_variant_stats(self):
-        stats = []
-        for case in self.case_set.all():
-            variant_set = case.latest_variant_set
-            if variant_set:
-                for sample in variant_set.variant_stats.sample_variant_stats.all():
-                    stats.append(sample)
-        return stats
+        return list(
+            SampleVariantStatistics.objects.filter(
+                stats__variant_set__case_of_latest_variant_set__project=self
+            ).order_by("-stats__variant_set__case__date_modified", "sample_name")
+        )
 
 
 class SmallVariant(models.Model):
@@ -254,6 +250,14 @@ class SmallVariant(models.Model):
     info = JSONField(default=dict)
     #: Genotype information as JSONB
     genotype = JSONField()
+    #: Genotype codes of the samples in ``SmallVariantSet.genotype_samples``, see ``variants.genotype_columns``
+    genotype_gt = ArrayField(models.SmallIntegerField(null=True), null=True)
+    #: Genotype qualities of the samples in ``SmallVariantSet.genotype_samples``
+    genotype_gq = ArrayField(models.IntegerField(null=True), null=True)
+    #: Total depths of the samples in ``SmallVariantSet.genotype_samples``
+    genotype_dp = ArrayField(models.IntegerField(null=True), null=True)
+    #: Alternative allele depths of the samples in ``SmallVariantSet.genotype_samples``
+    genotype_ad = ArrayField(models.IntegerField(null=True), null=True)
     #: Number of hom. alt. genotypes
     num_hom_alt = models.IntegerField(default=0)
     #: Number of hom. ref. genotypes
@@ -381,11 +385,15 @@ class SmallVariant(models.Model):
 
 
 class SmallVariantSummary(models.Model):
-    """Summary counts for the small variants.
+    """Summary counts of the small variants in the active variant sets (aka "in-house database").
 
-    In the database, this is a materialized view.
+    The counts are kept up to date on import and deletion of variants (see ``inhouse_counts``), such that the
+    in-house counts of a variant can be joined with an index lookup.
     """
 
+    #: Primary key, the table is updated with upserts that use up sequence values on conflicts.
+    id = models.BigAutoField(primary_key=True)
+
     #: Genome build
     release = models.CharField(max_length=32)
     #: Variant coordinates - chromosome
@@ -402,23 +410,40 @@ class SmallVariantSummary(models.Model):
     alternative = models.CharField(max_length=512)
 
     #: Number of hom. ref. genotypes.
-    count_hom_ref = models.IntegerField()
+    count_hom_ref = models.IntegerField(default=0)
     #: Number of heterozygous genotypes.
-    count_het = models.IntegerField()
+    count_het = models.IntegerField(default=0)
     #: Number of hom. alt. genotypes.
-    count_hom_alt = models.IntegerField()
+    count_hom_alt = models.IntegerField(default=0)
     #: Number of hemi ref. genotypes.
-    count_hemi_ref = models.IntegerField()
+    count_hemi_ref = models.IntegerField(default=0)
     #: Number of hemi alt. genotypes.
-    count_hemi_alt = models.IntegerField()
+    count_hemi_alt = models.IntegerField(default=0)
 
     class Meta:
         managed = settings.IS_TESTING
         db_table = "variants_smallvariantsummary"
+        unique_together = (("release", "chromosome", "start", "end", "reference", "alternative"),)
+
+
+class SmallVariantSummaryVariantSet(models.Model):
+    """Small variant set whose variants are counted in ``SmallVariantSummary``."""
+
+    variant_set = models.OneToOneField(
+        "SmallVariantSet",
+        on_delete=models.CASCADE,
+        related_name="+",
+        help_text="The counted variant set",
+    )
 
 
 def refresh_variants_smallvariantsummary():
-    """Refresh the ``SmallVariantSummary`` materialized view."""
+    """Rebuild the ``SmallVariantSummary`` counts from the active variant sets.
+
+    The counts are maintained on import and deletion of variants, rebuilding them is only necessary for repairing.
+    """
+    # This must be imported here to circumvent cyclic dependencies
+    from .inhouse_counts import rebuild_inhouse_counts  # noqa
 
     with transaction.atomic():
         bg_job = BackgroundJob.objects.create(
@@ -429,16 +454,7 @@ def refresh_variants_smallvariantsummary():
         )
         refresh_job = RefreshSmallVariantSummaryBgJob.objects.create(bg_job=bg_job)
     with refresh_job.marks():
-        with connection.cursor() as cursor:
-            try:
-                # This will fail if the materialized view is empty.
-                with transaction.atomic():
-                    cursor.execute(
-                        "REFRESH MATERIALIZED VIEW CONCURRENTLY variants_smallvariantsummary"
-                    )
-            except utils.NotSupportedError:
-                with transaction.atomic():
-                    cursor.execute("REFRESH MATERIALIZED VIEW variants_smallvariantsummary")
+        rebuild_inhouse_counts(get_engine())
 
 
 class CaseManager(models.Manager):
@@ -881,7 +897,11 @@ def delete_case_cascaded(sender, instance, **kwargs):
     ```
     """
     if sender == Case:
-        SmallVariant.objects.filter(case_id=instance.id).delete()
+        # This must be imported here to circumvent cyclic dependencies
+        from .variant_set_counts import remove_case_counts  # noqa
+
+        remove_case_counts(get_engine(), instance)
+        purge_rows(get_engine(), SmallVariant.sa.table, {"case_id": instance.id})
         for plugin in BackgroundJobsPluginPoint.get_plugins():
             for _, klass in plugin.job_specs.items():
                 bgjobs = []
@@ -963,6 +983,9 @@ class SmallVariantSet(models.Model):
         null=False,
         blank=False,
     )
+    #: The samples in the order of the entries in the genotype columns of the variants or ``None`` if the
+    #: genotype columns are not filled.
+    genotype_samples = ArrayField(models.CharField(max_length=512), null=True, blank=True)
 
 
 def cleanup_variant_sets(min_age_hours=12):
@@ -974,13 +997,10 @@ def cleanup_variant_sets(min_age_hours=12):
     )
     smallvariant_table = get_meta().tables["variants_smallvariant"]
     for variant_set in variant_sets:
-        get_engine().execute(
-            smallvariant_table.delete().where(
-                and_(
-                    smallvariant_table.c.set_id == variant_set.id,
-                    smallvariant_table.c.case_id == variant_set.case.id,
-                )
-            )
+        purge_rows(
+            get_engine(),
+            smallvariant_table,
+            {"set_id": variant_set.id, "case_id": variant_set.case.id},
         )
         variant_set.delete()
 
@@ -1038,6 +1058,13 @@ EXPORT_FILE_TYPE_CHOICES = (
     (EXPORT_TYPE_CHOICE_VCF, "VCF File"),
 )
 
+#: File name extensions of the export file types.
+EXPORT_FILE_EXTENSIONS = {
+    EXPORT_TYPE_CHOICE_TSV: ".tsv",
+    EXPORT_TYPE_CHOICE_XLSX: ".xlsx",
+    EXPORT_TYPE_CHOICE_VCF: ".vcf.gz",
+}
+
 
 class ExportFileBgJobBase(JobModelMessageMixin, models.Model):
     """Base class for background file export jobs."""
@@ -1101,6 +1128,10 @@ class ExportFileBgJob(ExportFileBgJobBase):
         )
 
 
+def export_file_job_result_upload_to(instance, filename):
+    return "exports/%s/%s" % (instance.job.sodar_uuid, filename)
+
+
 class ExportFileJobResult(models.Model):
     """Result of ``ExportFileBgJob``."""
 
@@ -1112,7 +1143,9 @@ class ExportFileJobResult(models.Model):
         help_text="Related file export job",
     )
     expiry_time = models.DateTimeField(help_text="Time at which the file download expires")
-    payload = models.BinaryField(help_text="Resulting exported file")
+    file = models.FileField(
+        upload_to=export_file_job_result_upload_to, help_text="Resulting exported file"
+    )
 
 
 class ExportProjectCasesFileBgJob(ExportFileBgJobBase):
@@ -1150,7 +1183,15 @@ class ExportProjectCasesFileBgJobResult(models.Model):
         help_text="Related file export job",
     )
     expiry_time = models.DateTimeField(help_text="Time at which the file download expires")
-    payload = models.BinaryField(help_text="Resulting exported file")
+    file = models.FileField(
+        upload_to=export_file_job_result_upload_to, help_text="Resulting exported file"
+    )
+
+
+@receiver(post_delete, sender=ExportFileJobResult)
+@receiver(post_delete, sender=ExportProjectCasesFileBgJobResult)
+def export_file_job_result_delete(sender, instance, **_kwargs):
+    instance.file.delete(save=False)
 
 
 class DistillerSubmissionBgJob(JobModelMessageMixin, models.Model):
@@ -1998,6 +2039,36 @@ class SampleVariantStatistics(models.Model):
         ordering = ("sample_name",)
 
 
+class SampleSiteGenotypes(models.Model):
+    """Genotypes of a donor in a ``SmallVariantSet`` at the reference sites used for relatedness computation.
+
+    The genotypes are stored as the ``int8`` vector returned by ``var_stats_qc.qc.compute_site_genotypes()`` such
+    that project-wide relatedness can be updated without querying the variants of all cases again.
+    """
+
+    #: The related ``SmallVariantSet``.
+    variant_set = models.ForeignKey(
+        SmallVariantSet,
+        null=False,
+        related_name="site_genotypes",
+        help_text="The variant set of the genotypes",
+        on_delete=models.CASCADE,
+    )
+
+    #: The name of the donor.
+    sample_name = models.CharField(max_length=200, null=False)
+
+    #: The genotype codes at the reference sites, one byte per site.
+    genotypes = models.BinaryField(null=False)
+
+    def get_genotypes(self):
+        """Return genotypes as ``numpy`` array."""
+        return np.frombuffer(bytes(self.genotypes), dtype=np.int8)
+
+    class Meta:
+        unique_together = ("variant_set", "sample_name")
+
+
 class BaseRelatedness(models.Model):
     """Shared functionality of relatedness of individuals in a collective.
 
@@ -2059,6 +2130,13 @@ class ProjectVariantStats(models.Model):
         on_delete=models.CASCADE,
     )
 
+    #: The ``SmallVariantSet``s whose samples are included in the relatedness information.
+    variant_sets = models.ManyToManyField(
+        SmallVariantSet,
+        related_name="+",
+        help_text="The variant sets included in the project-wide relatedness",
+    )
+
 
 class ProjectRelatedness(BaseRelatedness):
     """Store relatedness information between two donors in a case/``Case``.."""
@@ -2130,6 +2208,7 @@ class PathogenicityScoreCacheBase(models.Model):
 
     class Meta:
         abstract = True
+        indexes = [models.Index(fields=["chromosome", "start", "reference", "alternative"])]
 
 
 class CaddPathogenicityScoreCache(PathogenicityScoreCacheBase):
@@ -2452,16 +2531,30 @@ class VariantScoresFactory:
 
 
 class VariantScoresBase:
-    """Variant scoring base class."""
+    """Variant scoring base class.
+
+    Uncached variants are split into chunks that are scored concurrently on an ``asyncio`` event
+    loop (see ``_score_chunks()``).  The blocking HTTP requests are run in a thread pool while the
+    event loop schedules submission and polling of up to ``VARFISH_PATHO_SCORING_MAX_CONCURRENCY``
+    chunks at the same time.
+    """
 
     #: Set PathogenicityCache model (required in child classes)
     cache_model = None
+    #: Number of variants to look up in the cache with one query.
+    cache_lookup_chunk_size = 500
+    #: Initial delay in seconds when polling for results, doubled after each poll.
+    poll_initial_delay = 0.5
+    #: Maximal delay in seconds when polling for results.
+    poll_max_delay = 10
 
     def __init__(self, genomebuild, variants, score_type, user=None):
         self.genomebuild = genomebuild
         self.variants = list(set(variants))
         self.superuser = user
         self.score_type = score_type
+        #: Thread pool for running blocking requests, only set while scoring chunks.
+        self._executor = None
 
     def score(self):
         raise NotImplementedError("Implement me!")
@@ -2472,17 +2565,35 @@ class VariantScoresBase:
         return self.cache_model
 
     def _get_cached_and_uncached_variants(self):
+        """Split ``self.variants`` into cached records and uncached variants.
+
+        The cache is queried once for each chunk of ``cache_lookup_chunk_size`` variants.
+        """
+        found = {}
+        for i in range(0, len(self.variants), self.cache_lookup_chunk_size):
+            chunk = self.variants[i : i + self.cache_lookup_chunk_size]
+            query = functools.reduce(
+                operator.or_,
+                (
+                    Q(
+                        chromosome=chromosome,
+                        start=start,
+                        reference=reference,
+                        alternative=alternative,
+                    )
+                    for chromosome, start, reference, alternative in chunk
+                ),
+            )
+            for record in self.get_cache_model().objects.filter(query):
+                key = (record.chromosome, record.start, record.reference, record.alternative)
+                found.setdefault(key, record)
         cached = []
         uncached = []
         for variant in self.variants:
-            res = self.get_cache_model().objects.filter(
-                chromosome=variant[0],
-                start=variant[1],
-                reference=variant[2],
-                alternative=variant[3],
-            )
-            if res:
-                cached.append(res.first())
+            chromosome, start, reference, alternative = variant
+            key = (chromosome, int(start), reference, alternative)
+            if key in found:
+                cached.append(found[key])
             else:
                 uncached.append(variant)
         return cached, uncached
@@ -2500,6 +2611,68 @@ class VariantScoresBase:
         yield_dict["score_type"] = self.score_type
         return yield_dict
 
+    def _score_chunks(self, variants, chunk_size, score_chunk):
+        """Score ``variants`` in chunks of ``chunk_size`` with the coroutine ``score_chunk(chunk)``.
+
+        The chunks are scored concurrently and the results of ``score_chunk()`` are yielded in the
+        order of completion.  The event loop only runs while waiting for the next result, so the
+        caller can use the Django ORM (e.g., for caching the results) between results.
+        """
+        chunks = [variants[i : i + chunk_size] for i in range(0, len(variants), chunk_size)]
+        if not chunks:
+            return
+        max_concurrency = min(settings.VARFISH_PATHO_SCORING_MAX_CONCURRENCY, len(chunks))
+
+        async def run_all():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def run_one(chunk):
+                async with semaphore:
+                    return await score_chunk(chunk)
+
+            tasks = [asyncio.ensure_future(run_one(chunk)) for chunk in chunks]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        results = run_all()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(results.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            loop.run_until_complete(results.aclose())
+            loop.close()
+            self._executor.shutdown()
+            self._executor = None
+
+    async def _request(self, method, url, **kwargs):
+        """Perform blocking HTTP request in thread pool and check response for errors."""
+        loop = asyncio.get_event_loop()
+        try:
+            res = await loop.run_in_executor(
+                self._executor, functools.partial(requests.request, method, url, **kwargs)
+            )
+        except requests.ConnectionError:
+            raise ConnectionError("ERROR: Server {} not responding.".format(url))
+
+        # Exit if error is reported
+        if not res.status_code == 200:
+            raise ConnectionError(
+                "ERROR: Server responded with status {} and message {}".format(
+                    res.status_code, res.text
+                )
+            )
+        return res
+
 
 class VariantScoresUmd(VariantScoresBase):
     """Variant scoring class for UMD Predictor."""
@@ -2507,6 +2680,22 @@ class VariantScoresUmd(VariantScoresBase):
     #: Set PathogenicityCache model (required)
     cache_model = UmdPathogenicityScoreCache
 
+    #: UMD API results do not contain header, so manually assign header information from their web page legend.
+    header = [
+        "chromosome",
+        "position",
+        "gene_name",
+        "ensembl_gene_id",
+        "ensembl_transcript_id",
+        "transcript_position",
+        "reference",
+        "alternative",
+        "aa_wildtype",
+        "aa_mutant",
+        "pathogenicity_score",
+        "conclusion",
+    ]
+
     def score(self):
         if not self.variants or not self.superuser:
             return
@@ -2520,62 +2709,41 @@ class VariantScoresUmd(VariantScoresBase):
 
         cached, uncached = self._get_cached_and_uncached_variants()
 
-        try:
-            res = requests.get(
-                settings.VARFISH_UMD_REST_API_URL,
-                params=dict(
-                    batch=",".join(["_".join(map(str, var)) for var in uncached]), token=token
-                ),
-            )
-        except requests.ConnectionError:
-            raise ConnectionError(
-                "ERROR: Server {} not responding.".format(settings.VARFISH_UMD_REST_API_URL)
-            )
-
-        # Exit if error is reported
-        if not res.status_code == 200:
-            raise ConnectionError(
-                "ERROR: Server responded with status {} and message {}".format(
-                    res.status_code, res.text
-                )
-            )
-
-        # UMD API results do not contain header, so manually assign header information from their web page legend.
-        header = [
-            "chromosome",
-            "position",
-            "gene_name",
-            "ensembl_gene_id",
-            "ensembl_transcript_id",
-            "transcript_position",
-            "reference",
-            "alternative",
-            "aa_wildtype",
-            "aa_mutant",
-            "pathogenicity_score",
-            "conclusion",
-        ]
         # Yield cached results
         for item in cached:
             item = model_to_dict(item)
             yield self._build_yield_dict(item, item["pathogenicity_score"], {})
-        # Yield API results
+
+        async def score_chunk(chunk):
+            return await self._score_chunk(chunk, token)
+
+        # Yield API results and store them in cache as they arrive.
+        for records in self._score_chunks(uncached, settings.VARFISH_UMD_BATCH_VARS, score_chunk):
+            self._cache_results([self.get_cache_model()(**record) for record in records])
+            for record in records:
+                yield self._build_yield_dict(record, record["pathogenicity_score"], {})
+
+    async def _score_chunk(self, chunk, token):
+        res = await self._request(
+            "get",
+            settings.VARFISH_UMD_REST_API_URL,
+            params=dict(batch=",".join(["_".join(map(str, var)) for var in chunk]), token=token),
+        )
+
         result = []
         for line in res.text.split("\n"):
             if not line:
                 continue
             if not line.startswith("chr"):
                 continue
-            record = dict(zip(header, line.split("\t")))
+            record = dict(zip(self.header, line.split("\t")))
             record["release"] = "GRCh37"
             record["chromosome"] = record["chromosome"][3:]
             record["start"] = int(record.pop("position"))
             record["end"] = record["start"] + len(record["reference"]) - 1
             record["bin"] = binning.assign_bin(record["start"] - 1, record["end"])
-            result.append(self.get_cache_model()(**record))
-            yield self._build_yield_dict(record, record["pathogenicity_score"], {})
-        # Store API results in cache
-        self._cache_results(result)
+            result.append(record)
+        return result
 
 
 class VariantScoresMutationTaster(VariantScoresBase):
@@ -2605,32 +2773,27 @@ class VariantScoresMutationTaster(VariantScoresBase):
                 _variant_scores_mutationtaster_info(item),
             )
 
-        for i in range(len(uncached)):
-            if i % settings.VARFISH_MUTATIONTASTER_BATCH_VARS == 0:
-                yield from self._variant_scores_mutationtaster_loop(
-                    uncached[i : i + settings.VARFISH_MUTATIONTASTER_BATCH_VARS]
+        # Yield API results and store them in cache as they arrive.
+        for records in self._score_chunks(
+            uncached,
+            settings.VARFISH_MUTATIONTASTER_BATCH_VARS,
+            self._variant_scores_mutationtaster_loop,
+        ):
+            self._cache_results([self.get_cache_model()(**record) for record in records])
+            for record in records:
+                yield self._build_yield_dict(
+                    record,
+                    _variant_scores_mutationtaster_score(record),
+                    _variant_scores_mutationtaster_info(record),
                 )
 
-    def _variant_scores_mutationtaster_loop(self, batch):
+    async def _variant_scores_mutationtaster_loop(self, batch):
         batch_str = ",".join("{}:{}{}>{}".format(*var) for var in batch)
-        try:
-            res = requests.post(
-                settings.VARFISH_MUTATIONTASTER_REST_API_URL,
-                dict(format="tsv", debug="0", variants=batch_str),
-            )
-        except requests.ConnectionError:
-            raise ConnectionError(
-                "ERROR: Server {} not responding.".format(
-                    settings.VARFISH_MUTATIONTASTER_REST_API_URL
-                )
-            )
-
-        if not res.status_code == 200:
-            raise ConnectionError(
-                "ERROR: Server responded with status {} and message {}".format(
-                    res.status_code, res.text
-                )
-            )
+        res = await self._request(
+            "post",
+            settings.VARFISH_MUTATIONTASTER_REST_API_URL,
+            data=dict(format="tsv", debug="0", variants=batch_str),
+        )
 
         error_response = "Content-Type: text/plain\n\nERROR: "
         if res.text.startswith(error_response):
@@ -2641,7 +2804,7 @@ class VariantScoresMutationTaster(VariantScoresBase):
         result = []
         lines = res.text.split("\n")
         if not lines or len(lines) < 2:
-            return
+            return result
         head = lines.pop(0).lower().split("\t")
         for line in lines:
             if not line:
@@ -2674,46 +2837,35 @@ class VariantScoresMutationTaster(VariantScoresBase):
                 if record["distance_from_splicesite"]
                 else None
             )
-            result.append(self.get_cache_model()(**record))
-            yield self._build_yield_dict(
-                record,
-                _variant_scores_mutationtaster_score(record),
-                _variant_scores_mutationtaster_info(record),
-            )
-        result_ = [(r.chromosome, r.start, r.reference, r.alternative) for r in result]
+            result.append(record)
+        result_ = [(r["chromosome"], r["start"], r["reference"], r["alternative"]) for r in result]
         # Create empty record for variants that weren't scored by mutationtaster
         # (and thus do not show up in the results and would be queried all over again)
         for variant in batch:
             if variant not in result_:
                 chromosome, start, reference, alternative = variant
-                record = {
-                    "release": "GRCh37",
-                    "chromosome": chromosome,
-                    "start": start,
-                    "end": start + len(reference) - 1,
-                    "bin": binning.assign_bin(start - 1, start + len(reference) - 1),
-                    "reference": reference,
-                    "alternative": alternative,
-                    "transcript_stable": None,
-                    "ncbi_geneid": None,
-                    "prediction": None,
-                    "model": None,
-                    "bayes_prob_dc": None,
-                    "note": "error",
-                    "splicesite": None,
-                    "distance_from_splicesite": None,
-                    "disease_mutation": None,
-                    "polymorphism": None,
-                }
-                result.append(self.get_cache_model()(**record))
-                yield self._build_yield_dict(
-                    record,
-                    _variant_scores_mutationtaster_score(record),
-                    _variant_scores_mutationtaster_info(record),
+                result.append(
+                    {
+                        "release": "GRCh37",
+                        "chromosome": chromosome,
+                        "start": start,
+                        "end": start + len(reference) - 1,
+                        "bin": binning.assign_bin(start - 1, start + len(reference) - 1),
+                        "reference": reference,
+                        "alternative": alternative,
+                        "transcript_stable": None,
+                        "ncbi_geneid": None,
+                        "prediction": None,
+                        "model": None,
+                        "bayes_prob_dc": None,
+                        "note": "error",
+                        "splicesite": None,
+                        "distance_from_splicesite": None,
+                        "disease_mutation": None,
+                        "polymorphism": None,
+                    }
                 )
-
-        # Store API results in cache
-        self._cache_results(result)
+        return result
 
 
 def _variant_scores_mutationtaster_score(record):
@@ -2759,49 +2911,42 @@ class VariantScoresCadd(VariantScoresBase):
             return
 
         cached, uncached = self._get_cached_and_uncached_variants()
-        uncached = uncached[: settings.VARFISH_CADD_MAX_VARS]
 
-        # TODO: properly test
-        try:
-            res = requests.post(
-                settings.VARFISH_CADD_REST_API_URL + "/annotate/",
-                json={
-                    "genome_build": self.genomebuild,
-                    "cadd_release": settings.VARFISH_CADD_REST_API_CADD_VERSION,
-                    "variant": ["-".join(map(str, var)) for var in uncached],
-                },
-            )
-        except requests.ConnectionError:
-            raise ConnectionError(
-                "ERROR: Server {} not responding.".format(settings.VARFISH_CADD_REST_API_URL)
-            )
+        # Yield cached results
+        for item in cached:
+            item = model_to_dict(item)
+            yield self._build_yield_dict(item, item["scores"][1], {})
 
-        # Exit if error is reported
-        if not res.status_code == 200:
-            raise ConnectionError(
-                "ERROR: Server responded with status {} and message {}".format(
-                    res.status_code, res.text
-                )
-            )
+        # Yield API results and store them in cache as they arrive.
+        for records in self._score_chunks(
+            uncached, settings.VARFISH_CADD_MAX_VARS, self._score_chunk
+        ):
+            self._cache_results([self.get_cache_model()(**record) for record in records])
+            for record in records:
+                yield self._build_yield_dict(record, record["scores"][1], {})
+
+    async def _score_chunk(self, chunk):
+        """Submit one CADD job for ``chunk`` and poll for its result with exponential backoff."""
+        res = await self._request(
+            "post",
+            settings.VARFISH_CADD_REST_API_URL + "/annotate/",
+            json={
+                "genome_build": self.genomebuild,
+                "cadd_release": settings.VARFISH_CADD_REST_API_CADD_VERSION,
+                "variant": ["-".join(map(str, var)) for var in chunk],
+            },
+        )
         bgjob_uuid = res.json().get("uuid")
+        delay = self.poll_initial_delay
         while True:
-            try:
-                res = requests.post(
-                    settings.VARFISH_CADD_REST_API_URL + "/result/", json={"bgjob_uuid": bgjob_uuid}
-                )
-            except requests.ConnectionError:
-                raise ConnectionError(
-                    "ERROR: Server {} not responding.".format(settings.VARFISH_CADD_REST_API_URL)
-                )
-
-            if not res.status_code == 200:
-                raise ConnectionError(
-                    "ERROR: Server responded with status {} and message {}".format(
-                        res.status_code, res.text
-                    )
-                )
+            res = await self._request(
+                "post",
+                settings.VARFISH_CADD_REST_API_URL + "/result/",
+                json={"bgjob_uuid": bgjob_uuid},
+            )
             if res.json().get("status") == "active":
-                time.sleep(2)
+                await asyncio.sleep(delay)
+                delay = min(2 * delay, self.poll_max_delay)
             elif res.json().get("status") == "failed":
                 raise ConnectionError(
                     "Job failed, leaving the following message: {}".format(res.json().get("result"))
@@ -2809,30 +2954,25 @@ class VariantScoresCadd(VariantScoresBase):
             else:  # status == finished
                 break
 
-        # Yield cached results
-        for item in cached:
-            item = model_to_dict(item)
-            yield self._build_yield_dict(item, item["scores"][1], {})
-
         result = []
         for var, scores in res.json().get("scores", {}).items():
             chrom, pos, ref, alt = var.split("-")
             start = int(pos)
             end = start + len(ref) - 1
-            record = {
-                "release": "GRCh37",
-                "chromosome": chrom,
-                "start": start,
-                "end": end,
-                "bin": binning.assign_bin(start - 1, end),
-                "reference": ref,
-                "alternative": alt,
-                "info": res.json().get("info"),
-                "scores": scores,
-            }
-            result.append(self.get_cache_model()(**record))
-            yield self._build_yield_dict(record, record["scores"][1], {})
-        self._cache_results(result)
+            result.append(
+                {
+                    "release": "GRCh37",
+                    "chromosome": chrom,
+                    "start": start,
+                    "end": end,
+                    "bin": binning.assign_bin(start - 1, end),
+                    "reference": ref,
+                    "alternative": alt,
+                    "info": res.json().get("info"),
+                    "scores": scores,
+                }
+            )
+        return result
 
 
 # TODO: Improve wrapper
@@ -3228,6 +3368,154 @@ class AcmgCriteriaRating(models.Model):
         return result
 
 
+#: The boolean flags of ``SmallVariantFlags``, merged with "or" in ``SmallVariantAnnotationSummary``.
+SMALL_VARIANT_BOOLEAN_FLAGS = (
+    "flag_bookmarked",
+    "flag_candidate",
+    "flag_final_causative",
+    "flag_for_validation",
+    "flag_no_disease_association",
+    "flag_segregates",
+    "flag_doesnt_segregate",
+)
+
+#: The valued flags of ``SmallVariantFlags``, merged with "max" in ``SmallVariantAnnotationSummary``.
+SMALL_VARIANT_VALUED_FLAGS = (
+    "flag_visual",
+    "flag_molecular",
+    "flag_validation",
+    "flag_phenotype_match",
+    "flag_summary",
+)
+
+
+class SmallVariantAnnotationSummary(models.Model):
+    """Merged user annotations of a small variant in a case.
+
+    Summarizes the ``SmallVariantComment``, ``SmallVariantFlags`` and ``AcmgCriteriaRating`` records of one
+    variant in one case, such that the filter queries can join the annotations with a single index lookup.
+    There is a record for each variant with at least one annotation.  The records are kept up to date by the
+    signal handlers below.  The flag fields are ``None`` if the variant has no flags.
+    """
+
+    #: The related case.
+    case = models.ForeignKey(
+        Case,
+        on_delete=models.CASCADE,
+        null=False,
+        related_name="+",
+        help_text="Case that this variant is annotated in",
+    )
+
+    #: Genome build
+    release = models.CharField(max_length=32)
+    #: Variant coordinates - chromosome
+    chromosome = models.CharField(max_length=32)
+    #: Variant coordinates - 1-based start position
+    start = models.IntegerField()
+    #: Variant coordinates - end position
+    end = models.IntegerField()
+    #: Variant coordinates - reference
+    reference = models.CharField(max_length=512)
+    #: Variant coordinates - alternative
+    alternative = models.CharField(max_length=512)
+
+    #: DateTime of the last modification of the annotations.
+    date_modified = models.DateTimeField(help_text="DateTime of last modification of annotations")
+
+    #: Number of ``SmallVariantComment`` records.
+    comment_count = models.IntegerField(default=0)
+    #: Number of ``SmallVariantFlags`` records.
+    flag_count = models.IntegerField(default=0)
+
+    flag_bookmarked = models.BooleanField(null=True)
+    flag_candidate = models.BooleanField(null=True)
+    flag_final_causative = models.BooleanField(null=True)
+    flag_for_validation = models.BooleanField(null=True)
+    flag_no_disease_association = models.BooleanField(null=True)
+    flag_segregates = models.BooleanField(null=True)
+    flag_doesnt_segregate = models.BooleanField(null=True)
+
+    flag_visual = models.CharField(max_length=32, choices=VARIANT_RATING_CHOICES, null=True)
+    flag_molecular = models.CharField(max_length=32, choices=VARIANT_RATING_CHOICES, null=True)
+    flag_validation = models.CharField(max_length=32, choices=VARIANT_RATING_CHOICES, null=True)
+    flag_phenotype_match = models.CharField(
+        max_length=32, choices=VARIANT_RATING_CHOICES, null=True
+    )
+    flag_summary = models.CharField(max_length=32, choices=VARIANT_RATING_CHOICES, null=True)
+
+    #: ACMG class computed from the criteria, ``None`` if the variant has no ACMG rating.
+    acmg_class_auto = models.IntegerField(null=True)
+    #: ACMG class given by the user, ``None`` if not overridden.
+    acmg_class_override = models.IntegerField(null=True)
+
+    class Meta:
+        unique_together = (
+            ("case", "release", "chromosome", "start", "end", "reference", "alternative"),
+        )
+
+
+def update_small_variant_annotation_summary(
+    case_id, release, chromosome, start, end, reference, alternative
+):
+    """Recompute the ``SmallVariantAnnotationSummary`` of one variant in one case from its annotations."""
+    key = {
+        "case_id": case_id,
+        "release": release,
+        "chromosome": chromosome,
+        "start": start,
+        "end": end,
+        "reference": reference,
+        "alternative": alternative,
+    }
+    comments = SmallVariantComment.objects.filter(**key).aggregate(
+        comment_count=models.Count("pk"), date_modified=models.Max("date_modified")
+    )
+    flags = SmallVariantFlags.objects.filter(**key).aggregate(
+        flag_count=models.Count("pk"),
+        date_modified=models.Max("date_modified"),
+        **{name: BoolOr(name) for name in SMALL_VARIANT_BOOLEAN_FLAGS},
+        **{name: models.Max(name) for name in SMALL_VARIANT_VALUED_FLAGS},
+    )
+    ratings = AcmgCriteriaRating.objects.filter(**key).aggregate(
+        acmg_class_auto=models.Max("class_auto"),
+        acmg_class_override=models.Max("class_override"),
+        date_modified=models.Max("date_modified"),
+    )
+    dates_modified = [values.pop("date_modified") for values in (comments, flags, ratings)]
+    dates_modified = [date for date in dates_modified if date is not None]
+    if not dates_modified:
+        SmallVariantAnnotationSummary.objects.filter(**key).delete()
+    else:
+        SmallVariantAnnotationSummary.objects.update_or_create(
+            **key, defaults={**comments, **flags, **ratings, "date_modified": max(dates_modified)}
+        )
+
+
+@receiver(post_save, sender=SmallVariantComment)
+@receiver(post_delete, sender=SmallVariantComment)
+@receiver(post_save, sender=SmallVariantFlags)
+@receiver(post_delete, sender=SmallVariantFlags)
+@receiver(post_save, sender=AcmgCriteriaRating)
+@receiver(post_delete, sender=AcmgCriteriaRating)
+def annotation_update_small_variant_annotation_summary(sender, instance, **_kwargs):
+    update_small_variant_annotation_summary(
+        instance.case_id,
+        instance.release,
+        instance.chromosome,
+        instance.start,
+        instance.end,
+        instance.reference,
+        instance.alternative,
+    )
+
+
+@receiver(post_delete, sender=Case)
+def case_delete_small_variant_annotation_summary(sender, instance, **_kwargs):
+    """Remove the summaries that were recreated while the annotations of the case were deleted."""
+    SmallVariantAnnotationSummary.objects.filter(case_id=instance.pk).delete()
+
+
 class SyncCaseListBgJob(JobModelMessageMixin, models.Model):
     """Background job for syncing project with remote site."""
 
@@ -3363,6 +3651,169 @@ class ImportVariantsBgJob(JobModelMessageMixin, models.Model):
         return None
 
 
+#: The groups of ``ProjectCaseSummary`` fields that are invalidated and recomputed together.
+PROJECT_CASE_SUMMARY_GROUPS = {
+    "variants": ("num_cases", "num_cases_with_variants", "num_small_vars"),
+    "annotations": ("annotation_count",),
+    "sex_errors": ("sex_errors", "sex_errors_to_fix"),
+}
+
+
+class ProjectCaseSummary(models.Model):
+    """Materialized aggregates over the cases of a project.
+
+    The fields are grouped as in ``PROJECT_CASE_SUMMARY_GROUPS``.  A group is invalidated by setting its fields
+    to ``None`` when the underlying data changes (see the signal handlers below) and recomputed on the next
+    access through ``get_project_case_summary()``.  Each invalidation increments ``generation`` such that
+    recomputed values are only written if no invalidation happened in the meantime.
+    """
+
+    #: The related ``Project``.
+    project = models.OneToOneField(
+        Project,
+        null=False,
+        related_name="case_summary",
+        help_text="The project that the summary is for",
+        on_delete=models.CASCADE,
+    )
+    #: Incremented on every invalidation.
+    generation = models.IntegerField(default=0, help_text="Number of invalidations")
+
+    #: The number of cases.
+    num_cases = models.IntegerField(null=True, help_text="Number of cases")
+    #: The number of cases with a latest variant set containing small variants.
+    num_cases_with_variants = models.IntegerField(
+        null=True, help_text="Number of cases with small variants"
+    )
+    #: The total number of small variants.
+    num_small_vars = models.IntegerField(null=True, help_text="Total number of small variants")
+    #: The total number of annotated small and structural variants.
+    annotation_count = models.IntegerField(null=True, help_text="Number of annotated variants")
+    #: The sex errors of the cases, as returned by ``Case.sex_errors()``.
+    sex_errors = JSONField(null=True, help_text="Sex errors of the cases")
+    #: Whether any case has sex errors derived from the variant statistics.
+    sex_errors_to_fix = models.BooleanField(
+        null=True, help_text="Whether any case has sex errors to fix"
+    )
+
+
+def _compute_project_case_summary_variants(project):
+    return project.case_set.aggregate(
+        num_cases=models.Count("pk"),
+        num_cases_with_variants=models.Count(
+            "pk", filter=Q(latest_variant_set__isnull=False, num_small_vars__gt=0)
+        ),
+        num_small_vars=Coalesce(models.Sum("num_small_vars"), 0),
+    )
+
+
+def _compute_project_case_summary_annotations(project):
+    # This must be imported here to circumvent cyclic dependencies
+    from svs.models import StructuralVariantComment, StructuralVariantFlags  # noqa
+
+    small_var_fields = ("case_id", "chromosome", "start", "reference", "alternative")
+    small_vars = SmallVariantFlags.objects.filter(case__project=project).values_list(
+        *small_var_fields
+    )
+    small_vars = small_vars.union(
+        SmallVariantComment.objects.filter(case__project=project).values_list(*small_var_fields),
+        AcmgCriteriaRating.objects.filter(case__project=project).values_list(*small_var_fields),
+    )
+    sv_fields = ("case_id", "chromosome", "start", "end", "sv_type")
+    svs = StructuralVariantComment.objects.filter(case__project=project).values_list(*sv_fields)
+    svs = svs.union(
+        StructuralVariantFlags.objects.filter(case__project=project).values_list(*sv_fields)
+    )
+    return {"annotation_count": small_vars.count() + svs.count()}
+
+
+def _compute_project_case_summary_sex_errors(project):
+    sex_errors = {}
+    sex_errors_to_fix = False
+    for case in project.case_set.all():
+        sex_errors.update(case.sex_errors(False))
+        sex_errors_to_fix = sex_errors_to_fix or bool(case.sex_errors_to_fix())
+    return {"sex_errors": sex_errors, "sex_errors_to_fix": sex_errors_to_fix}
+
+
+#: The functions computing the fields of the ``PROJECT_CASE_SUMMARY_GROUPS``.
+_PROJECT_CASE_SUMMARY_COMPUTE = {
+    "variants": _compute_project_case_summary_variants,
+    "annotations": _compute_project_case_summary_annotations,
+    "sex_errors": _compute_project_case_summary_sex_errors,
+}
+
+
+def get_project_case_summary(project):
+    """Return the ``ProjectCaseSummary`` of ``project``, recomputing the invalidated field groups."""
+    summary, _ = ProjectCaseSummary.objects.get_or_create(project_id=project.pk)
+    values = {}
+    for group, fields in PROJECT_CASE_SUMMARY_GROUPS.items():
+        if any(getattr(summary, field) is None for field in fields):
+            values.update(_PROJECT_CASE_SUMMARY_COMPUTE[group](project))
+    if values:
+        # Do not overwrite an invalidation that happened while computing the values.
+        ProjectCaseSummary.objects.filter(pk=summary.pk, generation=summary.generation).update(
+            **values
+        )
+        for field, value in values.items():
+            setattr(summary, field, value)
+    return summary
+
+
+def invalidate_project_case_summary(groups, **filters):
+    """Invalidate the ``groups`` of the ``ProjectCaseSummary`` records selected by ``filters``."""
+    ProjectCaseSummary.objects.filter(**filters).update(
+        generation=F("generation") + 1,
+        **{field: None for group in groups for field in PROJECT_CASE_SUMMARY_GROUPS[group]},
+    )
+
+
+@receiver(post_save, sender=Case)
+@receiver(post_delete, sender=Case)
+def case_invalidate_project_case_summary(sender, instance, **_kwargs):
+    invalidate_project_case_summary(PROJECT_CASE_SUMMARY_GROUPS, project_id=instance.project_id)
+
+
+@receiver(post_save, sender=SmallVariantSet)
+@receiver(post_delete, sender=SmallVariantSet)
+def small_variant_set_invalidate_project_case_summary(sender, instance, **_kwargs):
+    invalidate_project_case_summary(("variants", "sex_errors"), project__case=instance.case_id)
+
+
+@receiver(post_save, sender=CaseVariantStats)
+@receiver(post_delete, sender=CaseVariantStats)
+def case_variant_stats_invalidate_project_case_summary(sender, instance, **_kwargs):
+    invalidate_project_case_summary(
+        ("sex_errors",), project__case__smallvariantset=instance.variant_set_id
+    )
+
+
+@receiver(post_save, sender=SampleVariantStatistics)
+@receiver(post_delete, sender=SampleVariantStatistics)
+def sample_variant_stats_invalidate_project_case_summary(sender, instance, **_kwargs):
+    invalidate_project_case_summary(
+        ("sex_errors",), project__case__smallvariantset__variant_stats=instance.stats_id
+    )
+
+
+@receiver(post_save, sender=SmallVariantFlags)
+@receiver(post_delete, sender=SmallVariantFlags)
+@receiver(post_save, sender=SmallVariantComment)
+@receiver(post_delete, sender=SmallVariantComment)
+@receiver(post_save, sender=AcmgCriteriaRating)
+@receiver(post_delete, sender=AcmgCriteriaRating)
+def annotation_invalidate_project_case_summary(sender, instance, **_kwargs):
+    invalidate_project_case_summary(("annotations",), project__case=instance.case_id)
+
+
+@receiver(post_save, sender=BackgroundJob)
+def background_job_invalidate_project_case_summary(sender, instance, **_kwargs):
+    """The sex errors are only reported once the latest import job of a case is done."""
+    if instance.job_type == ImportVariantsBgJob.spec_name:
+        invalidate_project_case_summary(("sex_errors",), project_id=instance.project_id)
+
+
 class KioskAnnotateBgJob(JobModelMessageMixin, models.Model):
     """Background job for annotating vcf in kiosk mode."""
 
@@ -3521,14 +3972,11 @@ class VariantImporterBase:
     def _purge_variant_set(self, variant_set):
         variant_set.__class__.objects.filter(pk=variant_set.id).update(state="deleting")
         for table_name, variant_set_attr in self.table_names:
-            table = get_meta().tables[table_name]
-            get_engine().execute(
-                table.delete().where(
-                    and_(
-                        getattr(table.c, variant_set_attr) == variant_set.id,
-                        table.c.case_id == variant_set.case.id,
-                    )
-                )
+            purge_rows(
+                get_engine(),
+                get_meta().tables[table_name],
+                {variant_set_attr: variant_set.id, "case_id": variant_set.case.id},
+                logger=self.import_job.add_log_entry,
             )
         variant_set.__class__.objects.filter(pk=variant_set.id).delete()
 
@@ -3574,57 +4022,24 @@ class VariantImporterBase:
             "Finished purging old variants in %.2f s" % elapsed.total_seconds()
         )
 
-    def _import_table(self, variant_set, token, path_attr, model_class):
+    def _import_table(self, variant_set, token, path_attr, model_class, computed=None):
         before = timezone.now()
-        self.import_job.add_log_entry("Creating temporary %s file..." % token)
-        with tempfile.NamedTemporaryFile("w+t") as tempf:
-            for i, path_genotypes in enumerate(getattr(self.import_job, path_attr)):
-                with open_file(path_genotypes, "rt") as inputf:
-                    header = inputf.readline().strip()
-                    header_arr = header.split("\t")
-                    try:
-                        case_idx = header_arr.index("case_id")
-                        set_idx = header_arr.index("set_id")
-                    except ValueError as e:
-                        raise RuntimeError(
-                            "Column 'case_id' or 'set_id' not found in %s TSV" % token
-                        ) from e
-                    # Extend header for fields in self.default_values and build suffix to append to every line.
-                    default_suffix = []
-                    for field, value in self.default_values.items():
-                        if field not in header_arr:
-                            header += "\t%s" % field
-                            default_suffix.append(str(value))
-                    if i == 0:
-                        tempf.write(header)
-                        tempf.write("\n")
-                    while True:
-                        line = inputf.readline().strip()
-                        if not line:
-                            break
-                        arr = line.split("\t")
-                        arr[case_idx] = str(variant_set.case.pk)
-                        arr[set_idx] = str(variant_set.pk)
-                        tempf.write("\t".join(arr + default_suffix))
-                        tempf.write("\n")
-            tempf.flush()
-            elapsed = timezone.now() - before
-            self.import_job.add_log_entry("Wrote file in %.2f s" % elapsed.total_seconds())
-
-            before = timezone.now()
-            self.import_job.add_log_entry("Importing %s file..." % token)
-            model_class.objects.from_csv(
-                tempf.name,
-                delimiter="\t",
-                null=".",
-                ignore_conflicts=True,
-                drop_constraints=False,
-                drop_indexes=False,
-            )
-            elapsed = timezone.now() - before
-            self.import_job.add_log_entry(
-                "Finished importing %s in %.2f s" % (token, elapsed.total_seconds())
-            )
+        self.import_job.add_log_entry("Importing %s file..." % token)
+        copy_tsv_files(
+            model_class,
+            getattr(self.import_job, path_attr),
+            token,
+            replace={"case_id": str(variant_set.case.pk), "set_id": str(variant_set.pk)},
+            default_values=self.default_values,
+            computed=computed,
+            delimiter="\t",
+            null=".",
+            ignore_conflicts=True,
+        )
+        elapsed = timezone.now() - before
+        self.import_job.add_log_entry(
+            "Finished importing %s in %.2f s" % (token, elapsed.total_seconds())
+        )
 
     def _import_annotation_release_info(self, variant_set):
         before = timezone.now()
@@ -3666,10 +4081,44 @@ class VariantImporter(VariantImporterBase):
     def _perform_import(self, variant_set):
         self._import_annotation_release_info(variant_set)
         self._import_alignment_stats(variant_set)
-        self._import_table(variant_set, "genotypes", "path_genotypes", SmallVariant)
+        self._import_table(
+            variant_set,
+            "genotypes",
+            "path_genotypes",
+            SmallVariant,
+            computed=self._genotype_columns(variant_set),
+        )
+
+    def _genotype_columns(self, variant_set):
+        """Store the samples of the genotype columns with ``variant_set`` and return the column expressions."""
+        # This must be imported here to circumvent cyclic dependencies
+        from .genotype_columns import genotype_column_expressions, get_genotype_samples  # noqa
+
+        samples = get_genotype_samples(self._yield_pedigree())
+        if samples is None:
+            return None
+        variant_set.genotype_samples = samples
+        variant_set.save(update_fields=["genotype_samples"])
+        return genotype_column_expressions(samples)
 
     def _post_import(self, variant_set):
         self._rebuild_small_variants_stats(variant_set)
+        self._update_project_variants_stats(variant_set)
+        self._add_variant_set_counts(variant_set)
+
+    def _purge_variant_set(self, variant_set):
+        # This must be imported here to circumvent cyclic dependencies
+        from .variant_set_counts import remove_variant_set_counts  # noqa
+
+        remove_variant_set_counts(get_engine(), variant_set)
+        super()._purge_variant_set(variant_set)
+
+    def _add_variant_set_counts(self, variant_set):
+        """Add the variants of the imported case to the in-house and beacon allele counts."""
+        # This must be imported here to circumvent cyclic dependencies
+        from .variant_set_counts import add_variant_set_counts  # noqa
+
+        add_variant_set_counts(get_engine(), variant_set, logger=self.import_job.add_log_entry)
 
     def _rebuild_small_variants_stats(self, variant_set):
         """Rebuild small variant statistics."""
@@ -3684,6 +4133,27 @@ class VariantImporter(VariantImporterBase):
             "Finished computing variant statistics in %.2f s" % elapsed.total_seconds()
         )
 
+    def _update_project_variants_stats(self, variant_set):
+        """Add the samples of the imported case to the project-wide statistics, if these exist."""
+        # This must be imported here to circumvent cyclic dependencies
+        from .variant_stats import update_project_variant_stats  # noqa
+
+        project = variant_set.case.project
+        if not ProjectVariantStats.objects.filter(project=project).exists():
+            return
+        before = timezone.now()
+        self.import_job.add_log_entry("Updating project-wide variant statistics...")
+        update_project_variant_stats(
+            get_engine(),
+            project,
+            self.import_job.bg_job.user,
+            logger=self.import_job.add_log_entry,
+        )
+        elapsed = timezone.now() - before
+        self.import_job.add_log_entry(
+            "Finished updating project-wide variant statistics in %.2f s" % elapsed.total_seconds()
+        )
+
     def _import_alignment_stats(self, variant_set):
         before = timezone.now()
         self.import_job.add_log_entry("Importing alignment statistics...")
@@ -3835,15 +4305,21 @@ class DeleteCase:
 
     def run(self):
         from variants.queries import DeleteSmallVariantsQuery, DeleteStructuralVariantsQuery  # noqa
+        from variants.variant_set_counts import remove_case_counts  # noqa
 
         case = self.job.case
         try:
             self.job.add_log_entry(
                 "Deleting small and structural variants of case %s" % case.name, LOG_LEVEL_INFO
             )
+            remove_case_counts(get_engine(), case)
             for query in itertools.chain(
-                DeleteSmallVariantsQuery(get_engine()).run(case_id=case.id),
-                DeleteStructuralVariantsQuery(get_engine()).run(case_id=case.id),
+                DeleteSmallVariantsQuery(get_engine()).run(
+                    case_id=case.id, logger=self.job.add_log_entry
+                ),
+                DeleteStructuralVariantsQuery(get_engine()).run(
+                    case_id=case.id, logger=self.job.add_log_entry
+                ),
             ):
                 with contextlib.closing(query):
                     pass
@@ -3885,6 +4361,9 @@ def clear_old_kiosk_cases():
     if not settings.KIOSK_MODE:
         return
 
+    # This must be imported here to circumvent cyclic dependencies
+    from .variant_set_counts import remove_case_counts  # noqa
+
     # Find the correct category
     cat = Project.objects.get(type="CATEGORY", title=settings.KIOSK_CAT)
     # Define allowed period (~2 months)
@@ -3897,13 +4376,10 @@ def clear_old_kiosk_cases():
     # Delete cases and associated variants
     for case in cases:
         projects.append(case.project)
+        # Subtract the allele and in-house counts while the variants are still there.
+        remove_case_counts(get_engine(), case)
         # Delete all small variants.
-        with contextlib.closing(
-            get_engine().execute(
-                delete(SmallVariant.sa.table).where(SmallVariant.sa.case_id == case.id)
-            )
-        ):
-            pass
+        purge_rows(get_engine(), SmallVariant.sa.table, {"case_id": case.id})
         # Delete case
         case.delete()
     # Delete projects as every case has its own project and is not required anymore
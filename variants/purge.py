@@ -0,0 +1,111 @@
+"""Purging the rows of variant sets and cases from the large variant tables.
+
+Deleting all variants of a large case with one ``DELETE`` statement creates a long-running transaction that
+holds its locks until the end and writes a burst of WAL, stalling concurrent queries.  Instead, the rows are
+deleted in batches of ``VARFISH_PURGE_BATCH_SIZE`` primary keys with a pause of ``VARFISH_PURGE_BATCH_PAUSE``
+seconds between batches.
+
+This only helps when called outside of ``transaction.atomic()`` where each batch is committed on its own.
+Within a transaction (e.g., in ``pre_delete`` handlers that Django calls within the atomic block of the
+delete), all batches hold their locks until the end of the transaction.  No pause is made there as it would
+only prolong the time that the locks are held.
+
+If ``VARFISH_PURGE_TRUNCATE_PARTITIONS`` is set, partitions of partitioned tables that contain only rows to
+purge are truncated as a whole.  The hash partitions of the variant tables cannot be dropped as rows with the
+same hash value could not be inserted afterwards.
+"""
+
+import contextlib
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from sqlalchemy import and_, column, exists, func, literal_column, not_, select, table, text
+
+
+def _is_partitioned(engine, table_):
+    return bool(
+        engine.scalar(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:name)"),
+            name=table_.name,
+        )
+    )
+
+
+def _iter_truncate_partitions(engine, table_, filters, logger):
+    """Truncate the partitions of ``table_`` that only contain rows matching ``filters``."""
+    condition = and_(*[table_.c[key] == value for key, value in filters.items()])
+    partition_name = literal_column("tableoid::regclass::text")
+    seen = []
+    while True:
+        stmt = select([partition_name]).select_from(table_).where(condition)
+        if seen:
+            stmt = stmt.where(partition_name.notin_(seen))
+        partition = engine.scalar(stmt.limit(1))
+        if partition is None:
+            return
+        seen.append(partition)
+        partition_table = table(partition, *[column(key) for key in filters])
+        partition_condition = and_(
+            *[partition_table.c[key] == value for key, value in filters.items()]
+        )
+        with transaction.atomic():
+            engine.execute(text("LOCK TABLE %s IN ACCESS EXCLUSIVE MODE" % partition))
+            if engine.scalar(select([exists().where(not_(partition_condition))])):
+                continue  # partition contains other rows
+            logger("... truncating partition %s" % partition)
+            yield engine.execute(text("TRUNCATE TABLE %s" % partition))
+
+
+def iter_purge(
+    engine, table_, filters, batch_size=None, pause=None, truncate_partitions=None, logger=None
+):
+    """Delete the rows of the SQLAlchemy ``table_`` whose columns have the values in the ``dict`` ``filters``.
+
+    The rows are deleted in batches of ``batch_size`` primary keys, yielding the result of each statement.
+    The settings are used for the arguments that are ``None``, except that ``pause`` defaults to ``0`` within
+    ``transaction.atomic()``.
+    """
+    if batch_size is None:
+        batch_size = settings.VARFISH_PURGE_BATCH_SIZE
+    if pause is None:
+        pause = 0 if connection.in_atomic_block else settings.VARFISH_PURGE_BATCH_PAUSE
+    if truncate_partitions is None:
+        truncate_partitions = settings.VARFISH_PURGE_TRUNCATE_PARTITIONS
+    logger = logger or (lambda _: None)
+
+    if truncate_partitions and _is_partitioned(engine, table_):
+        yield from _iter_truncate_partitions(engine, table_, filters, logger)
+
+    condition = and_(*[table_.c[key] == value for key, value in filters.items()])
+    if "id" not in table_.c:
+        yield engine.execute(table_.delete().where(condition))
+        return
+    min_id, max_id = engine.execute(
+        select([func.min(table_.c.id), func.max(table_.c.id)]).where(condition)
+    ).first()
+    if min_id is None:
+        return
+    deleted = 0
+    next_report = 0.1
+    for start in range(min_id, max_id + 1, batch_size):
+        result = engine.execute(
+            table_.delete().where(
+                and_(condition, table_.c.id >= start, table_.c.id < start + batch_size)
+            )
+        )
+        deleted += max(result.rowcount, 0)
+        yield result
+        done = (min(start + batch_size, max_id + 1) - min_id) / (max_id + 1 - min_id)
+        if done >= next_report:
+            logger("... deleted %d rows from %s (%d%%)" % (deleted, table_.name, 100 * done))
+            next_report = done + 0.1
+        if pause and start + batch_size <= max_id:
+            time.sleep(pause)
+
+
+def purge_rows(engine, table_, filters, **kwargs):
+    """Delete the rows of ``table_`` matching ``filters`` with ``iter_purge()``."""
+    for result in iter_purge(engine, table_, filters, **kwargs):
+        with contextlib.closing(result):
+            pass
@@ -1,14 +1,22 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import heapq
 from itertools import chain
+import queue
+import sys
+import threading
 import typing
 
 import attr
+import binning
 
 from sqlalchemy.dialects.postgresql.array import OVERLAP
 from sqlalchemy.sql.functions import GenericFunction, ReturnTypeFromArgs
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-from sqlalchemy import Table, true, column, union, literal_column, delete, tuple_
+from django.db import connections
+from sqlalchemy import Table, true, column, union, literal_column, tuple_, values
 from sqlalchemy.sql import select, func, and_, not_, or_, cast
 from sqlalchemy.types import ARRAY, VARCHAR, Integer, Float
 import sqlparse
@@ -31,11 +39,17 @@ from geneinfo.models import (
     EnsemblToGeneSymbol,
     GeneIdInHpo,
 )
+from genomicfeatures.models import GeneInterval
 from hgmd.models import HgmdPublicLocus
-from svs.models import StructuralVariant, StructuralVariantGeneAnnotation
+from svs.models import (
+    StructuralVariant,
+    StructuralVariantGeneAnnotation,
+    StructuralVariantPublicDatabaseCounts,
+)
 from variants.models import (
     Case,
     SmallVariant,
+    SmallVariantAnnotationSummary,
     SmallVariantSummary,
     SmallVariantFlags,
     SmallVariantComment,
@@ -43,7 +57,9 @@ from variants.models import (
     SmallVariantSet,
 )
 from variants.forms import FILTER_FORM_TRANSLATE_INHERITANCE
-from variants.helpers import get_meta
+from variants.genotype_columns import GENOTYPE_CODES
+from variants.helpers import get_meta, stream_connection
+from variants.purge import iter_purge
 
 
 class _ArrayCatAgg(ReturnTypeFromArgs):
@@ -515,6 +531,52 @@ class ExtendQueryPartsGenotypeBase(ExtendQueryPartsBase):
             raise RuntimeError("Could not find index line from pedigree")
         return index_lines[0]["patient"], index_lines[0]["father"], index_lines[0]["mother"]
 
+    def _get_genotype_indices(self):
+        """Return ``dict`` mapping the sample names to their indices in the typed genotype columns.
+
+        Return ``None`` if the ``genotype`` JSONB column is to be queried instead as the typed columns are
+        disabled or not filled for the active variant set.
+        """
+        if not hasattr(self, "_genotype_indices"):
+            self._genotype_indices = None
+            if self.model is SmallVariant and settings.VARFISH_GENOTYPE_COLUMNS:
+                set_ = (
+                    SmallVariantSet.objects.filter(case=self.case, state="active")
+                    .order_by("-date_created")
+                    .first()
+                )
+                if set_ and set_.genotype_samples is not None:
+                    # PostgreSQL arrays are 1-based.
+                    self._genotype_indices = {
+                        sample: i + 1 for i, sample in enumerate(set_.genotype_samples)
+                    }
+        return self._genotype_indices
+
+    def _get_genotype_index(self, name):
+        return (self._get_genotype_indices() or {}).get(name)
+
+    def _genotype_missing(self, name):
+        """Return term checking for missing genotype of sample ``name``."""
+        idx = self._get_genotype_index(name)
+        if idx is None:
+            return self.model.sa.genotype[name].is_(None)
+        return self.model.sa.genotype_gt[idx].is_(None)
+
+    def _genotype_in(self, name, gt_list):
+        """Return term checking the genotype of sample ``name`` to be in ``gt_list``."""
+        idx = self._get_genotype_index(name)
+        if idx is None:
+            return self.model.sa.genotype[name]["gt"].astext.in_(gt_list)
+        return self.model.sa.genotype_gt[idx].in_([GENOTYPE_CODES[gt] for gt in gt_list])
+
+    def _genotype_value(self, name, key, type_=Integer):
+        """Return the integer value of ``key`` in the genotype of sample ``name`` cast to ``type_``."""
+        idx = self._get_genotype_index(name)
+        if idx is None:
+            return self.model.sa.genotype[name][key].astext.cast(type_)
+        value = getattr(self.model.sa, "genotype_%s" % key)[idx]
+        return value if type_ is Integer else cast(value, type_)
+
     def _build_quality_term(self, name):
         if self._get_quality_term_disabled():
             return True
@@ -522,82 +584,50 @@ class ExtendQueryPartsGenotypeBase(ExtendQueryPartsBase):
         ad_max = self.kwargs["%s_ad_max" % name]
         rhs = and_(
             # Genotype quality is simple.
-            self.model.sa.genotype[name]["gq"].astext.cast(Integer) >= self.kwargs["%s_gq" % name],
+            self._genotype_value(name, "gq") >= self.kwargs["%s_gq" % name],
             # The depth setting depends on whether the variant is in homozygous or heterozygous state.
             or_(  # heterozygous or hemizygous state
                 not_(
-                    or_(
-                        self.model.sa.genotype[name]["gt"].astext == "0/1",
-                        self.model.sa.genotype[name]["gt"].astext == "0|1",
-                        self.model.sa.genotype[name]["gt"].astext == "1/0",
-                        self.model.sa.genotype[name]["gt"].astext == "1|0",
-                        self.model.sa.genotype[name]["gt"].astext == "1",
-                        # TODO: recognize hemizygous from 'sex="M" and chr="X" and gt="1/1"'?
-                    )
+                    # TODO: recognize hemizygous from 'sex="M" and chr="X" and gt="1/1"'?
+                    self._genotype_in(name, ("0/1", "0|1", "1/0", "1|0", "1"))
                 ),
-                self.model.sa.genotype[name]["dp"].astext.cast(Integer)
-                >= self.kwargs["%s_dp_het" % name],
+                self._genotype_value(name, "dp") >= self.kwargs["%s_dp_het" % name],
             ),
             or_(  # homozygous state
-                not_(
-                    or_(
-                        self.model.sa.genotype[name]["gt"].astext == "0/0",
-                        self.model.sa.genotype[name]["gt"].astext == "0|0",
-                        self.model.sa.genotype[name]["gt"].astext == "1/1",
-                        self.model.sa.genotype[name]["gt"].astext == "1|1",
-                        self.model.sa.genotype[name]["gt"].astext == "0",
-                        self.model.sa.genotype[name]["gt"].astext == "1",
-                    )
-                ),
-                self.model.sa.genotype[name]["dp"].astext.cast(Integer)
-                >= self.kwargs["%s_dp_hom" % name],
+                not_(self._genotype_in(name, ("0/0", "0|0", "1/1", "1|1", "0", "1"))),
+                self._genotype_value(name, "dp") >= self.kwargs["%s_dp_hom" % name],
             ),
             # Allelic depth is checked in case of het or hom.
             or_(
-                self.model.sa.genotype[name]["gt"].astext == "0/0",
-                self.model.sa.genotype[name]["gt"].astext == "0|0",
-                self.model.sa.genotype[name]["gt"].astext == "0",
-                and_(
-                    self.model.sa.genotype[name]["ad"].astext.cast(Integer)
-                    >= self.kwargs["%s_ad" % name]
-                ),
+                self._genotype_in(name, ("0/0", "0|0", "0")),
+                self._genotype_value(name, "ad") >= self.kwargs["%s_ad" % name],
             ),
-            self.model.sa.genotype[name]["ad"].astext.cast(Integer) <= ad_max if ad_max else True,
+            self._genotype_value(name, "ad") <= ad_max if ad_max else True,
             # Allelic balance is somewhat complicated
             and_(
-                self.model.sa.genotype[name]["dp"].astext.cast(Integer) > 0,
+                self._genotype_value(name, "dp") > 0,
                 or_(
-                    not_(
-                        or_(
-                            self.model.sa.genotype[name]["gt"].astext == "0/1",
-                            self.model.sa.genotype[name]["gt"].astext == "0|1",
-                            self.model.sa.genotype[name]["gt"].astext == "1/0",
-                            self.model.sa.genotype[name]["gt"].astext == "1|0",
-                        )
-                    ),
+                    not_(self._genotype_in(name, ("0/1", "0|1", "1/0", "1|0"))),
                     and_(
                         (
-                            self.model.sa.genotype[name]["ad"].astext.cast(Float)
-                            / self.model.sa.genotype[name]["dp"].astext.cast(Float)
+                            self._genotype_value(name, "ad", Float)
+                            / self._genotype_value(name, "dp", Float)
                         )
                         >= self.kwargs["%s_ab" % name],
                         (
-                            self.model.sa.genotype[name]["ad"].astext.cast(Float)
-                            / self.model.sa.genotype[name]["dp"].astext.cast(Float)
+                            self._genotype_value(name, "ad", Float)
+                            / self._genotype_value(name, "dp", Float)
                         )
                         <= (1.0 - self.kwargs["%s_ab" % name]),
                     ),
                 ),
             ),
         )
-        return or_(self.model.sa.genotype[name].is_(None), rhs)
+        return or_(self._genotype_missing(name), rhs)
 
     def _build_genotype_term(self, name, gt_list):
         if gt_list:
-            return or_(
-                self.model.sa.genotype[name].is_(None),
-                self.model.sa.genotype[name]["gt"].astext.in_(gt_list),
-            )
+            return or_(self._genotype_missing(name), self._genotype_in(name, gt_list))
         else:
             return True
 
@@ -856,62 +886,33 @@ class ExtendQueryPartsFrequenciesFilter(ExtendQueryPartsMitochondrialFrequencies
 class ExtendQueryPartsInHouseJoin(ExtendQueryPartsBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.subquery = (
-            select(
-                [
-                    func.coalesce(func.sum(SmallVariantSummary.sa.count_hom_ref), 0).label(
-                        "inhouse_hom_ref"
-                    ),
-                    func.coalesce(func.sum(SmallVariantSummary.sa.count_het), 0).label(
-                        "inhouse_het"
-                    ),
-                    func.coalesce(func.sum(SmallVariantSummary.sa.count_hom_alt), 0).label(
-                        "inhouse_hom_alt"
-                    ),
-                    func.coalesce(func.sum(SmallVariantSummary.sa.count_hemi_ref), 0).label(
-                        "inhouse_hemi_ref"
-                    ),
-                    func.coalesce(func.sum(SmallVariantSummary.sa.count_hemi_alt), 0).label(
-                        "inhouse_hemi_alt"
-                    ),
-                    func.sum(
-                        func.coalesce(SmallVariantSummary.sa.count_het, 0)
-                        + func.coalesce(SmallVariantSummary.sa.count_hom_alt, 0)
-                        + func.coalesce(SmallVariantSummary.sa.count_hemi_alt, 0)
-                    ).label("inhouse_carriers"),
-                ]
-            )
-            .select_from(SmallVariantSummary.sa)
-            .where(same_variant(SmallVariantSummary, SmallVariant))
-            .group_by(
-                SmallVariantSummary.sa.release,
-                SmallVariantSummary.sa.chromosome,
-                SmallVariantSummary.sa.start,
-                SmallVariantSummary.sa.end,
-                SmallVariantSummary.sa.reference,
-                SmallVariantSummary.sa.alternative,
-            )
-            .lateral("inhouse_subquery")
-        )
+        #: The in-house counts, the summary has at most one row per variant.
+        self.counts = {
+            "inhouse_hom_ref": func.coalesce(SmallVariantSummary.sa.count_hom_ref, 0),
+            "inhouse_het": func.coalesce(SmallVariantSummary.sa.count_het, 0),
+            "inhouse_hom_alt": func.coalesce(SmallVariantSummary.sa.count_hom_alt, 0),
+            "inhouse_hemi_ref": func.coalesce(SmallVariantSummary.sa.count_hemi_ref, 0),
+            "inhouse_hemi_alt": func.coalesce(SmallVariantSummary.sa.count_hemi_alt, 0),
+            "inhouse_carriers": (
+                func.coalesce(SmallVariantSummary.sa.count_het, 0)
+                + func.coalesce(SmallVariantSummary.sa.count_hom_alt, 0)
+                + func.coalesce(SmallVariantSummary.sa.count_hemi_alt, 0)
+            ),
+        }
 
     def extend_fields(self, _query_parts):
         if settings.KIOSK_MODE:
             return []
 
-        return [
-            func.coalesce(self.subquery.c.inhouse_hom_ref, 0).label("inhouse_hom_ref"),
-            func.coalesce(self.subquery.c.inhouse_het, 0).label("inhouse_het"),
-            func.coalesce(self.subquery.c.inhouse_hom_alt, 0).label("inhouse_hom_alt"),
-            func.coalesce(self.subquery.c.inhouse_hemi_ref, 0).label("inhouse_hemi_ref"),
-            func.coalesce(self.subquery.c.inhouse_hemi_alt, 0).label("inhouse_hemi_alt"),
-            func.coalesce(self.subquery.c.inhouse_carriers, 0).label("inhouse_carriers"),
-        ]
+        return [value.label(name) for name, value in self.counts.items()]
 
     def extend_selectable(self, query_parts):
         if settings.KIOSK_MODE:
             return query_parts.selectable
 
-        return query_parts.selectable.outerjoin(self.subquery, true())
+        return query_parts.selectable.outerjoin(
+            SmallVariantSummary.sa, same_variant(SmallVariantSummary, SmallVariant)
+        )
 
 
 class ExtendQueryPartsInHouseJoinAndFilter(ExtendQueryPartsInHouseJoin):
@@ -923,26 +924,18 @@ class ExtendQueryPartsInHouseJoinAndFilter(ExtendQueryPartsInHouseJoin):
         terms = []
         if self.kwargs.get("inhouse_enabled"):
             if self.kwargs.get("inhouse_heterozygous") is not None:
-                terms.append(
-                    func.coalesce(self.subquery.c.inhouse_het, 0)
-                    <= self.kwargs.get("inhouse_heterozygous")
-                )
+                terms.append(self.counts["inhouse_het"] <= self.kwargs.get("inhouse_heterozygous"))
             if self.kwargs.get("inhouse_homozygous") is not None:
                 terms.append(
-                    func.coalesce(self.subquery.c.inhouse_hom_alt, 0)
-                    + func.coalesce(self.subquery.c.inhouse_hemi_alt, 0)
+                    self.counts["inhouse_hom_alt"] + self.counts["inhouse_hemi_alt"]
                     <= self.kwargs.get("inhouse_homozygous")
                 )
             if self.kwargs.get("inhouse_hemizygous") is not None:
                 terms.append(
-                    func.coalesce(self.subquery.c.inhouse_hemi_alt, 0)
-                    <= self.kwargs.get("inhouse_hemizygous")
+                    self.counts["inhouse_hemi_alt"] <= self.kwargs.get("inhouse_hemizygous")
                 )
             if self.kwargs.get("inhouse_carriers") is not None:
-                terms.append(
-                    func.coalesce(self.subquery.c.inhouse_carriers, 0)
-                    <= self.kwargs.get("inhouse_carriers")
-                )
+                terms.append(self.counts["inhouse_carriers"] <= self.kwargs.get("inhouse_carriers"))
         return terms
 
 
@@ -1062,37 +1055,6 @@ class ExtendQueryPartsProjectLoadPrefetched(ExtendQueryPartsLoadPrefetchedBase):
         return "projectcasessmallvariant"
 
 
-class ExtendQueryPartsCommentsJoin(ExtendQueryPartsBase):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.subquery = (
-            select([func.count(SmallVariantComment.sa.id).label("comment_count")])
-            .select_from(SmallVariantComment.sa)
-            .where(
-                and_(
-                    same_variant(SmallVariant, SmallVariantComment),
-                    SmallVariantComment.sa.case_id == SmallVariant.sa.case_id,
-                )
-            )
-            .group_by(
-                SmallVariantComment.sa.case_id,
-                SmallVariantComment.sa.release,
-                SmallVariantComment.sa.chromosome,
-                SmallVariantComment.sa.start,
-                SmallVariantComment.sa.end,
-                SmallVariantComment.sa.reference,
-                SmallVariantComment.sa.alternative,
-            )
-            .lateral("comments_subquery")
-        )
-
-    def extend_fields(self, _query_parts):
-        return [self.subquery.c.comment_count]
-
-    def extend_selectable(self, query_parts):
-        return query_parts.selectable.outerjoin(self.subquery, true())
-
-
 class ExtendQueryPartsCommentsExtraAnnoJoin(ExtendQueryPartsBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1127,78 +1089,48 @@ class ExtendQueryPartsCommentsExtraAnnoJoin(ExtendQueryPartsBase):
         return query_parts.selectable.outerjoin(self.subquery, true())
 
 
-class ExtendQueryPartsFlagsJoin(ExtendQueryPartsBase):
+class ExtendQueryPartsUserAnnotationsJoin(ExtendQueryPartsBase):
+    """Join the merged comments, flags and ACMG ratings of the variants from ``SmallVariantAnnotationSummary``.
+
+    As without summary, the counts are ``None`` instead of zero and the flags and ACMG classes are ``None`` if
+    the variant has no such annotation.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.subquery = (
-            select(
-                [
-                    func.count(SmallVariantFlags.sa.id).label("flag_count"),
-                    func.bool_or(SmallVariantFlags.sa.flag_bookmarked).label("flag_bookmarked"),
-                    func.bool_or(SmallVariantFlags.sa.flag_candidate).label("flag_candidate"),
-                    func.bool_or(SmallVariantFlags.sa.flag_segregates).label("flag_segregates"),
-                    func.bool_or(SmallVariantFlags.sa.flag_doesnt_segregate).label(
-                        "flag_doesnt_segregate"
-                    ),
-                    func.bool_or(SmallVariantFlags.sa.flag_final_causative).label(
-                        "flag_final_causative"
-                    ),
-                    func.bool_or(SmallVariantFlags.sa.flag_for_validation).label(
-                        "flag_for_validation"
-                    ),
-                    func.bool_or(SmallVariantFlags.sa.flag_no_disease_association).label(
-                        "flag_no_disease_association"
-                    ),
-                    func.max(SmallVariantFlags.sa.flag_visual).label("flag_visual"),
-                    func.max(SmallVariantFlags.sa.flag_molecular).label("flag_molecular"),
-                    func.max(SmallVariantFlags.sa.flag_validation).label("flag_validation"),
-                    func.max(SmallVariantFlags.sa.flag_phenotype_match).label(
-                        "flag_phenotype_match"
-                    ),
-                    func.max(SmallVariantFlags.sa.flag_summary).label("flag_summary"),
-                ]
-            )
-            .select_from(SmallVariantFlags.sa)
-            .where(
-                and_(
-                    same_variant(SmallVariant, SmallVariantFlags),
-                    SmallVariantFlags.sa.case_id == SmallVariant.sa.case_id,
-                )
-            )
-            .group_by(
-                SmallVariantFlags.sa.case_id,
-                SmallVariantFlags.sa.release,
-                SmallVariantFlags.sa.chromosome,
-                SmallVariantFlags.sa.start,
-                SmallVariantFlags.sa.end,
-                SmallVariantFlags.sa.reference,
-                SmallVariantFlags.sa.alternative,
-            )
-            .lateral("flags_subquery")
-        )
+        self.summary = SmallVariantAnnotationSummary.sa
 
     def extend_fields(self, _query_parts):
         return [
-            self.subquery.c.flag_count,
-            self.subquery.c.flag_bookmarked,
-            self.subquery.c.flag_candidate,
-            self.subquery.c.flag_segregates,
-            self.subquery.c.flag_doesnt_segregate,
-            self.subquery.c.flag_final_causative,
-            self.subquery.c.flag_for_validation,
-            self.subquery.c.flag_no_disease_association,
-            self.subquery.c.flag_molecular,
-            self.subquery.c.flag_visual,
-            self.subquery.c.flag_validation,
-            self.subquery.c.flag_phenotype_match,
-            self.subquery.c.flag_summary,
+            func.nullif(self.summary.comment_count, 0).label("comment_count"),
+            func.nullif(self.summary.flag_count, 0).label("flag_count"),
+            self.summary.flag_bookmarked,
+            self.summary.flag_candidate,
+            self.summary.flag_segregates,
+            self.summary.flag_doesnt_segregate,
+            self.summary.flag_final_causative,
+            self.summary.flag_for_validation,
+            self.summary.flag_no_disease_association,
+            self.summary.flag_molecular,
+            self.summary.flag_visual,
+            self.summary.flag_validation,
+            self.summary.flag_phenotype_match,
+            self.summary.flag_summary,
+            self.summary.acmg_class_auto,
+            self.summary.acmg_class_override,
         ]
 
     def extend_selectable(self, query_parts):
-        return query_parts.selectable.outerjoin(self.subquery, true())
+        return query_parts.selectable.outerjoin(
+            self.summary.table,
+            and_(
+                self.summary.case_id == SmallVariant.sa.case_id,
+                same_variant(SmallVariant, SmallVariantAnnotationSummary),
+            ),
+        )
 
 
-class ExtendQueryPartsFlagsJoinAndFilter(ExtendQueryPartsFlagsJoin):
+class ExtendQueryPartsUserAnnotationsJoinAndFilter(ExtendQueryPartsUserAnnotationsJoin):
     def extend_conditions(self, _query_parts):
         """Build WHERE clause for the query based on the ``SmallVariantFlags`` and ``SmallVariantComment``."""
         terms = []
@@ -1207,9 +1139,9 @@ class ExtendQueryPartsFlagsJoinAndFilter(ExtendQueryPartsFlagsJoin):
         for flag in flag_names:
             flag_name = "flag_%s" % flag
             if self.kwargs.get(flag_name):
-                terms.append(column(flag_name))
+                terms.append(getattr(self.summary, flag_name))
         if self.kwargs.get("flag_simple_empty"):
-            terms.append(and_(not_(column("flag_%s" % flag))))
+            terms.append(and_(not_(getattr(self.summary, "flag_%s" % flag))))
         # Add terms for the valued flags.
         flag_names = ("visual", "validation", "molecular", "phenotype_match", "summary")
         for flag in flag_names:
@@ -1217,48 +1149,12 @@ class ExtendQueryPartsFlagsJoinAndFilter(ExtendQueryPartsFlagsJoin):
             for value in ("positive", "uncertain", "negative", "empty"):
                 field_name = "%s_%s" % (flag_name, value)
                 if self.kwargs.get(field_name):
-                    terms.append(column(flag_name) == value)
+                    terms.append(getattr(self.summary, flag_name) == value)
                     if value == "empty":
-                        terms.append(column(flag_name).is_(None))
+                        terms.append(getattr(self.summary, flag_name).is_(None))
         return [or_(*terms)]
 
 
-class ExtendQueryPartsAcmgCriteriaJoin(ExtendQueryPartsBase):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.subquery = (
-            select(
-                [
-                    func.max(AcmgCriteriaRating.sa.class_auto).label("acmg_class_auto"),
-                    func.max(AcmgCriteriaRating.sa.class_override).label("acmg_class_override"),
-                ]
-            )
-            .select_from(AcmgCriteriaRating.sa)
-            .where(
-                and_(
-                    same_variant(SmallVariant, AcmgCriteriaRating),
-                    AcmgCriteriaRating.sa.case_id == SmallVariant.sa.case_id,
-                )
-            )
-            .group_by(
-                AcmgCriteriaRating.sa.case_id,
-                AcmgCriteriaRating.sa.release,
-                AcmgCriteriaRating.sa.chromosome,
-                AcmgCriteriaRating.sa.start,
-                AcmgCriteriaRating.sa.end,
-                AcmgCriteriaRating.sa.reference,
-                AcmgCriteriaRating.sa.alternative,
-            )
-            .lateral("acmg_criteria_subquery")
-        )
-
-    def extend_fields(self, _query_parts):
-        return [self.subquery.c.acmg_class_auto, self.subquery.c.acmg_class_override]
-
-    def extend_selectable(self, query_parts):
-        return query_parts.selectable.outerjoin(self.subquery, true())
-
-
 class ExtendQueryPartsModesOfInheritanceJoin(ExtendQueryPartsBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1377,10 +1273,8 @@ extender_classes_base = [
     ExtendQueryPartsClinvarJoinAndFilter,
     ExtendQueryPartsHgmdJoinAndFilter,
     ExtendQueryPartsGenotypeGtQualityDefaultFilter,
-    ExtendQueryPartsFlagsJoinAndFilter,
-    ExtendQueryPartsCommentsJoin,
+    ExtendQueryPartsUserAnnotationsJoinAndFilter,
     ExtendQueryPartsCommentsExtraAnnoJoin,
-    ExtendQueryPartsAcmgCriteriaJoin,
 ]
 
 
@@ -1429,10 +1323,8 @@ class CaseLoadPrefetchedQueryPartsBuilder(QueryPartsBuilder):
         ExtendQueryPartsGeneSymbolJoin,
         ExtendQueryPartsAcmgJoin,
         ExtendQueryPartsMgiJoin,
-        ExtendQueryPartsFlagsJoinAndFilter,
-        ExtendQueryPartsCommentsJoin,
+        ExtendQueryPartsUserAnnotationsJoinAndFilter,
         ExtendQueryPartsCommentsExtraAnnoJoin,
-        ExtendQueryPartsAcmgCriteriaJoin,
         ExtendQueryPartsModesOfInheritanceJoin,
         ExtendQueryPartsDiseaseGeneJoin,
         ExtendQueryPartsGnomadConstraintsJoin,
@@ -1472,9 +1364,7 @@ class ProjectLoadPrefetchedQueryPartsBuilder(QueryPartsBuilder):
         ExtendQueryPartsGeneSymbolJoin,
         ExtendQueryPartsMgiJoin,
         ExtendQueryPartsAcmgJoin,
-        ExtendQueryPartsFlagsJoin,
-        ExtendQueryPartsCommentsJoin,
-        ExtendQueryPartsAcmgCriteriaJoin,
+        ExtendQueryPartsUserAnnotationsJoin,
         ExtendQueryPartsGnomadConstraintsJoin,
         ExtendQueryPartsExacConstraintsJoin,
         ExtendQueryPartsClinvarJoin,
@@ -1650,6 +1540,9 @@ class _ClosingWrapper(object):
     def __init__(self, wrapped):
         self.wrapped = wrapped
 
+    def __iter__(self):
+        return iter(self.wrapped)
+
     def fetchall(self):
         return self.wrapped
 
@@ -1657,6 +1550,125 @@ class _ClosingWrapper(object):
         pass
 
 
+#: Columns that the per-chunk ``UNION`` statements of ``CasePrefetchQuery`` are ordered by.
+PREFETCH_ORDER_BY = ("chromosome_no", "start", "end", "reference", "alternative", "family_name")
+
+
+def _prefetch_sort_key(row):
+    """Sort key for merging ordered result rows, ``NULL`` values sort last as in PostgreSQL."""
+    return tuple((row[name] is None, row[name]) for name in PREFETCH_ORDER_BY)
+
+
+class _MergingStreamResult:
+    """Merge the ordered results of one or more server-side cursors into one ordered stream.
+
+    All results are executed on the connection entered into ``stack`` (see ``stream_connection()``), which is
+    closed together with the results.
+    """
+
+    def __init__(self, stack, results):
+        #: The ``ExitStack`` holding the connection and transaction that the server-side cursors live in.
+        self.stack = stack
+        #: The results to merge, each one ordered by ``PREFETCH_ORDER_BY``.
+        self.results = results
+
+    def __iter__(self):
+        if len(self.results) == 1:
+            return iter(self.results[0])
+        else:
+            return heapq.merge(*self.results, key=_prefetch_sort_key)
+
+    def fetchall(self):
+        return list(self)
+
+    def close(self):
+        try:
+            for result in self.results:
+                result.close()
+        finally:
+            # Pass on an exception being handled (e.g., when closed by ``contextlib.closing()``) such that
+            # ``transaction.atomic()`` rolls back instead of committing.
+            self.stack.__exit__(*sys.exc_info())
+
+
+def _normalize_cache_key(value):
+    """Convert ``value`` (e.g., query kwargs) recursively into a hashable and canonical form."""
+    if isinstance(value, dict):
+        return tuple(
+            sorted(((key, _normalize_cache_key(val)) for key, val in value.items()), key=repr)
+        )
+    elif isinstance(value, (list, tuple)):
+        return tuple(map(_normalize_cache_key, value))
+    elif isinstance(value, (set, frozenset)):
+        return tuple(sorted(map(_normalize_cache_key, value), key=repr))
+    else:
+        try:
+            hash(value)
+        except TypeError:
+            return repr(value)
+        return value
+
+
+class StatementCache:
+    """Thread-safe LRU cache for statements built by the query parts builders.
+
+    Executing a cached statement object again lets SQLAlchemy take the compiled SQL (with its bound
+    parameters extracted) from the engine's compiled cache, so both statement construction and
+    compilation are skipped for repeated queries.  The size is taken from the setting
+    ``QUERY_STATEMENT_CACHE_SIZE``, ``0`` disables the cache.
+    """
+
+    def __init__(self):
+        #: Number of cache hits.
+        self.hits = 0
+        #: Number of cache misses.
+        self.misses = 0
+        #: Cached statements in LRU order.
+        self._entries = OrderedDict()
+        #: Lock for accessing the entries and counters.
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self):
+        return settings.QUERY_STATEMENT_CACHE_SIZE
+
+    def get_or_build(self, key, build):
+        """Return statement for ``key``, calling ``build()`` to construct it if not cached."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        stmt = build()
+        with self._lock:
+            self._entries[key] = stmt
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return stmt
+
+    def clear(self):
+        """Remove all entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """Return ``dict`` with cache statistics."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+
+#: The process-wide statement cache used by ``CasePrefetchQuery``.
+STATEMENT_CACHE = StatementCache()
+
+
 class CasePrefetchQuery:
     builder = QueryPartsBuilder
 
@@ -1668,48 +1680,139 @@ class CasePrefetchQuery:
         self.engine = engine
         self.query_id = query_id
 
-    def run(self, kwargs):
-        order_by = [
-            column("chromosome_no"),
-            column("start"),
-            column("end"),
-            column("reference"),
-            column("alternative"),
-            column("family_name"),
-        ]
-        result = []
+    def _build_stmts(self, kwargs):
+        """Build one ordered ``UNION`` statement for each chunk of ``QUERY_MAX_UNION`` cases.
+
+        Statements are taken from ``STATEMENT_CACHE`` if possible.  Besides the builder class and the
+        query kwargs, the key contains everything else that the builders read from the cases.
+        """
+        order_by = [column(name) for name in PREFETCH_ORDER_BY]
         chunks = _chunked(self.cases, settings.QUERY_MAX_UNION)
+        if not STATEMENT_CACHE.max_size:
+            return [self._build_chunk_stmt(chunk, kwargs, order_by) for chunk in chunks]
+
+        kwargs_key = _normalize_cache_key(kwargs)
+        active_sets = {
+            case_id: _normalize_cache_key(active_set)
+            for case_id, *active_set in SmallVariantSet.objects.filter(
+                case__in=self.cases, state="active"
+            )
+            .order_by("date_created")
+            .values_list("case_id", "id", "genotype_samples")
+        }
+        result = []
         for chunk in chunks:
-            stmts = []
-            for case in chunk:
-                comp_het_index = kwargs.get("compound_recessive_indices", {}).get(case.name)
-                recessive_index = kwargs.get("recessive_indices", {}).get(case.name)
-                if comp_het_index and self.query_id is None:
-                    # Set the current compound recessive index
-                    kwargs["compound_recessive_index"] = comp_het_index
-                    combiner = CompHetCombiner(case, self.builder)
-                elif recessive_index and self.query_id is None:
-                    # Set the current compound recessive index
-                    kwargs["compound_recessive_index"] = recessive_index
-                    combiner = RecessiveCombiner(case, self.builder)
-                else:  # compound recessive not in kwargs or disabled
-                    combiner = DefaultCombiner(case, self.builder, self.query_id)
-                stmts.append(combiner.to_stmt(kwargs))
-            stmt = union(*stmts).order_by(*order_by)
-            if settings.DEBUG:
-                print(
-                    "\n"
-                    + sqlparse.format(
-                        stmt.compile(self.engine).string, reindent=True, keyword_case="upper"
+            key = (
+                self.builder,
+                self.query_id,
+                kwargs_key,
+                tuple(
+                    (
+                        case.id,
+                        case.name,
+                        case.index,
+                        active_sets.get(case.id),
+                        _normalize_cache_key(case.pedigree),
                     )
+                    for case in chunk
+                ),
+            )
+            result.append(
+                STATEMENT_CACHE.get_or_build(
+                    key, lambda: self._build_chunk_stmt(chunk, kwargs, order_by)
                 )
-            query_res = self.engine.execute(stmt)
-            if len(chunks) == 1:
-                return query_res
-            else:
-                with contextlib.closing(query_res) as query_res:
-                    result += list(query_res)
-        return _ClosingWrapper(result)
+            )
+        return result
+
+    def _build_chunk_stmt(self, chunk, kwargs, order_by):
+        stmts = []
+        for case in chunk:
+            comp_het_index = kwargs.get("compound_recessive_indices", {}).get(case.name)
+            recessive_index = kwargs.get("recessive_indices", {}).get(case.name)
+            if comp_het_index and self.query_id is None:
+                # Set the current compound recessive index
+                kwargs["compound_recessive_index"] = comp_het_index
+                combiner = CompHetCombiner(case, self.builder)
+            elif recessive_index and self.query_id is None:
+                # Set the current compound recessive index
+                kwargs["compound_recessive_index"] = recessive_index
+                combiner = RecessiveCombiner(case, self.builder)
+            else:  # compound recessive not in kwargs or disabled
+                combiner = DefaultCombiner(case, self.builder, self.query_id)
+            stmts.append(combiner.to_stmt(kwargs))
+        stmt = union(*stmts).order_by(*order_by)
+        if settings.DEBUG:
+            print(
+                "\n"
+                + sqlparse.format(
+                    stmt.compile(self.engine).string, reindent=True, keyword_case="upper"
+                )
+            )
+        return stmt
+
+    def run(self, kwargs):
+        stmts = self._build_stmts(kwargs)
+        if len(stmts) == 1:
+            return self.engine.execute(stmts[0])
+        elif settings.QUERY_MAX_WORKERS > 1:
+            results = self._execute_parallel(stmts)
+        else:
+            results = []
+            for stmt in stmts:
+                with contextlib.closing(self.engine.execute(stmt)) as query_res:
+                    results.append(list(query_res))
+        return _ClosingWrapper(list(heapq.merge(*results, key=_prefetch_sort_key)))
+
+    def _execute_parallel(self, stmts):
+        """Execute ``stmts`` with at most ``QUERY_MAX_WORKERS`` threads and return the row lists.
+
+        Every worker thread uses its own database connection (Django connections are
+        thread-local) and takes statements from a shared queue until it is empty.
+        """
+        pending = queue.SimpleQueue()
+        for i, stmt in enumerate(stmts):
+            pending.put((i, stmt))
+        results = [None] * len(stmts)
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        i, stmt = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    with contextlib.closing(self.engine.execute(stmt)) as query_res:
+                        results[i] = list(query_res)
+            finally:
+                # Release the connection of this worker thread.
+                connections.close_all()
+
+        num_workers = min(settings.QUERY_MAX_WORKERS, len(stmts))
+        with ThreadPoolExecutor(max_workers=num_workers) as executor:
+            for future in [executor.submit(worker) for _ in range(num_workers)]:
+                future.result()
+        return results
+
+    def stream(self, kwargs, fetch_size=None):
+        """Execute the query with server-side cursors and return an iterable over the result rows.
+
+        Each chunk of ``QUERY_MAX_UNION`` cases is read through its own named cursor, fetching
+        ``fetch_size`` rows at a time (default: ``QUERY_STREAM_FETCH_SIZE``).  The chunks are
+        merged such that the rows are yielded ordered by ``PREFETCH_ORDER_BY``.  The cursors live
+        in a transaction (see ``stream_connection()``) that is ended when the result is closed, so
+        the result must be closed after use, e.g., with ``contextlib.closing()``.
+        """
+        stmts = self._build_stmts(kwargs)
+        stack = contextlib.ExitStack()
+        results = []
+        try:
+            connection = stack.enter_context(stream_connection(self.engine, fetch_size))
+            for stmt in stmts:
+                results.append(connection.execute(stmt))
+        except Exception:
+            _MergingStreamResult(stack, results).close()
+            raise
+        return _MergingStreamResult(stack, results)
 
 
 class CaseLoadPrefetchedQuery(CasePrefetchQuery):
@@ -1757,6 +1860,16 @@ class KnownGeneAAQuery:
         #: The Aldjemy engine to use
         self.engine = engine
 
+    @staticmethod
+    def condition(kwargs):
+        """Return the condition selecting the alignments overlapping the reference bases of the variant."""
+        return and_(
+            KnowngeneAA.sa.release == kwargs["release"],
+            KnowngeneAA.sa.chromosome == kwargs["chromosome"],
+            KnowngeneAA.sa.start <= int(kwargs["start"]) + (len(kwargs["reference"]) - 1),
+            KnowngeneAA.sa.end >= int(kwargs["start"]),
+        )
+
     def run(self, kwargs):
         """Execute the query."""
         # TODO: Replace kwargs with actual parameters
@@ -1772,20 +1885,85 @@ class KnownGeneAAQuery:
         query = (
             select(distinct_fields + [KnowngeneAA.sa.alignment])
             .select_from(KnowngeneAA.sa.table)
-            .where(
-                and_(
-                    KnowngeneAA.sa.release == kwargs["release"],
-                    KnowngeneAA.sa.chromosome == kwargs["chromosome"],
-                    KnowngeneAA.sa.start <= int(kwargs["start"]) + (len(kwargs["reference"]) - 1),
-                    KnowngeneAA.sa.end >= int(kwargs["start"]),
-                )
-            )
+            .where(self.condition(kwargs))
             .order_by(KnowngeneAA.sa.start)
             .distinct(*distinct_fields)
         )
         return self.engine.execute(query)
 
 
+class GeneSymbolsAtPositionsQuery:
+    """Query database for the symbols of the EnsEMBL genes overlapping many positions at once."""
+
+    def __init__(self, engine):
+        #: The Aldjemy engine to use
+        self.engine = engine
+
+    def run(self, positions):
+        """Return ``dict`` mapping each of the ``(release, chromosome, start, end)`` ``positions`` to its symbols.
+
+        The genes are looked up in one query by joining the positions with their containing UCSC bins to the gene
+        intervals.
+        """
+        positions = set(positions)
+        result = {position: set() for position in positions}
+        if not positions:
+            return result
+        position_bins = (
+            values(
+                column("release", VARCHAR),
+                column("chromosome", VARCHAR),
+                column("start", Integer),
+                column("end", Integer),
+                column("bin", Integer),
+                name="position_bins",
+            )
+            .data(
+                [
+                    (release, chromosome, start, end, bin_)
+                    for release, chromosome, start, end in positions
+                    for bin_ in binning.containing_bins(start - 1, end)
+                ]
+            )
+            .alias("position_bins")
+        )
+        query = (
+            select(
+                [
+                    position_bins.c.release,
+                    position_bins.c.chromosome,
+                    position_bins.c.start,
+                    position_bins.c.end,
+                    EnsemblToGeneSymbol.sa.gene_symbol,
+                    Hgnc.sa.symbol,
+                ]
+            )
+            .select_from(
+                position_bins.join(
+                    GeneInterval.sa.table,
+                    and_(
+                        GeneInterval.sa.database == "ensembl",
+                        GeneInterval.sa.release == position_bins.c.release,
+                        GeneInterval.sa.chromosome == position_bins.c.chromosome,
+                        GeneInterval.sa.bin == position_bins.c.bin,
+                        GeneInterval.sa.start <= position_bins.c.end,
+                        GeneInterval.sa.end >= position_bins.c.start,
+                    ),
+                )
+                .outerjoin(
+                    EnsemblToGeneSymbol.sa.table,
+                    EnsemblToGeneSymbol.sa.ensembl_gene_id == GeneInterval.sa.gene_id,
+                )
+                .outerjoin(Hgnc.sa.table, Hgnc.sa.ensembl_gene_id == GeneInterval.sa.gene_id)
+            )
+            .distinct()
+        )
+        for release, chromosome, start, end, symbol1, symbol2 in self.engine.execute(query):
+            symbols = result[(release, chromosome, start, end)]
+            symbols.update(symbol for symbol in (symbol1, symbol2) if symbol)
+        return result
+
+
 # Query for deleting the variants of a case.
 
 
@@ -1794,11 +1972,11 @@ class DeleteSmallVariantsQuery:
         #: The Aldjemy engine to use
         self.engine = engine
 
-    def run(self, case_id):
-        """Execute the query."""
+    def run(self, case_id, logger=None):
+        """Execute the query, deleting the small variants in batches."""
         # Delete all small variants.
-        yield self.engine.execute(
-            delete(SmallVariant.sa.table).where(SmallVariant.sa.case_id == case_id)
+        yield from iter_purge(
+            self.engine, SmallVariant.sa.table, {"case_id": case_id}, logger=logger
         )
 
 
@@ -1807,18 +1985,17 @@ class DeleteStructuralVariantsQuery:
         #: The Aldjemy engine to use
         self.engine = engine
 
-    def run(self, case_id):
-        """Execute the query."""
-        # Delete all structural variant gene annotations.
-        yield self.engine.execute(
-            delete(StructuralVariantGeneAnnotation.sa.table).where(
-                StructuralVariantGeneAnnotation.sa.case_id == case_id
-            )
-        )
-        # Delete all structural variants.
-        yield self.engine.execute(
-            delete(StructuralVariant.sa.table).where(StructuralVariant.sa.case_id == case_id)
-        )
+    def run(self, case_id, logger=None):
+        """Execute the query, deleting the structural variants and their annotations in batches."""
+        for model in (
+            # Delete all structural variant gene annotations.
+            StructuralVariantGeneAnnotation,
+            # Delete all public database overlap counts.
+            StructuralVariantPublicDatabaseCounts,
+            # Delete all structural variants.
+            StructuralVariant,
+        ):
+            yield from iter_purge(self.engine, model.sa.table, {"case_id": case_id}, logger=logger)
 
 
 # Queries for pulling all user annotation for one or more cases from the database.
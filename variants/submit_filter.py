@@ -1,7 +1,8 @@
 import contextlib
+import io
 
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
 
 from projectroles.plugins import get_backend_api
 
@@ -11,6 +12,9 @@ from variants.forms import PATHO_SCORES_MAPPING
 from variants.models import prioritize_genes, VariantScoresFactory
 from .queries import CasePrefetchQuery, ProjectPrefetchQuery
 
+#: Columns of the query result rows that are needed for storing results and prioritization.
+RESULT_ROW_KEYS = ("id", "entrez_id", "chromosome", "start", "reference", "alternative")
+
 
 class FilterBase:
     """Base class for filtering and storing case query results.
@@ -47,8 +51,9 @@ class FilterBase:
         query_args = {**self.variant_query.query_settings, **kwargs}
         # Run query, store results, and run prioritization query.
         self.job.add_log_entry("Running database query ...")
-        with contextlib.closing(self.assembled_query.run(query_args)) as results:
-            _results = tuple(results)
+        with contextlib.closing(self.assembled_query.stream(query_args)) as results:
+            # Only keep the columns required below so memory does not grow with the full rows.
+            _results = tuple({key: row[key] for key in RESULT_ROW_KEYS} for row in results)
             self._store_results(_results)
             self._prioritize_gene_phenotype(_results)
             self._prioritize_variant_pathogenicity(_results)
@@ -56,12 +61,35 @@ class FilterBase:
     def _store_results(self, results):
         """Store results in ManyToMany field."""
         self.job.add_log_entry("Storing results ...")
-        # Obtain smallvariant ids to store them in ManyToMany field
-        smallvariant_pks = [row["id"] for row in results]
-        # Delete previously stored results (note: this only disassociates them, it doesn't delete objects itself.)
-        self.variant_query.query_results.clear()
-        # Bulk-insert Many-to-Many relationship. THE ORDER IS NOT NECESSARILY PRESERVED!!!
-        self.variant_query.query_results.add(*smallvariant_pks)
+        # Obtain unique smallvariant ids to store them in ManyToMany field
+        smallvariant_pks = list(dict.fromkeys(row["id"] for row in results))
+        with transaction.atomic():
+            # Delete previously stored results (note: this only disassociates them, it doesn't delete objects itself.)
+            self.variant_query.query_results.clear()
+            if len(smallvariant_pks) >= settings.QUERY_RESULTS_COPY_THRESHOLD:
+                self._copy_results(smallvariant_pks)
+            else:
+                # Bulk-insert Many-to-Many relationship. THE ORDER IS NOT NECESSARILY PRESERVED!!!
+                self.variant_query.query_results.add(*smallvariant_pks)
+
+    def _copy_results(self, smallvariant_pks):
+        """Write ``smallvariant_pks`` into the through table of ``query_results`` with ``COPY``.
+
+        This skips the ORM (and its check for existing rows) which is too slow for large result sets.  The
+        previous results must have been cleared before.
+        """
+        field = self.variant_query._meta.get_field("query_results")
+        quote_name = connection.ops.quote_name
+        sql = "COPY {table} ({query_column}, {variant_column}) FROM STDIN".format(
+            table=quote_name(field.remote_field.through._meta.db_table),
+            query_column=quote_name(field.m2m_column_name()),
+            variant_column=quote_name(field.m2m_reverse_name()),
+        )
+        buf = io.StringIO(
+            "".join("%d\t%d\n" % (self.variant_query.pk, pk) for pk in smallvariant_pks)
+        )
+        with connection.cursor() as cursor:
+            cursor.copy_expert(sql, buf)
 
     def _prioritize_gene_phenotype(self, results):
         """Prioritize genes in ``results`` and store in ``SmallVariantQueryGeneScores``."""
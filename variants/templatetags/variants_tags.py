@@ -1,9 +1,9 @@
+import functools
 import sys
 
 from django import template
 from django.utils import formats
 from django.utils.html import avoid_wrapping
-import nltk
 
 from django.conf import settings
 from ..models import (
@@ -17,8 +17,21 @@ from geneinfo.models import GeneIdToInheritance, Hpo, HpoName
 modes_of_inheritance = dict(GeneIdToInheritance.MODES_OF_INHERITANCE)
 register = template.Library()
 
-nltk.data.path.append("misc/nltk_data")
-stop_words = set(nltk.corpus.stopwords.words("english"))
+
+@functools.lru_cache(maxsize=None)
+def get_nltk():
+    """Return the ``nltk`` module set up to use the bundled data, imported on first use."""
+    import nltk
+
+    nltk.data.path.append("misc/nltk_data")
+    return nltk
+
+
+@functools.lru_cache(maxsize=None)
+def get_stop_words():
+    """Return the English stop words, loaded on first use."""
+    return frozenset(get_nltk().corpus.stopwords.words("english"))
+
 
 # Row colors to use.
 ROW_COLORS = {
@@ -479,8 +492,8 @@ def get_pubmed_linkout(record, hpoterms):
             "(%s)"
             % " AND ".join(
                 word
-                for word in map(lambda x: x.lower(), nltk.tokenize.word_tokenize(title))
-                if word not in stop_words
+                for word in map(lambda x: x.lower(), get_nltk().tokenize.word_tokenize(title))
+                if word not in get_stop_words()
             )
             for _, title in hpoterms.items()
         ]
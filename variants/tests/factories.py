@@ -886,7 +886,7 @@ class ExportFileJobResultFactory(factory.django.DjangoModelFactory):
     job = factory.SubFactory(
         ExportFileBgJobFactory, user=factory.SelfAttribute("factory_parent.user")
     )
-    payload = b"Testcontent"
+    file = factory.django.FileField(data=b"Testcontent")
     expiry_time = timezone.now()
 
 
@@ -923,7 +923,7 @@ class ExportProjectCasesFileBgJobResultFactory(factory.django.DjangoModelFactory
     job = factory.SubFactory(
         ExportProjectCasesFileBgJobFactory, user=factory.SelfAttribute("factory_parent.user")
     )
-    payload = b"Testcontent"
+    file = factory.django.FileField(data=b"Testcontent")
     expiry_time = timezone.now()
 
 
@@ -1,6 +1,8 @@
 """Common helper code for tests"""
 
-from django.test import RequestFactory
+import contextlib
+
+from django.test import RequestFactory, TransactionTestCase
 from test_plus.test import TestCase
 from projectroles.tests.test_permissions import TestProjectPermissionBase
 from projectroles.tests.test_permissions_api import TestProjectAPIPermissionBase
@@ -66,10 +68,12 @@ class QueryTestBase(TestBase):
         return results
 
 
-class SupportQueryTestBase(TestBase):
-    """Base class for model support queries."""
+class SupportQueryTestMixin:
+    """Helper code for running the model support queries."""
 
-    def _get_fetch_and_query(self, query_class, cleaned_data_patch, query_type="case", user=None):
+    def _get_fetch_and_query(
+        self, query_class, cleaned_data_patch, query_type="case", user=None, stream=False
+    ):
         engine = get_engine()
 
         def fetch_case_and_query():
@@ -101,6 +105,8 @@ class SupportQueryTestBase(TestBase):
                     query = query_class(obj, engine, user=user)
                 else:
                     query = query_class(obj, engine)
+            if stream:
+                return query.stream(patched_cleaned_data)
             return query.run(patched_cleaned_data)
 
         return fetch_case_and_query
@@ -113,6 +119,7 @@ class SupportQueryTestBase(TestBase):
         assert_raises=None,
         query_type="case",
         user=None,
+        stream=False,
     ):
         """Run query returning a collection of filtration results with ``query_class``.
 
@@ -127,13 +134,19 @@ class SupportQueryTestBase(TestBase):
         - If ``assert_raises`` evaluates as ``True`` then instead of checking the result
           length and returning a list of elements, assert that an exception of type
           ``assert_raises`` is raised.
+        - If ``stream`` evaluates as ``True`` then the query is run with server-side cursors.
         """
         fetch_case_and_query = self._get_fetch_and_query(
-            query_class, cleaned_data_patch, query_type, user
+            query_class, cleaned_data_patch, query_type, user, stream
         )
         if assert_raises:
             with self.assertRaises(assert_raises):
                 fetch_case_and_query()
+        elif stream:
+            with contextlib.closing(fetch_case_and_query()) as result:
+                results = list(result)
+            self.assertEquals(length, len(results))
+            return results
         else:
             results = list(fetch_case_and_query())
             self.assertEquals(length, len(results))
@@ -155,6 +168,14 @@ class SupportQueryTestBase(TestBase):
             return result
 
 
+class SupportQueryTestBase(SupportQueryTestMixin, TestBase):
+    """Base class for model support queries."""
+
+
+class SupportQueryTransactionTestBase(SupportQueryTestMixin, TransactionTestCase):
+    """Base class for model support queries whose data must be visible to other connections."""
+
+
 class TestViewsBase(TestCase):
     def setUp(self):
         self.superuser = self.make_user("superuser")
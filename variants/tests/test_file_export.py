@@ -2,16 +2,22 @@
 
 import gzip
 import io
+import os
 from datetime import timedelta
 import tempfile
 from unittest.mock import patch
 
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TransactionTestCase
 from django.utils import timezone
 import openpyxl
+import pysam
 from test_plus.test import TestCase
 from timeline.models import ProjectEvent
 
 from cohorts.tests.factories import TestCohortBase
+from varfish.users.tests.factories import UserFactory
 from variants.tests.factories import (
     SmallVariantFactory,
     ResubmitFormDataFactory,
@@ -19,7 +25,13 @@ from variants.tests.factories import (
     CaseWithVariantSetFactory,
 )
 from .. import file_export
-from ..models import ExportFileBgJob, ExportProjectCasesFileBgJob, Case, CaseAwareProject
+from ..models import (
+    EXPORT_FILE_EXTENSIONS,
+    ExportFileBgJob,
+    ExportProjectCasesFileBgJob,
+    Case,
+    CaseAwareProject,
+)
 from bgjobs.models import BackgroundJob
 from projectroles.models import Project
 
@@ -154,6 +166,12 @@ class CaseExporterTest(ExportTestBase):
             variants_sheet = workbook["Variants"]
             arrs = [[cell.value for cell in row] for row in variants_sheet.rows]
             self._test_tabular(arrs, False)
+            # Both columns of the metadata sheet are written even though rows are flushed early.
+            metadata = [[cell.value for cell in row] for row in workbook["Metadata"].rows]
+            self.assertEqual(len(metadata), 7 + len(self.export_job.query_args))
+            self.assertEqual(metadata[0], ["Case", "TODO: URL to case"])
+            self.assertEqual(metadata[2][0], "Date")
+            self.assertIsNotNone(metadata[2][1])
 
 
 class ProjectExportTest(TestCase):
@@ -342,6 +360,80 @@ class ProjectExportTest(TestCase):
             arrs = [[cell.value for cell in row] for row in variants_sheet.rows]
             self._test_tabular(arrs, False)
 
+    def test_export_project_cases(self):
+        self.export_job.file_type = "vcf"
+        self.export_job.save()
+        with file_export.CaseExporterVcf(self.export_job, self.project) as exporter:
+            expected = gzip.decompress(exporter.generate())
+        file_export.export_project_cases(self.export_job)
+        with self.export_job.export_result.file.open("rb") as inputf:
+            self.assertEqual(gzip.decompress(inputf.read()), expected)
+
+    def test_get_export_shards(self):
+        cases = [self.case1, self.case2]
+        self.assertEqual(
+            file_export.get_export_shards({}, cases),
+            [[("1", None, None)], [("2", None, None)], [("3", None, None)]],
+        )
+        self.assertEqual(
+            file_export.get_export_shards(
+                {"genomic_region": [("X", 1, 100), ("2", 1, 100), ("X", 200, 300)]}, cases
+            ),
+            [[("2", 1, 100)], [("X", 1, 100), ("X", 200, 300)]],
+        )
+
+    def test_get_export_shards_other_contigs(self):
+        SmallVariantFactory(
+            chromosome="GL000220.1", chromosome_no=25, variant_set=self.variant_set1
+        )
+        SmallVariantFactory(chromosome="hs37d5", chromosome_no=25, variant_set=self.variant_set2)
+        self.assertEqual(
+            file_export.get_export_shards({}, [self.case1, self.case2])[-1],
+            [("GL000220.1", None, None), ("hs37d5", None, None)],
+        )
+
+    def test_export_tsv_sharded(self):
+        with file_export.CaseExporterTsv(self.export_job, self.project) as exporter:
+            self.assertTrue(exporter.is_shardable())
+            expected = exporter.generate()
+        result = io.BytesIO()
+        file_export.generate_sharded(
+            file_export.CaseExporterTsv, self.export_job, self.project, result
+        )
+        self.assertEqual(result.getvalue(), expected)
+
+    def test_export_tsv_sharded_other_contigs(self):
+        SmallVariantFactory(
+            chromosome="GL000220.1", chromosome_no=25, variant_set=self.variant_set1
+        )
+        with file_export.CaseExporterTsv(self.export_job, self.project) as exporter:
+            expected = exporter.generate()
+        result = io.BytesIO()
+        file_export.generate_sharded(
+            file_export.CaseExporterTsv, self.export_job, self.project, result
+        )
+        self.assertEqual(result.getvalue(), expected)
+        self.assertIn(b"\tGL000220.1\t", result.getvalue())
+
+    def test_export_vcf_sharded(self):
+        with file_export.CaseExporterVcf(self.export_job, self.project) as exporter:
+            expected = gzip.decompress(exporter.generate())
+        with tempfile.NamedTemporaryFile() as tmp_file:
+            file_export.generate_sharded(
+                file_export.CaseExporterVcf, self.export_job, self.project, tmp_file
+            )
+            result = tmp_file.read()
+        self.assertEqual(gzip.decompress(result), expected)
+        # The concatenated shards form one sorted BGZF file that can be indexed.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "export.vcf.gz")
+            with open(path, "wb") as outputf:
+                outputf.write(result)
+            pysam.tabix_index(path, preset="vcf")
+            with pysam.TabixFile(path) as tabix_file:
+                for small_var in self.small_vars1:
+                    self.assertEqual(len(list(tabix_file.fetch(small_var.chromosome))), 1)
+
 
 class CohortExporterTest(TestCohortBase):
     def _create_bgjob(self, user, cohort):
@@ -615,9 +707,9 @@ class CohortExporterTest(TestCohortBase):
             )
 
 
-def _fake_generate(_self):
-    """Helper used for patching away ``CaseExporter*.generate``."""
-    return bytes("test bytes", "utf-8")
+def _fake_write_tmp_file(_self):
+    """Helper used for patching away ``CaseExporter*.write_tmp_file``."""
+    return io.BytesIO(bytes("test bytes", "utf-8"))
 
 
 class ExportCaseTest(ExportTestBase):
@@ -635,33 +727,119 @@ class ExportCaseTest(ExportTestBase):
         file_export.export_case(self.export_job)
         # Check immediate result
         self.assertIsNotNone(self.export_job.export_result)
-        self.assertEquals(self.export_job.export_result.payload, _fake_generate(self))
+        with self.export_job.export_result.file.open("rb") as inputf:
+            self.assertEquals(inputf.read(), _fake_write_tmp_file(self).read())
+        self.assertTrue(
+            self.export_job.export_result.file.name.endswith(EXPORT_FILE_EXTENSIONS[file_type])
+        )
         # Check side effects
         self.assertEquals(ProjectEvent.objects.count(), 1)
 
-    @patch.object(file_export.CaseExporterTsv, "generate", new=_fake_generate, create=True)
+    @patch.object(file_export.CaseExporterTsv, "write_tmp_file", new=_fake_write_tmp_file)
     def test_export_tsv(self):
         self._run_test("tsv")
 
-    @patch.object(file_export.CaseExporterXlsx, "generate", new=_fake_generate, create=True)
+    @patch.object(file_export.CaseExporterXlsx, "write_tmp_file", new=_fake_write_tmp_file)
     def test_export_xlsx(self):
         self._run_test("xlsx")
 
-    @patch.object(file_export.CaseExporterVcf, "generate", new=_fake_generate, create=True)
+    @patch.object(file_export.CaseExporterVcf, "write_tmp_file", new=_fake_write_tmp_file)
     def test_export_vcf(self):
         self._run_test("vcf")
 
 
+class ExportCaseOutsideTransactionTest(TransactionTestCase):
+    """Test ``export_case()`` with Django's connection in autocommit mode as in the export jobs."""
+
+    def setUp(self):
+        self.superuser = UserFactory(username="superuser")
+        self.case, self.variant_set, _ = CaseWithVariantSetFactory.get("small")
+        self.small_vars = SmallVariantFactory.create_batch(3, variant_set=self.variant_set)
+        self.bg_job = BackgroundJob.objects.create(
+            name="job name",
+            project=self.case.project,
+            job_type="variants.export_file_bg_job",
+            user=self.superuser,
+        )
+        self.export_job = ExportFileBgJob.objects.create(
+            project=self.bg_job.project,
+            bg_job=self.bg_job,
+            case=self.case,
+            query_args=vars(
+                ResubmitFormDataFactory(submit="download", names=self.case.get_members())
+            ),
+            file_type="tsv",
+        )
+
+    def test_export_tsv(self):
+        self.assertFalse(connection.in_atomic_block)
+        file_export.export_case(self.export_job)
+        with self.export_job.export_result.file.open("rb") as inputf:
+            lines = inputf.read().decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            [line.split("\t")[1] for line in lines[1:]], [str(v.start) for v in self.small_vars]
+        )
+        self.assertFalse(connection.in_atomic_block)
+
+
+class ProjectExportShardedParallelTest(TransactionTestCase):
+    """Test ``generate_sharded()`` with several worker threads, each with its own connection."""
+
+    def setUp(self):
+        self.superuser = UserFactory(username="superuser")
+        self.case1, self.variant_set1, _ = CaseWithVariantSetFactory.get("small")
+        self.project = CaseAwareProject.objects.get(pk=self.case1.project.pk)
+        self.case2, self.variant_set2, _ = CaseWithVariantSetFactory.get(
+            "small", project=self.project
+        )
+        for chromosome in ("1", "2", "3", "X"):
+            SmallVariantFactory(chromosome=chromosome, variant_set=self.variant_set1)
+            SmallVariantFactory(chromosome=chromosome, variant_set=self.variant_set2)
+        SmallVariantFactory(
+            chromosome="GL000220.1", chromosome_no=25, variant_set=self.variant_set2
+        )
+        self.bg_job = BackgroundJob.objects.create(
+            name="job name",
+            project=self.project,
+            job_type="variants.export_file_bg_job",
+            user=self.superuser,
+        )
+        self.export_job = ExportProjectCasesFileBgJob.objects.create(
+            project=self.project,
+            bg_job=self.bg_job,
+            query_args=vars(
+                ResubmitFormDataFactory(submit="download", names=self.project.get_members())
+            ),
+            file_type="tsv",
+        )
+
+    def test_export_tsv_sharded(self):
+        with file_export.CaseExporterTsv(self.export_job, self.project) as exporter:
+            expected = exporter.generate()
+        result = io.BytesIO()
+        file_export.generate_sharded(
+            file_export.CaseExporterTsv, self.export_job, self.project, result, max_workers=2
+        )
+        self.assertEqual(result.getvalue(), expected)
+        self.assertEqual(len(result.getvalue().decode("utf-8").splitlines()), 10)
+        self.assertFalse(connection.in_atomic_block)
+
+
 class ClearExpiredExportedFilesTest(ExportTestBase):
     """Test the ``clear_expired_exported_files()`` function."""
 
     def testWithExpired(self):
-        file_export.ExportFileJobResult.objects.create(
-            job=self.export_job, expiry_time=timezone.now() - timedelta(days=1)
+        result = file_export.ExportFileJobResult.objects.create(
+            job=self.export_job,
+            expiry_time=timezone.now() - timedelta(days=1),
+            file=ContentFile(b"test bytes", name="varfish_export.xlsx"),
         )
         self.assertEquals(file_export.ExportFileJobResult.objects.count(), 1)
+        self.assertTrue(result.file.storage.exists(result.file.name))
         file_export.clear_expired_exported_files()
         self.assertEquals(file_export.ExportFileJobResult.objects.count(), 0)
+        self.assertFalse(result.file.storage.exists(result.file.name))
 
     def testWithNonExpired(self):
         file_export.ExportFileJobResult.objects.create(
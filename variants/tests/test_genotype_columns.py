@@ -0,0 +1,64 @@
+"""Tests for ``variants.genotype_columns``."""
+
+from test_plus.test import TestCase
+
+from .factories import CaseWithVariantSetFactory, SmallVariantFactory
+from ..genotype_columns import GENOTYPE_CODE_OTHER, GENOTYPE_CODES, build_genotype_columns
+from ..helpers import get_engine
+from ..models import SmallVariant, SmallVariantSet
+
+
+class TestBuildGenotypeColumns(TestCase):
+    def setUp(self):
+        self.case, self.variant_set, _ = CaseWithVariantSetFactory.get("small", structure="trio")
+        self.index, self.father, self.mother = (
+            self.case.pedigree[0]["patient"],
+            self.case.pedigree[0]["father"],
+            self.case.pedigree[0]["mother"],
+        )
+
+    def testBuildGenotypeColumns(self):
+        variant = SmallVariantFactory(
+            genotype={
+                self.index: {"ad": 15, "dp": 30, "gq": 99, "gt": "0/1"},
+                self.father: {"ad": 0, "dp": 20, "gq": 60, "gt": "0|0"},
+                self.mother: {"ad": 1, "dp": -1, "gt": "2/2"},
+            },
+            variant_set=self.variant_set,
+        )
+        build_genotype_columns(get_engine(), self.variant_set)
+        samples = [line["patient"] for line in self.case.pedigree]
+        self.assertEqual(SmallVariantSet.objects.get().genotype_samples, samples)
+        variant = SmallVariant.objects.get(pk=variant.pk)
+        expected = {
+            self.index: (GENOTYPE_CODES["0/1"], 99, 30, 15),
+            self.father: (GENOTYPE_CODES["0|0"], 60, 20, 0),
+            self.mother: (GENOTYPE_CODE_OTHER, None, -1, 1),
+        }
+        self.assertEqual(
+            list(
+                zip(
+                    variant.genotype_gt,
+                    variant.genotype_gq,
+                    variant.genotype_dp,
+                    variant.genotype_ad,
+                )
+            ),
+            [expected[sample] for sample in samples],
+        )
+
+    def testBuildGenotypeColumnsMissingSample(self):
+        variant = SmallVariantFactory(
+            genotype={self.index: {"ad": 15, "dp": 30, "gq": 99, "gt": "1/1"}},
+            variant_set=self.variant_set,
+        )
+        self.case.pedigree[1]["patient"] = "it's 100%: odd"
+        self.case.save()
+        build_genotype_columns(get_engine(), self.variant_set)
+        variant = SmallVariant.objects.get(pk=variant.pk)
+        samples = SmallVariantSet.objects.get().genotype_samples
+        self.assertEqual(samples[1], "it's 100%: odd")
+        self.assertEqual(
+            variant.genotype_gt,
+            [GENOTYPE_CODES["1/1"] if sample == self.index else None for sample in samples],
+        )
@@ -0,0 +1,56 @@
+"""Tests for ``variants.helpers``."""
+
+from clinvar.models import Clinvar
+from frequencies.models import Exac
+from frequencies.tests.factories import ExacFactory
+from test_plus.test import TestCase
+
+from .factories import CaseWithVariantSetFactory, SmallVariantCommentFactory, SmallVariantFactory
+from ..helpers import get_engine, load_model_records, variant_condition
+from ..models import SmallVariant, SmallVariantComment
+
+
+class TestLoadModelRecords(TestCase):
+    def setUp(self):
+        self.user = self.make_user()
+        self.case, self.variant_set, _ = CaseWithVariantSetFactory.get("small")
+        self.small_var = SmallVariantFactory(variant_set=self.variant_set)
+        self.coords = {
+            "release": self.small_var.release,
+            "chromosome": self.small_var.chromosome,
+            "start": self.small_var.start,
+            "end": self.small_var.end,
+            "reference": self.small_var.reference,
+            "alternative": self.small_var.alternative,
+        }
+        self.exac = ExacFactory(bin=self.small_var.bin, **self.coords)
+        self.comment = SmallVariantCommentFactory(case=self.case, user=self.user, **self.coords)
+
+    def testLoad(self):
+        records = load_model_records(
+            get_engine(),
+            {
+                "small_var": (SmallVariant, variant_condition(SmallVariant, self.coords)),
+                "exac": (Exac, variant_condition(Exac, self.coords)),
+                "comments": (
+                    SmallVariantComment,
+                    variant_condition(SmallVariantComment, self.coords),
+                ),
+                "clinvar": (Clinvar, variant_condition(Clinvar, self.coords)),
+            },
+        )
+        self.assertEqual(records["small_var"], [self.small_var])
+        self.assertEqual(records["small_var"][0].genotype, self.small_var.genotype)
+        self.assertEqual(records["small_var"][0].refseq_effect, self.small_var.refseq_effect)
+        self.assertEqual(records["exac"][0].af_afr, self.exac.af_afr)
+        self.assertEqual(records["comments"], [self.comment])
+        self.assertEqual(records["comments"][0].date_created, self.comment.date_created)
+        self.assertEqual(records["comments"][0].user, self.user)
+        self.assertEqual(records["clinvar"], [])
+
+    def testLoadOtherVariant(self):
+        coords = {**self.coords, "start": self.small_var.start + 1}
+        records = load_model_records(
+            get_engine(), {"exac": (Exac, variant_condition(Exac, coords))}
+        )
+        self.assertEqual(records, {"exac": []})
@@ -1,15 +1,33 @@
 """Tests for the importing."""
 
+import gzip
 import os.path
 import shutil
 import tempfile
+from unittest.mock import patch
 
 from bgjobs.models import BackgroundJob
+from django.core.exceptions import FieldDoesNotExist
+from django.test import override_settings
 from test_plus.test import TestCase
 
-from variants.models import ImportVariantsBgJob, Case, SmallVariantSet, SmallVariant
+from importer.management.helpers import copy_tsv_files
+from variants.genotype_columns import GENOTYPE_CODES, genotype_column_expressions
+from variants.models import (
+    ImportVariantsBgJob,
+    Case,
+    SmallVariantSet,
+    SmallVariant,
+    SmallVariantSummary,
+    SmallVariantSummaryVariantSet,
+    VariantImporter,
+)
 from variants.tasks import run_import_variants_bg_job
-from variants.tests.factories import SmallVariantFactory, CaseFactory
+from variants.tests.factories import (
+    SmallVariantFactory,
+    CaseFactory,
+    CaseWithVariantSetFactory,
+)
 
 
 def write_test_files(directory, name, members):
@@ -175,6 +193,39 @@ class TestImportOnce(TestCase):
         self.assertEqual(Case.objects.count(), 1)
         self.assertEqual(SmallVariantSet.objects.count(), 1)
         self.assertEqual(SmallVariant.objects.count(), 1)
+        samples = [m["patient"] for m in self.case.pedigree]
+        self.assertEqual(SmallVariantSet.objects.get().genotype_samples, samples)
+        variant = SmallVariant.objects.get()
+        self.assertEqual(variant.genotype_gt, [GENOTYPE_CODES["0/1"]] * len(samples))
+        self.assertEqual(variant.genotype_dp, [None] * len(samples))
+        summary = SmallVariantSummary.objects.get()
+        self.assertEqual(
+            (summary.count_hom_ref, summary.count_het, summary.count_hom_alt),
+            (variant.num_hom_ref, variant.num_het, variant.num_hom_alt),
+        )
+
+    @override_settings(VARFISH_GENOTYPE_COLUMNS=False)
+    def testRunImportWithoutGenotypeColumns(self):
+        bg_job = BackgroundJob.objects.create(
+            name="Import of case %s" % self.case.name,
+            project=self.case.project,
+            job_type=ImportVariantsBgJob.spec_name,
+            user=self.admin,
+        )
+        import_job = ImportVariantsBgJob.objects.create(
+            bg_job=bg_job,
+            project=self.case.project,
+            case_name=self.case.name,
+            index_name=self.case.index,
+            path_ped=os.path.join(self.data_dir, "%s.ped" % self.case.name),
+            path_genotypes=[os.path.join(self.data_dir, "%s.gts.tsv" % self.case.name)],
+            path_db_info=[os.path.join(self.data_dir, "%s.db-infos.tsv" % self.case.name)],
+        )
+
+        run_import_variants_bg_job(import_job.pk)
+
+        self.assertIsNone(SmallVariantSet.objects.get().genotype_samples)
+        self.assertIsNone(SmallVariant.objects.get().genotype_gt)
 
 
 class TestImportTwice(TestCase):
@@ -223,3 +274,81 @@ class TestImportTwice(TestCase):
         variant = SmallVariant.objects.first()
         self.assertNotEqual(old_variant_set.id, variant_set.id)
         self.assertNotEqual(old_variant.id, variant.id)
+        self.assertEqual(
+            list(SmallVariantSummaryVariantSet.objects.values_list("variant_set", flat=True)),
+            [variant_set.id],
+        )
+        self.assertEqual(SmallVariantSummary.objects.get().count_het, variant.num_het)
+
+
+class TestCopyTsvFiles(TestCase):
+    """Test streaming TSV files into the database"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.case, self.variant_set, _ = CaseWithVariantSetFactory.get("small")
+        write_test_files(self.data_dir, self.case.name, [m["patient"] for m in self.case.pedigree])
+        # Write a second, gzip-compressed file with two more variants.
+        with open(os.path.join(self.data_dir, "%s.gts.tsv" % self.case.name), "rt") as inputf:
+            header, line = inputf.read().splitlines()
+        self.paths = [os.path.join(self.data_dir, "%s.gts.tsv" % self.case.name)]
+        self.paths.append(os.path.join(self.data_dir, "%s.more.gts.tsv.gz" % self.case.name))
+        with gzip.open(self.paths[1], "wt") as outputf:
+            print(header, file=outputf)
+            for start in ("14908", "14909"):
+                print(line.replace("\t14907\t14907\t", "\t%s\t%s\t" % (start, start)), file=outputf)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def _copy_tsv_files(self, **kwargs):
+        return copy_tsv_files(
+            SmallVariant,
+            self.paths,
+            "genotypes",
+            default_values=VariantImporter.default_values,
+            delimiter="\t",
+            null=".",
+            ignore_conflicts=True,
+            **kwargs
+        )
+
+    @patch("importer.management.helpers.COPY_CHUNK_LINES", 1)
+    def test_copy_tsv_files(self):
+        self._copy_tsv_files(
+            replace={"case_id": str(self.case.pk), "set_id": str(self.variant_set.pk)},
+            check={"release": "GRCh37"},
+        )
+        self.assertEqual(
+            sorted(SmallVariant.objects.values_list("start", "case_id", "set_id")),
+            [(start, self.case.pk, self.variant_set.pk) for start in (14907, 14908, 14909)],
+        )
+
+    def test_copy_tsv_files_computed(self):
+        samples = [m["patient"] for m in self.case.pedigree] + ["missing"]
+        self._copy_tsv_files(
+            replace={"case_id": str(self.case.pk), "set_id": str(self.variant_set.pk)},
+            computed=genotype_column_expressions(samples),
+        )
+        self.assertEqual(
+            list(SmallVariant.objects.values_list("genotype_gt", flat=True)),
+            [[GENOTYPE_CODES["0/1"]] * (len(samples) - 1) + [None]] * 3,
+        )
+
+    def test_copy_tsv_files_computed_unknown_field(self):
+        with self.assertRaises(FieldDoesNotExist):
+            self._copy_tsv_files(
+                replace={"case_id": str(self.case.pk), "set_id": str(self.variant_set.pk)},
+                computed={"genotype_xx": "NULL"},
+            )
+
+    def test_copy_tsv_files_check_fails(self):
+        with self.assertRaises(RuntimeError):
+            self._copy_tsv_files(
+                replace={"case_id": str(self.case.pk), "set_id": str(self.variant_set.pk)},
+                check={"release": "GRCh38"},
+            )
+
+    def test_copy_tsv_files_missing_column(self):
+        with self.assertRaises(RuntimeError):
+            self._copy_tsv_files(replace={"case_idx": str(self.case.pk)})
@@ -0,0 +1,138 @@
+"""Tests for ``variants.inhouse_counts``."""
+
+from test_plus.test import TestCase
+
+from .factories import (
+    CaseWithVariantSetFactory,
+    DeleteCaseBgJobFactory,
+    SmallVariantFactory,
+)
+from ..helpers import get_engine
+from ..inhouse_counts import (
+    add_variant_set_inhouse_counts,
+    rebuild_inhouse_counts,
+    remove_case_inhouse_counts,
+    remove_variant_set_inhouse_counts,
+)
+from ..models import DeleteCase, SmallVariantSummary, SmallVariantSummaryVariantSet
+
+
+def variant_key(small_var):
+    return (
+        small_var.release,
+        small_var.chromosome,
+        small_var.start,
+        small_var.end,
+        small_var.reference,
+        small_var.alternative,
+    )
+
+
+def inhouse_counts():
+    return {
+        variant_key(summary): (
+            summary.count_hom_ref,
+            summary.count_het,
+            summary.count_hom_alt,
+            summary.count_hemi_ref,
+            summary.count_hemi_alt,
+        )
+        for summary in SmallVariantSummary.objects.all()
+    }
+
+
+class TestInhouseCounts(TestCase):
+    def setUp(self):
+        self.case1, self.variant_set1 = self._create_case()
+        self.case2, self.variant_set2 = self._create_case()
+        self.shared = variant_key(self.variant_set1.small_vars[0])
+
+    def _create_case(self):
+        case, variant_set, _ = CaseWithVariantSetFactory.get("small", structure="trio")
+        variant_set.small_vars = [
+            SmallVariantFactory(
+                variant_set=variant_set,
+                chromosome="1",
+                start=start,
+                end=start,
+                reference="A",
+                alternative="G",
+                num_hom_ref=1,
+                num_het=2,
+                num_hom_alt=0,
+            )
+            for start in (1000, 2000 + case.pk)
+        ]
+        return case, variant_set
+
+    def test_add_variant_set(self):
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set1)
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+        # Adding a variant set twice does not change the counts.
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+
+        counts = inhouse_counts()
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(counts[self.shared], (2, 4, 0, 0, 0))
+        self.assertEqual(SmallVariantSummaryVariantSet.objects.count(), 2)
+
+    def test_add_variant_set_duplicate_rows(self):
+        # Rows of the same variant with the same counts in one variant set are counted once.
+        small_var = self.variant_set1.small_vars[0]
+        SmallVariantFactory(
+            variant_set=self.variant_set1,
+            chromosome=small_var.chromosome,
+            start=small_var.start,
+            end=small_var.end,
+            reference=small_var.reference,
+            alternative=small_var.alternative,
+            num_hom_ref=1,
+            num_het=2,
+            num_hom_alt=0,
+        )
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set1)
+
+        self.assertEqual(inhouse_counts()[self.shared], (1, 2, 0, 0, 0))
+
+    def test_remove_variant_set(self):
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set1)
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+
+        remove_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+
+        counts = inhouse_counts()
+        self.assertEqual(len(counts), 2)
+        self.assertEqual(counts[self.shared], (1, 2, 0, 0, 0))
+        self.assertEqual(
+            list(SmallVariantSummaryVariantSet.objects.values_list("variant_set", flat=True)),
+            [self.variant_set1.pk],
+        )
+
+    def test_remove_case(self):
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set1)
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+
+        remove_case_inhouse_counts(get_engine(), self.case1)
+        remove_case_inhouse_counts(get_engine(), self.case2)
+
+        self.assertEqual(SmallVariantSummary.objects.count(), 0)
+        self.assertEqual(SmallVariantSummaryVariantSet.objects.count(), 0)
+
+    def test_delete_case(self):
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set1)
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+
+        self.case2.delete()
+        DeleteCase(DeleteCaseBgJobFactory(case=self.case1, user=self.make_user())).run()
+
+        self.assertEqual(SmallVariantSummary.objects.count(), 0)
+
+    def test_rebuild(self):
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set1)
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set2)
+        counts = inhouse_counts()
+
+        rebuild_inhouse_counts(get_engine())
+
+        self.assertEqual(inhouse_counts(), counts)
+        self.assertEqual(SmallVariantSummaryVariantSet.objects.count(), 2)
@@ -1,19 +1,29 @@
 """Tests for ``variants.models``."""
+import json
 import uuid
 from datetime import datetime, timedelta
 from unittest.mock import patch
 
 from django.conf import settings
 from projectroles.models import Project, SODAR_CONSTANTS
+from requests_mock import Mocker
 
+from beaconsite.allele_counts import add_variant_set_allele_counts
+from beaconsite.models import AlleleCount, AlleleCountVariantSet
+from svs.tests.factories import StructuralVariantFlagsFactory
 from variants.tests.factories import (
     SmallVariantFlagsFactory,
     ProjectFactory,
     SmallVariantFactory,
     CaseWithVariantSetFactory,
+    SmallVariantCommentFactory,
+    AcmgCriteriaRatingFactory,
+    SampleVariantStatisticsFactory,
 )
 from test_plus.test import TestCase
 
+from ..helpers import get_engine
+from ..inhouse_counts import add_variant_set_inhouse_counts
 from ..models import (
     SmallVariantFlags,
     SmallVariantSet,
@@ -21,6 +31,15 @@ from ..models import (
     SmallVariant,
     Case,
     clear_old_kiosk_cases,
+    CaddPathogenicityScoreCache,
+    VariantScoresCadd,
+    CaseAlignmentStats,
+    ProjectCaseSummary,
+    SmallVariantAnnotationSummary,
+    SmallVariantSummary,
+    SmallVariantSummaryVariantSet,
+    _PROJECT_CASE_SUMMARY_COMPUTE,
+    invalidate_project_case_summary,
 )
 
 
@@ -33,6 +52,158 @@ class TestSmallVariantFlags(TestCase):
         self.assertEquals(SmallVariantFlags.objects.count(), 1)
 
 
+class TestProjectCaseSummary(TestCase):
+    """Tests for the ``ProjectCaseSummary`` read by ``CaseAwareProject``."""
+
+    def setUp(self):
+        self.superuser = self.make_user("superuser")
+        self.project = ProjectFactory()
+        self.case_1, self.variant_set_1, _ = CaseWithVariantSetFactory.get(
+            "small", project=self.project, num_small_vars=10
+        )
+        self.case_2, self.variant_set_2, _ = CaseWithVariantSetFactory.get(
+            "small", project=self.project, num_small_vars=5
+        )
+
+    def testVariantCounts(self):
+        self.assertEqual(self.project.num_small_vars(), 15)
+        self.assertTrue(self.project.has_variants_and_variant_sets())
+        with self.assertNumQueries(1):
+            self.assertEqual(self.project.num_small_vars(), 15)
+
+    def testVariantCountsInvalidatedOnCaseSave(self):
+        self.assertEqual(self.project.num_small_vars(), 15)
+        self.case_2.num_small_vars = 0
+        self.case_2.save()
+        self.assertIsNone(ProjectCaseSummary.objects.get(project=self.project).num_small_vars)
+        self.assertEqual(self.project.num_small_vars(), 10)
+        self.assertFalse(self.project.has_variants_and_variant_sets())
+
+    def testRecomputeKeepsConcurrentInvalidation(self):
+        compute = _PROJECT_CASE_SUMMARY_COMPUTE["variants"]
+
+        def compute_and_invalidate(project):
+            result = compute(project)
+            invalidate_project_case_summary(("variants",), project_id=project.pk)
+            return result
+
+        with patch.dict(_PROJECT_CASE_SUMMARY_COMPUTE, variants=compute_and_invalidate):
+            self.assertEqual(self.project.num_small_vars(), 15)
+        summary = ProjectCaseSummary.objects.get(project=self.project)
+        self.assertIsNone(summary.num_small_vars)
+        self.assertEqual(summary.generation, 1)
+        self.assertEqual(self.project.num_small_vars(), 15)
+        self.assertEqual(ProjectCaseSummary.objects.get(project=self.project).num_small_vars, 15)
+
+    def testAnnotationCount(self):
+        flags = SmallVariantFlagsFactory(case=self.case_1)
+        SmallVariantCommentFactory(
+            case=self.case_1,
+            user=self.superuser,
+            chromosome=flags.chromosome,
+            start=flags.start,
+            reference=flags.reference,
+            alternative=flags.alternative,
+        )
+        self.assertEqual(self.project.get_annotation_count(), 1)
+        AcmgCriteriaRatingFactory(case=self.case_2)
+        StructuralVariantFlagsFactory(case=self.case_2)
+        self.assertEqual(self.project.get_annotation_count(), 3)
+        flags.delete()
+        self.assertEqual(self.project.get_annotation_count(), 3)
+        self.assertEqual(
+            self.project.get_annotation_count(),
+            self.case_1.get_annotation_count() + self.case_2.get_annotation_count(),
+        )
+
+    def testAnnotationInvalidationKeepsOtherGroups(self):
+        self.assertEqual(self.project.get_annotation_count(), 0)
+        SmallVariantFlagsFactory(case=self.case_1)
+        summary = ProjectCaseSummary.objects.get(project=self.project)
+        self.assertIsNone(summary.annotation_count)
+        self.assertEqual(summary.num_small_vars, 15)
+
+    def testSexErrors(self):
+        self.assertEqual(self.project.sex_errors(), {})
+        self.assertFalse(self.project.sex_errors_to_fix())
+        SampleVariantStatisticsFactory(
+            variant_set=self.variant_set_1, sample_name=self.case_1.index, chrx_het_hom=1.0
+        )
+        self.assertEqual(list(self.project.sex_errors()), [self.case_1.index])
+        self.assertTrue(self.project.sex_errors_to_fix())
+
+    def testStatsOfLatestVariantSets(self):
+        alignment_stats = CaseAlignmentStats.objects.create(
+            case=self.case_1, variant_set=self.variant_set_1, bam_stats={}
+        )
+        sample_stats = SampleVariantStatisticsFactory(
+            variant_set=self.variant_set_2, sample_name=self.case_2.index
+        )
+        self.assertEqual(self.project.casealignmentstats(), [alignment_stats])
+        self.assertEqual(self.project.sample_variant_stats(), [sample_stats])
+
+
+class TestSmallVariantAnnotationSummary(TestCase):
+    """Tests for the ``SmallVariantAnnotationSummary`` maintained by signal handlers."""
+
+    def setUp(self):
+        self.case, _, _ = CaseWithVariantSetFactory.get("small")
+        self.flags = SmallVariantFlagsFactory(case=self.case, flag_visual="negative")
+        self.key = {
+            "release": self.flags.release,
+            "chromosome": self.flags.chromosome,
+            "start": self.flags.start,
+            "end": self.flags.end,
+            "reference": self.flags.reference,
+            "alternative": self.flags.alternative,
+        }
+
+    def testCreate(self):
+        summary = SmallVariantAnnotationSummary.objects.get()
+        self.assertEqual(summary.case, self.case)
+        self.assertEqual(summary.comment_count, 0)
+        self.assertEqual(summary.flag_count, 1)
+        self.assertTrue(summary.flag_bookmarked)
+        self.assertFalse(summary.flag_candidate)
+        self.assertEqual(summary.flag_visual, "negative")
+        self.assertIsNone(summary.acmg_class_auto)
+        self.assertEqual(summary.date_modified, self.flags.date_modified)
+
+    def testUpdate(self):
+        SmallVariantCommentFactory(case=self.case, **self.key)
+        comment = SmallVariantCommentFactory(case=self.case, **self.key)
+        AcmgCriteriaRatingFactory(case=self.case, class_auto=3, class_override=5, **self.key)
+        self.flags.flag_bookmarked = False
+        self.flags.flag_visual = "positive"
+        self.flags.save()
+        summary = SmallVariantAnnotationSummary.objects.get()
+        self.assertEqual(summary.comment_count, 2)
+        self.assertFalse(summary.flag_bookmarked)
+        self.assertEqual(summary.flag_visual, "positive")
+        self.assertEqual((summary.acmg_class_auto, summary.acmg_class_override), (3, 5))
+        self.assertEqual(summary.date_modified, self.flags.date_modified)
+        comment.delete()
+        self.assertEqual(SmallVariantAnnotationSummary.objects.get().comment_count, 1)
+
+    def testDeleteFlags(self):
+        SmallVariantCommentFactory(case=self.case, **self.key)
+        self.flags.delete()
+        summary = SmallVariantAnnotationSummary.objects.get()
+        self.assertEqual((summary.comment_count, summary.flag_count), (1, 0))
+        self.assertIsNone(summary.flag_bookmarked)
+        self.assertIsNone(summary.flag_visual)
+
+    def testDeleteAll(self):
+        self.flags.delete()
+        self.assertEqual(SmallVariantAnnotationSummary.objects.count(), 0)
+
+    def testDeleteCase(self):
+        SmallVariantCommentFactory(case=self.case, **self.key)
+        AcmgCriteriaRatingFactory(case=self.case, **self.key)
+        self.case.delete()
+        self.assertEqual(SmallVariantAnnotationSummary.objects.count(), 0)
+
+
 class TestCleanupVariantSets(TestCase):
     def setUp(self):
         self.superuser = self.make_user("superuser")
@@ -107,3 +278,95 @@ class TestClearOldKioskCases(TestCase):
         self.assertEqual(SmallVariant.objects.all().count(), 3)
         self.assertEqual(projects[0].id, self.project_above_thres.id)
         self.assertEqual(cases[0].id, self.case_above_thres.id)
+
+    @patch("django.conf.settings.KIOSK_MODE", True)
+    def test_clear_old_kiosk_cases_inhouse_counts(self):
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set_above_thres)
+        add_variant_set_inhouse_counts(get_engine(), self.variant_set_below_thres)
+        self.assertEqual(SmallVariantSummary.objects.count(), 6)
+        clear_old_kiosk_cases()
+        self.assertEqual(SmallVariantSummary.objects.count(), 3)
+        self.assertEqual(
+            list(SmallVariantSummaryVariantSet.objects.values_list("variant_set", flat=True)),
+            [self.variant_set_above_thres.pk],
+        )
+
+    @patch("django.conf.settings.KIOSK_MODE", True)
+    def test_clear_old_kiosk_cases_allele_counts(self):
+        add_variant_set_allele_counts(get_engine(), self.variant_set_above_thres)
+        add_variant_set_allele_counts(get_engine(), self.variant_set_below_thres)
+        self.assertEqual(AlleleCount.objects.count(), 6)
+        clear_old_kiosk_cases()
+        self.assertEqual(
+            set(AlleleCount.objects.values_list("project", flat=True)),
+            {self.project_above_thres.pk},
+        )
+        self.assertEqual(
+            list(AlleleCountVariantSet.objects.values_list("variant_set", flat=True)),
+            [self.variant_set_above_thres.pk],
+        )
+
+
+class TestVariantScoresCachedAndUncachedVariants(TestCase):
+    def setUp(self):
+        self.variants = [("1", 100 + i, "A", "G") for i in range(5)]
+        for chromosome, start, reference, alternative in self.variants[:3]:
+            CaddPathogenicityScoreCache.objects.create(
+                release="GRCh37",
+                chromosome=chromosome,
+                start=start,
+                end=start,
+                bin=585,
+                reference=reference,
+                alternative=alternative,
+                info={},
+                scores=[0.1, 1.0],
+            )
+
+    def test_get_cached_and_uncached_variants(self):
+        scorer = VariantScoresCadd("GRCh37", self.variants, "cadd")
+        scorer.cache_lookup_chunk_size = 2
+        with self.assertNumQueries(3):
+            cached, uncached = scorer._get_cached_and_uncached_variants()
+        self.assertEqual(
+            sorted((r.chromosome, r.start, r.reference, r.alternative) for r in cached),
+            self.variants[:3],
+        )
+        self.assertEqual(sorted(uncached), self.variants[3:])
+
+    @patch("django.conf.settings.VARFISH_ENABLE_CADD", True)
+    @patch("django.conf.settings.VARFISH_CADD_REST_API_URL", "https://cadd.com")
+    @patch("django.conf.settings.VARFISH_CADD_MAX_VARS", 1)
+    @Mocker()
+    def test_score_uncached_variants_in_chunks(self, mock):
+        polls = {}
+
+        def _annotate(request, _context):
+            (variant,) = request.json()["variant"]
+            return json.dumps({"uuid": variant})
+
+        def _result(request, _context):
+            bgjob_uuid = request.json()["bgjob_uuid"]
+            polls[bgjob_uuid] = polls.get(bgjob_uuid, 0) + 1
+            if polls[bgjob_uuid] == 1:
+                return json.dumps({"status": "active"})
+            return json.dumps(
+                {"status": "finished", "info": {}, "scores": {bgjob_uuid: [0.2, 2.0]}}
+            )
+
+        mock.post(settings.VARFISH_CADD_REST_API_URL + "/annotate/", text=_annotate)
+        mock.post(settings.VARFISH_CADD_REST_API_URL + "/result/", text=_result)
+
+        scorer = VariantScoresCadd("GRCh37", self.variants, "cadd")
+        scorer.poll_initial_delay = 0
+        scores = sorted(
+            (s["chromosome"], s["start"], s["reference"], s["alternative"], s["score"])
+            for s in scorer.score()
+        )
+
+        self.assertEqual(
+            scores,
+            [v + (1.0,) for v in self.variants[:3]] + [v + (2.0,) for v in self.variants[3:]],
+        )
+        self.assertEqual(polls, {"1-103-A-G": 2, "1-104-A-G": 2})
+        self.assertEqual(CaddPathogenicityScoreCache.objects.count(), 5)
@@ -0,0 +1,67 @@
+"""Tests for ``variants.purge``."""
+
+from unittest.mock import patch
+
+from django.test import override_settings
+from test_plus.test import TestCase
+
+from .factories import CaseWithVariantSetFactory, SmallVariantFactory
+from ..helpers import get_engine
+from ..models import SmallVariant
+from ..purge import iter_purge, purge_rows
+
+
+class TestPurge(TestCase):
+    def setUp(self):
+        _, self.variant_set, _ = CaseWithVariantSetFactory.get("small")
+        _, self.other_variant_set, _ = CaseWithVariantSetFactory.get("small")
+        self.variants = SmallVariantFactory.create_batch(5, variant_set=self.variant_set)
+        self.other_variants = SmallVariantFactory.create_batch(
+            2, variant_set=self.other_variant_set
+        )
+
+    def testPurgeRowsInBatches(self):
+        messages = []
+        results = list(
+            iter_purge(
+                get_engine(),
+                SmallVariant.sa.table,
+                {"case_id": self.variant_set.case_id, "set_id": self.variant_set.id},
+                batch_size=2,
+                logger=messages.append,
+            )
+        )
+        id_range = self.variants[-1].id - self.variants[0].id + 1
+        self.assertEqual(len(results), (id_range + 1) // 2)
+        self.assertEqual(sum(result.rowcount for result in results), 5)
+        self.assertTrue(messages[-1].startswith("... deleted 5 rows from variants_smallvariant"))
+        self.assertEqual(
+            list(SmallVariant.objects.values_list("id", flat=True).order_by("id")),
+            [variant.id for variant in self.other_variants],
+        )
+
+    def testPurgeRowsNothingToDelete(self):
+        self.assertEqual(list(iter_purge(get_engine(), SmallVariant.sa.table, {"case_id": -1})), [])
+        self.assertEqual(SmallVariant.objects.count(), 7)
+
+    def testPurgeRowsWithoutPartitions(self):
+        purge_rows(
+            get_engine(),
+            SmallVariant.sa.table,
+            {"case_id": self.variant_set.case_id},
+            truncate_partitions=True,
+        )
+        self.assertEqual(SmallVariant.objects.count(), 2)
+
+    @override_settings(VARFISH_PURGE_BATCH_PAUSE=1)
+    @patch("variants.purge.time.sleep")
+    def testPurgeRowsInTransactionDoesNotPause(self, mock_sleep):
+        # Tests run within ``transaction.atomic()``.
+        purge_rows(
+            get_engine(),
+            SmallVariant.sa.table,
+            {"case_id": self.variant_set.case_id},
+            batch_size=1,
+        )
+        mock_sleep.assert_not_called()
+        self.assertEqual(SmallVariant.objects.count(), 2)
@@ -5,6 +5,12 @@ Remarks:
 - VCF export is only tested for case one at the moment, as it shares a major part of the implementation with
   the render and tabular file export query.
 """
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import override_settings
+
+from variants.genotype_columns import build_genotype_columns
 from variants.helpers import get_engine
 
 from clinvar.tests.factories import ClinvarFactory
@@ -12,17 +18,21 @@ from cohorts.tests.factories import TestCohortBase
 from conservation.tests.factories import KnownGeneAAFactory
 from extra_annos.tests.factories import ExtraAnnoFactory
 from frequencies.tests.factories import MitomapFactory, HelixMtDbFactory, MtDbFactory
+from genomicfeatures.tests.factories import GeneIntervalFactory
 from hgmd.tests.factories import HgmdPublicLocusFactory
 from variants.models import Case, SmallVariantSet, SmallVariantFlags
 from variants.queries import (
     CasePrefetchQuery,
     CaseExportTableQuery,
+    ExtendQueryPartsGenotypeGtDefaultFilter,
     CaseExportVcfQuery,
     CaseLoadPrefetchedQuery,
     ProjectPrefetchQuery,
     ProjectLoadPrefetchedQuery,
     KnownGeneAAQuery,
+    GeneSymbolsAtPositionsQuery,
     SmallVariantUserAnnotationQuery,
+    STATEMENT_CACHE,
 )
 from geneinfo.tests.factories import (
     HgncFactory,
@@ -47,7 +57,7 @@ from .factories import (
     SmallVariantCommentFactory,
     AcmgCriteriaRatingFactory,
 )
-from .helpers import TestBase, SupportQueryTestBase
+from .helpers import TestBase, SupportQueryTestBase, SupportQueryTransactionTestBase
 
 
 # TODO: select correct cases from multiple ones
@@ -2483,6 +2493,21 @@ class TestCaseOneQueryGenotype(SupportQueryTestBase):
         )
 
 
+class TestCaseOneQueryGenotypeColumns(TestCaseOneQueryGenotype):
+    """Test the genotype settings with the typed genotype columns."""
+
+    def setUp(self):
+        super().setUp()
+        build_genotype_columns(get_engine(), SmallVariantSet.objects.get())
+        STATEMENT_CACHE.clear()
+
+    def test_uses_genotype_columns(self):
+        extender = ExtendQueryPartsGenotypeGtDefaultFilter({}, Case.objects.get())
+        sql = str(extender._build_genotype_term(self.patient, ("0/1",)).compile(get_engine()))
+        self.assertIn("genotype_gt[", sql)
+        self.assertNotIn("genotype ->", sql)
+
+
 class TestCaseOneAllowlistBlocklistRegionFilterQuery(SupportQueryTestBase):
     """Test allowlist, blocklist and genomic region filter settings."""
 
@@ -2906,6 +2931,15 @@ class TestCaseTwoCompHetQuery(SupportQueryTestBase):
         self.assertEqual(res[1].start, self.small_vars[3].start)
 
 
+class TestCaseTwoCompHetQueryGenotypeColumns(TestCaseTwoCompHetQuery):
+    """Test the queries for compound recessive heterozygous hypothesis with the typed genotype columns"""
+
+    def setUp(self):
+        super().setUp()
+        build_genotype_columns(get_engine(), self.variant_set)
+        STATEMENT_CACHE.clear()
+
+
 class TestCaseTwoCompHetTrioNoParentsQuery(SupportQueryTestBase):
     """Test the queries for compound recessive heterozygous hypothesis"""
 
@@ -4844,6 +4878,114 @@ class TestCaseFiveQueryProject(SupportQueryTestBase):
             query_type="project",
         )
 
+    def test_stream_project_with_two_cases(self):
+        self.run_query(ProjectPrefetchQuery, {}, 3, query_type="project", stream=True)
+
+    @patch("django.conf.settings.QUERY_MAX_UNION", 1)
+    def test_stream_project_with_two_cases_merges_chunks_in_order(self):
+        results = self.run_query(ProjectPrefetchQuery, {}, 3, query_type="project", stream=True)
+        keys = [
+            (r.chromosome_no, r.start, r.end, r.reference, r.alternative, r.family_name)
+            for r in results
+        ]
+        self.assertEqual(keys, sorted(keys))
+
+    @patch("django.conf.settings.QUERY_MAX_UNION", 1)
+    def test_query_project_with_two_cases_merges_chunks_in_order(self):
+        results = self.run_query(ProjectPrefetchQuery, {}, 3, query_type="project")
+        keys = [
+            (r.chromosome_no, r.start, r.end, r.reference, r.alternative, r.family_name)
+            for r in results
+        ]
+        self.assertEqual(keys, sorted(keys))
+
+
+@override_settings(QUERY_MAX_UNION=1, QUERY_MAX_WORKERS=2)
+class TestCaseFiveQueryProjectParallel(SupportQueryTransactionTestBase):
+    """The worker threads use their own connections, so the data must be committed."""
+
+    def setUp(self):
+        super().setUp()
+        project = ProjectFactory()
+        for _ in range(3):
+            _, variant_set, _ = CaseWithVariantSetFactory.get("small", project=project)
+            SmallVariantFactory(variant_set=variant_set)
+            SmallVariantFactory(variant_set=variant_set)
+
+    def test_query_project_merges_parallel_chunks_in_order(self):
+        with patch.object(
+            CasePrefetchQuery,
+            "_execute_parallel",
+            autospec=True,
+            side_effect=CasePrefetchQuery._execute_parallel,
+        ) as mock_execute_parallel:
+            results = self.run_query(ProjectPrefetchQuery, {}, 6, query_type="project")
+        mock_execute_parallel.assert_called_once()
+        self.assertEqual(len(mock_execute_parallel.call_args[0][1]), 3)
+        keys = [
+            (r.chromosome_no, r.start, r.end, r.reference, r.alternative, r.family_name)
+            for r in results
+        ]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_query_project_parallel_matches_serial(self):
+        parallel = self.run_query(ProjectPrefetchQuery, {}, 6, query_type="project")
+        with override_settings(QUERY_MAX_WORKERS=1):
+            serial = self.run_query(ProjectPrefetchQuery, {}, 6, query_type="project")
+        self.assertEqual([tuple(r) for r in parallel], [tuple(r) for r in serial])
+
+
+class TestStreamQueryOutsideTransaction(SupportQueryTransactionTestBase):
+    """Server-side cursors must also work with Django's connection in autocommit mode."""
+
+    def setUp(self):
+        super().setUp()
+        project = ProjectFactory()
+        for _ in range(2):
+            _, variant_set, _ = CaseWithVariantSetFactory.get("small", project=project)
+            SmallVariantFactory.create_batch(2, variant_set=variant_set)
+
+    def test_stream_case(self):
+        self.assertFalse(connection.in_atomic_block)
+        self.run_query(CasePrefetchQuery, {}, 2, stream=True)
+        self.assertFalse(connection.in_atomic_block)
+
+    @override_settings(QUERY_MAX_UNION=1)
+    def test_stream_project_with_chunks(self):
+        results = self.run_query(ProjectPrefetchQuery, {}, 4, query_type="project", stream=True)
+        keys = [
+            (r.chromosome_no, r.start, r.end, r.reference, r.alternative, r.family_name)
+            for r in results
+        ]
+        self.assertEqual(keys, sorted(keys))
+        self.assertFalse(connection.in_atomic_block)
+
+
+class TestStatementCache(SupportQueryTestBase):
+    def setUp(self):
+        super().setUp()
+        _, variant_set, _ = CaseWithVariantSetFactory.get("small")
+        SmallVariantFactory(variant_set=variant_set)
+        STATEMENT_CACHE.clear()
+
+    def test_repeated_query_hits_cache(self):
+        self.run_query(CasePrefetchQuery, {}, 1)
+        self.run_query(CasePrefetchQuery, {}, 1)
+        self.assertEqual(STATEMENT_CACHE.info()["misses"], 1)
+        self.assertEqual(STATEMENT_CACHE.info()["hits"], 1)
+
+    def test_changed_kwargs_miss_cache(self):
+        self.run_query(CasePrefetchQuery, {}, 1)
+        self.run_query(CasePrefetchQuery, {"var_type_snv": False}, 0)
+        self.assertEqual(STATEMENT_CACHE.info()["misses"], 2)
+        self.assertEqual(STATEMENT_CACHE.info()["hits"], 0)
+
+    @patch("django.conf.settings.QUERY_STATEMENT_CACHE_SIZE", 0)
+    def test_disabled_cache(self):
+        self.run_query(CasePrefetchQuery, {}, 1)
+        self.run_query(CasePrefetchQuery, {}, 1)
+        self.assertEqual(STATEMENT_CACHE.info(), {"hits": 0, "misses": 0, "size": 0, "max_size": 0})
+
 
 class TestQueryCohort(TestCohortBase, SupportQueryTestBase):
     def test_prefetch_query_cohort_as_superuser(self):
@@ -4978,6 +5120,44 @@ class TestKnownGeneAAQuery(TestBase):
         )
 
 
+class TestGeneSymbolsAtPositionsQuery(TestBase):
+    """Test the batch lookup of gene symbols at positions."""
+
+    def setUp(self):
+        super().setUp()
+        self.gene1 = GeneIntervalFactory(
+            database="ensembl", chromosome="1", start=1000, end=5000, gene_id="ENSG1"
+        )
+        self.gene2 = GeneIntervalFactory(
+            database="ensembl", chromosome="1", start=4000, end=200000, gene_id="ENSG2"
+        )
+        GeneIntervalFactory(database="refseq", chromosome="1", start=1000, end=5000, gene_id="1")
+        EnsemblToGeneSymbolFactory(ensembl_gene_id="ENSG1", gene_symbol="AAA")
+        HgncFactory(ensembl_gene_id="ENSG2", symbol="BBB")
+
+    def test_query(self):
+        positions = [
+            ("GRCh37", "1", 2000, 2000),
+            ("GRCh37", "1", 4500, 4501),
+            ("GRCh37", "1", 150000, 150000),
+            ("GRCh37", "1", 300000, 300000),
+            ("GRCh37", "2", 2000, 2000),
+        ]
+        self.assertEqual(
+            GeneSymbolsAtPositionsQuery(get_engine()).run(positions),
+            {
+                positions[0]: {"AAA"},
+                positions[1]: {"AAA", "BBB"},
+                positions[2]: {"BBB"},
+                positions[3]: set(),
+                positions[4]: set(),
+            },
+        )
+
+    def test_query_empty(self):
+        self.assertEqual(GeneSymbolsAtPositionsQuery(get_engine()).run([]), {})
+
+
 class TestSmallVariantUserAnnotationQueryWithFlagsOnly(TestBase):
     """Test the SmallVariantUserAnnotationQuery class."""
 
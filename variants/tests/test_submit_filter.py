@@ -393,3 +393,12 @@ class ProjectCasesFilterTest(TestCase):
 
         self.assertEqual(ProjectCasesSmallVariantQuery.objects.count(), 1)
         self.assertEqual(ProjectCasesSmallVariantQuery.objects.first().query_results.count(), 6)
+
+    @patch("django.conf.settings.QUERY_RESULTS_COPY_THRESHOLD", 1)
+    def test_submit_projectcases_filter_copy_results(self):
+        # Running the query again must replace the stored results.
+        for _ in range(2):
+            ProjectCasesFilter(self.bgjob, self.bgjob.projectcasessmallvariantquery).run()
+
+        self.assertEqual(ProjectCasesSmallVariantQuery.objects.count(), 1)
+        self.assertEqual(ProjectCasesSmallVariantQuery.objects.first().query_results.count(), 6)
@@ -0,0 +1,63 @@
+"""Tests for ``variants.variant_set_counts``."""
+
+from django.test import override_settings
+from test_plus.test import TestCase
+
+from beaconsite.models import AlleleCount, AlleleCountVariantSet
+from .factories import CaseWithVariantSetFactory, SmallVariantFactory
+from ..helpers import get_engine
+from ..models import SmallVariantSummary, SmallVariantSummaryVariantSet
+from ..variant_set_counts import (
+    add_variant_set_counts,
+    remove_case_counts,
+    remove_variant_set_counts,
+)
+
+
+class TestVariantSetCounts(TestCase):
+    def setUp(self):
+        self.case, self.variant_set, _ = CaseWithVariantSetFactory.get("small")
+        SmallVariantFactory.create_batch(2, variant_set=self.variant_set)
+
+    def test_add_variant_set(self):
+        messages = []
+        add_variant_set_counts(get_engine(), self.variant_set, logger=messages.append)
+
+        self.assertEqual(SmallVariantSummary.objects.count(), 2)
+        self.assertEqual(AlleleCount.objects.count(), 2)
+        self.assertEqual(
+            [message.split(" in ")[0] for message in messages],
+            [
+                "Updating beacon allele counts...",
+                "Finished updating beacon allele counts",
+                "Updating in-house counts...",
+                "Finished updating in-house counts",
+            ],
+        )
+
+    @override_settings(VARFISH_ENABLE_BEACON_SITE=False)
+    def test_add_variant_set_beacon_disabled(self):
+        add_variant_set_counts(get_engine(), self.variant_set)
+
+        self.assertEqual(SmallVariantSummary.objects.count(), 2)
+        self.assertEqual(AlleleCount.objects.count(), 0)
+
+    def test_remove_variant_set(self):
+        add_variant_set_counts(get_engine(), self.variant_set)
+
+        remove_variant_set_counts(get_engine(), self.variant_set)
+
+        self.assertEqual(SmallVariantSummary.objects.count(), 0)
+        self.assertEqual(SmallVariantSummaryVariantSet.objects.count(), 0)
+        self.assertEqual(AlleleCount.objects.count(), 0)
+        self.assertEqual(AlleleCountVariantSet.objects.count(), 0)
+
+    def test_remove_case(self):
+        add_variant_set_counts(get_engine(), self.variant_set)
+
+        remove_case_counts(get_engine(), self.case)
+        # Removing the case again does not change the counts.
+        remove_case_counts(get_engine(), self.case)
+
+        self.assertEqual(SmallVariantSummary.objects.count(), 0)
+        self.assertEqual(AlleleCount.objects.count(), 0)
@@ -0,0 +1,155 @@
+"""Tests for ``variants.variant_stats``."""
+
+from django.db import connection
+from django.test import TransactionTestCase
+import numpy as np
+from test_plus.test import TestCase
+
+from var_stats_qc.models import ReferenceSite
+from variants.helpers import get_engine
+from variants.tests.factories import (
+    CaseWithVariantSetFactory,
+    ProjectFactory,
+    SmallVariantFactory,
+)
+
+from ..models import ProjectVariantStats, SampleSiteGenotypes
+from ..variant_stats import (
+    gather_variant_stats,
+    rebuild_project_variant_stats,
+    update_project_variant_stats,
+)
+
+
+def relatedness_values(stats):
+    """Return ``dict`` mapping sorted sample pairs to their relatedness counts."""
+    result = {}
+    for rel in stats.relatedness.all():
+        (sample1, het_1), (sample2, het_2) = sorted(
+            ((rel.sample1, rel.het_1), (rel.sample2, rel.het_2))
+        )
+        result[(sample1, sample2)] = (het_1, het_2, rel.het_1_2, rel.n_ibs0, rel.n_ibs1, rel.n_ibs2)
+    return result
+
+
+class GatherVariantStatsTestMixin:
+    def setUp(self):
+        self.case, self.variant_set, _ = CaseWithVariantSetFactory.get("small", structure="trio")
+        self.dps = [3, 10, 10, 25, 60, 250]
+        for dp in self.dps:
+            SmallVariantFactory(
+                variant_set=self.variant_set,
+                genotypes=lambda dp=dp: iter(
+                    [{"gt": "0/1", "dp": dp}, {"gt": "0/0", "dp": dp}, {"gt": "1/1", "dp": dp}]
+                ),
+                var_type="snv",
+                ensembl_effect=["missense_variant"],
+            )
+
+    def test_gather_variant_stats(self):
+        (
+            _transitions,
+            _transversions,
+            snvs,
+            _indels,
+            _mnvs,
+            effect_counts,
+            _indel_sizes,
+            read_depths,
+            dp_quantiles,
+            het_ratio,
+        ) = gather_variant_stats(self.variant_set)
+        index = self.case.index
+        self.assertEqual(snvs[index], 6)
+        self.assertEqual(effect_counts[index]["missense_variant"], 6)
+        self.assertEqual(read_depths[index], {3: 1, 10: 2, 24: 1, 60: 1, 200: 1})
+        self.assertEqual(
+            dp_quantiles[index], list(np.percentile(np.asarray(self.dps), [0, 25, 50, 75, 100]))
+        )
+        self.assertEqual(het_ratio[index], 1.0)
+
+
+class TestGatherVariantStats(GatherVariantStatsTestMixin, TestCase):
+    pass
+
+
+class TestGatherVariantStatsOutsideTransaction(GatherVariantStatsTestMixin, TransactionTestCase):
+    """The variants are streamed through a server-side cursor also when in autocommit mode."""
+
+    def test_gather_variant_stats(self):
+        self.assertFalse(connection.in_atomic_block)
+        super().test_gather_variant_stats()
+        self.assertFalse(connection.in_atomic_block)
+
+
+class TestUpdateProjectVariantStats(TestCase):
+    def setUp(self):
+        self.user = self.make_user("superuser")
+        self.project = ProjectFactory()
+        self.sites = list(
+            ReferenceSite.objects.filter(release="GRCh37", chromosome="1").order_by("start")[:5]
+        )
+        self.case1, self.variant_set1 = self._create_case()
+        self.case2, self.variant_set2 = self._create_case()
+
+    def _create_case(self):
+        case, variant_set, _ = CaseWithVariantSetFactory.get(
+            "small", project=self.project, structure="trio"
+        )
+        for site in self.sites:
+            SmallVariantFactory(
+                variant_set=variant_set,
+                chromosome=site.chromosome,
+                start=site.start,
+                reference=site.reference,
+                alternative=site.alternative,
+            )
+        return case, variant_set
+
+    def test_rebuild(self):
+        stats = rebuild_project_variant_stats(get_engine(), self.project, self.user)
+        # Pairs of six samples, of which two are het. at all sites and the others hom. ref.
+        self.assertEqual(stats.relatedness.count(), 15)
+        values = relatedness_values(stats)
+        self.assertEqual(
+            values[tuple(sorted((self.case1.index, self.case2.index)))], (5, 5, 5, 0, 0, 5)
+        )
+        self.assertEqual(SampleSiteGenotypes.objects.count(), 6)
+        self.assertEqual(
+            set(stats.variant_sets.all()), {self.variant_set1, self.variant_set2},
+        )
+
+    def test_update_added_case(self):
+        stats = rebuild_project_variant_stats(get_engine(), self.project, self.user)
+        old_ids = set(stats.relatedness.values_list("id", flat=True))
+        _, variant_set3 = self._create_case()
+
+        stats = update_project_variant_stats(get_engine(), self.project, self.user)
+
+        # The pairs of the existing samples were kept and only the pairs with new samples were added.
+        self.assertEqual(stats.relatedness.count(), 36)
+        self.assertTrue(old_ids < set(stats.relatedness.values_list("id", flat=True)))
+        self.assertIn(variant_set3, stats.variant_sets.all())
+        self.assertEqual(
+            relatedness_values(stats),
+            relatedness_values(
+                rebuild_project_variant_stats(get_engine(), self.project, self.user)
+            ),
+        )
+
+    def test_update_removed_case(self):
+        rebuild_project_variant_stats(get_engine(), self.project, self.user)
+        samples2 = self.case2.get_members_with_samples()
+        self.case2.delete()
+
+        stats = update_project_variant_stats(get_engine(), self.project, self.user)
+
+        self.assertEqual(stats.relatedness.count(), 3)
+        for rel in stats.relatedness.all():
+            self.assertNotIn(rel.sample1, samples2)
+            self.assertNotIn(rel.sample2, samples2)
+
+    def test_update_without_stats(self):
+        stats = update_project_variant_stats(get_engine(), self.project, self.user)
+        self.assertEqual(ProjectVariantStats.objects.count(), 1)
+        self.assertEqual(stats.relatedness.count(), 15)
@@ -28,6 +28,7 @@ from frequencies.tests.factories import (
     HelixMtDbFactory,
     MtDbFactory,
 )
+from genomicfeatures.tests.factories import GeneIntervalFactory
 from geneinfo.tests.factories import (
     HpoFactory,
     HgncFactory,
@@ -149,6 +150,43 @@ class TestCaseListView(ViewTestBase):
             self.assertEqual(len(response.context["case_list"]), 0)
 
 
+class TestCaseListGetAnnotationsView(ViewTestBase):
+    """Test the annotation list of the case list."""
+
+    def setUp(self):
+        super().setUp()
+        self.case, _, _ = CaseWithVariantSetFactory.get("small")
+        self.flags = SmallVariantFlagsFactory(case=self.case, chromosome="1", start=2000)
+        self.comment = SmallVariantCommentFactory(
+            case=self.case,
+            user=self.superuser,
+            chromosome="1",
+            start=2000,
+            reference=self.flags.reference,
+            alternative=self.flags.alternative,
+        )
+        GeneIntervalFactory(
+            database="ensembl", chromosome="1", start=1000, end=5000, gene_id="ENSG1"
+        )
+        EnsemblToGeneSymbolFactory(ensembl_gene_id="ENSG1", gene_symbol="AAA")
+
+    def test_render(self):
+        with self.login(self.superuser):
+            response = self.client.get(
+                reverse(
+                    "variants:case-list-get-annotations",
+                    kwargs={"project": self.case.project.sodar_uuid},
+                )
+            )
+        self.assertEqual(response.status_code, 200)
+        commentsflags = response.context["commentsflags"]
+        key = ("1", 2000, self.flags.reference, self.flags.alternative)
+        self.assertEqual(list(commentsflags), [key])
+        self.assertEqual(commentsflags[key][self.case]["genes"], ["AAA"])
+        self.assertEqual(len(commentsflags[key][self.case]["comments"]), 1)
+        self.assertIsNotNone(commentsflags[key][self.case]["flags"])
+
+
 class TestCaseListQcStatsApiView(ViewTestBase):
     """Test the QC API view for case lists."""
 
@@ -3369,7 +3407,32 @@ class TestExportFileJobDownloadViewResult(ViewTestBase):
                 )
             )
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(response.content, self.results.payload)
+            self.assertEqual(b"".join(response.streaming_content), b"Testcontent")
+            self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_download_range(self):
+        """Test download of byte ranges"""
+        url = reverse(
+            "variants:export-job-download",
+            kwargs={
+                "project": self.results.job.project.sodar_uuid,
+                "job": self.results.job.sodar_uuid,
+            },
+        )
+        with self.login(self.superuser):
+            for range_header, content, content_range in (
+                ("bytes=4-6", b"con", "bytes 4-6/11"),
+                ("bytes=4-", b"content", "bytes 4-10/11"),
+                ("bytes=-3", b"ent", "bytes 8-10/11"),
+                ("bytes=8-100", b"ent", "bytes 8-10/11"),
+            ):
+                response = self.client.get(url, HTTP_RANGE=range_header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b"".join(response.streaming_content), content)
+                self.assertEqual(response["Content-Range"], content_range)
+            response = self.client.get(url, HTTP_RANGE="bytes=11-")
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response["Content-Range"], "bytes */11")
 
 
 class TestExportProjectCasesFileJobResubmitView(ViewTestBase):
@@ -3462,7 +3525,8 @@ class TestExportProjectCasesFileJobDownloadViewResult(ViewTestBase):
                 )
             )
             self.assertEqual(response.status_code, 200)
-            self.assertEqual(response.content, self.results.payload)
+            self.assertEqual(b"".join(response.streaming_content), b"Testcontent")
+            self.assertEqual(response["Accept-Ranges"], "bytes")
 
 
 class TestProjectStatsJobCreateView(ViewTestBase):
@@ -0,0 +1,153 @@
+"""Maintenance of the counts that are summed over small variant sets and updated incrementally.
+
+Both the in-house counts (``SmallVariantSummary``, see ``inhouse_counts``) and the beacon allele counts
+(``AlleleCount``, see ``beaconsite.allele_counts``) hold the counts of a variant summed over variant sets.  The
+counts of a variant set are added once it is active and subtracted again before its variants are removed.  A
+marker model records which variant sets are currently counted, so adding and removing a variant set is
+idempotent.
+"""
+
+from django.db import transaction
+from django.utils import timezone
+from sqlalchemy import and_, delete, update
+from sqlalchemy.dialects.postgresql import insert
+
+from .models import SmallVariantSet
+
+
+class VariantSetCounts:
+    """Base class for a table of counts summed over small variant sets.
+
+    Sub classes provide the models, the columns, and ``counts_stmt()`` that sums the counts of one variant set.
+    """
+
+    #: Human-readable name used in log messages.
+    title = None
+    #: The model of the counts.
+    model = None
+    #: The model recording the counted variant sets.
+    counted_model = None
+    #: The columns identifying a row of the counts, these have a unique index.
+    key_columns = ()
+    #: Further columns that are set when inserting a row.
+    extra_columns = ()
+    #: The count columns.
+    count_columns = ()
+
+    def is_enabled(self):
+        """Return whether the counts are maintained."""
+        return True
+
+    def counts_stmt(self, variant_set):
+        """Return statement that sums the counts of ``variant_set``.
+
+        The statement selects the ``key_columns``, ``extra_columns``, and ``count_columns`` in this order.
+        """
+        raise NotImplementedError("Override me!")
+
+    def lock(self, engine):
+        """Serialize concurrent updates of the counts, if necessary."""
+
+    def add_variant_set(self, engine, variant_set):
+        """Add the counts of the active ``variant_set`` unless they are counted already."""
+        if not self.is_enabled():
+            return
+        with transaction.atomic():
+            self.lock(engine)
+            self._add_variant_set(engine, variant_set)
+
+    def _add_variant_set(self, engine, variant_set):
+        _, created = self.counted_model.objects.get_or_create(variant_set=variant_set)
+        if not created:
+            return
+        table = self.model.sa.table
+        stmt = insert(table).from_select(
+            list(self.key_columns + self.extra_columns + self.count_columns),
+            self.counts_stmt(variant_set),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(self.key_columns),
+            set_={name: table.c[name] + stmt.excluded[name] for name in self.count_columns},
+        )
+        engine.execute(stmt)
+
+    def remove_variant_set(self, engine, variant_set):
+        """Subtract the counts of ``variant_set`` if they are counted.
+
+        This must be called before the variants are deleted.
+        """
+        with transaction.atomic():
+            self.lock(engine)
+            deleted, _ = self.counted_model.objects.filter(variant_set=variant_set).delete()
+            if not deleted:
+                return
+            table = self.model.sa.table
+            counts = self.counts_stmt(variant_set).alias("counts")
+            same_key = [table.c[name] == counts.c[name] for name in self.key_columns]
+            engine.execute(
+                update(table)
+                .values({name: table.c[name] - counts.c[name] for name in self.count_columns})
+                .where(and_(*same_key))
+            )
+            engine.execute(
+                delete(table).where(
+                    and_(*same_key, *[table.c[name] == 0 for name in self.count_columns])
+                )
+            )
+
+    def rebuild(self, engine, variant_sets, counts=None, counted=None):
+        """Replace the ``counts`` and ``counted`` variant sets (default: all) by the counts of ``variant_sets``."""
+        with transaction.atomic():
+            self.lock(engine)
+            (self.model.objects.all() if counts is None else counts).delete()
+            (self.counted_model.objects.all() if counted is None else counted).delete()
+            for variant_set in variant_sets:
+                self._add_variant_set(engine, variant_set)
+
+    def remove_case(self, engine, case):
+        """Subtract the counts of the counted variant sets of ``case``.
+
+        This must be called before the variants are deleted.
+        """
+        for variant_set in SmallVariantSet.objects.filter(
+            case=case, pk__in=self.counted_model.objects.values("variant_set_id")
+        ).select_related("case"):
+            self.remove_variant_set(engine, variant_set)
+
+
+def _get_all_counts():
+    # This must be imported here to circumvent cyclic dependencies
+    from beaconsite.allele_counts import ALLELE_COUNTS  # noqa
+    from .inhouse_counts import INHOUSE_COUNTS  # noqa
+
+    return (ALLELE_COUNTS, INHOUSE_COUNTS)
+
+
+def add_variant_set_counts(engine, variant_set, logger=lambda _: None):
+    """Add the active ``variant_set`` to all counts that are maintained."""
+    for counts in _get_all_counts():
+        if not counts.is_enabled():
+            continue
+        before = timezone.now()
+        logger("Updating %s..." % counts.title)
+        counts.add_variant_set(engine, variant_set)
+        elapsed = timezone.now() - before
+        logger("Finished updating %s in %.2f s" % (counts.title, elapsed.total_seconds()))
+
+
+def remove_variant_set_counts(engine, variant_set):
+    """Subtract ``variant_set`` from all counts.
+
+    This must be called before the variants are deleted.
+    """
+    for counts in _get_all_counts():
+        counts.remove_variant_set(engine, variant_set)
+
+
+def remove_case_counts(engine, case):
+    """Subtract the counted variant sets of ``case`` from all counts.
+
+    This must be called before the variants are deleted.
+    """
+    for counts in _get_all_counts():
+        counts.remove_case(engine, case)
@@ -1,14 +1,32 @@
 """Helper code for creating/updating ``CaseVariantStats`` and related records."""
 
+from itertools import chain
+import math
+
 from django.db import transaction
-import numpy as np
+from sqlalchemy import and_, select
 
 from projectroles.plugins import get_backend_api
-from var_stats_qc.qc import compute_het_hom_chrx, compute_relatedness, compute_relatedness_many
+from varfish.utils import LazyModule
+from var_stats_qc.qc import (
+    compute_het_hom_chrx,
+    compute_relatedness,
+    compute_site_genotypes,
+    compute_site_genotype_relatedness,
+    get_reference_site_index,
+)
 
 from .forms import FILTER_FORM_TRANSLATE_EFFECTS
-from .models import SmallVariant, CaseVariantStats, ProjectVariantStats
+from .helpers import get_engine, stream_connection
+from .models import (
+    SmallVariant,
+    CaseVariantStats,
+    ProjectVariantStats,
+    ProjectRelatedness,
+    SampleSiteGenotypes,
+)
 
+np = LazyModule("numpy")
 
 #: Effects to ignore when computing stats.
 IGNORE_EFFECTS = (
@@ -43,8 +61,59 @@ def _get_dp_bin(dp):
         return 200
 
 
-def gather_variant_stats(variant_set):
-    """Iterate over ``SmallVariant`` objects of ``variant_set`` and collect various statistics."""
+def _dp_quantiles(dp_counts, percentiles=(0, 25, 50, 75, 100)):
+    """Compute the ``percentiles`` of the read depths counted in ``dp_counts`` (mapping depth to count).
+
+    This gives the same result as ``numpy.percentile()`` (with linear interpolation) on the list of read
+    depths without materializing it.
+    """
+    if not dp_counts:
+        return [0] * len(percentiles)
+    values = sorted(dp_counts)
+    cum_counts = np.cumsum([dp_counts[value] for value in values])
+    total = int(cum_counts[-1])
+
+    def value_at(rank):
+        return values[int(np.searchsorted(cum_counts, rank, side="right"))]
+
+    result = []
+    for percentile in percentiles:
+        pos = (total - 1) * percentile / 100
+        lower = math.floor(pos)
+        lower_value = value_at(lower)
+        upper_value = value_at(min(lower + 1, total - 1))
+        result.append(float(lower_value + (pos - lower) * (upper_value - lower_value)))
+    return result
+
+
+def _gather_variant_stats_stmt(variant_set):
+    """Build SQL Alchemy statement selecting the columns of ``variant_set``'s variants needed for statistics."""
+    return (
+        select(
+            [
+                SmallVariant.sa.var_type,
+                SmallVariant.sa.reference,
+                SmallVariant.sa.alternative,
+                SmallVariant.sa.ensembl_effect,
+                SmallVariant.sa.genotype,
+            ]
+        )
+        .select_from(SmallVariant.sa.table)
+        .where(
+            and_(
+                SmallVariant.sa.set_id == variant_set.pk,
+                SmallVariant.sa.case_id == variant_set.case.pk,
+            )
+        )
+    )
+
+
+def gather_variant_stats(variant_set, engine=None):
+    """Iterate over ``SmallVariant`` records of ``variant_set`` and collect various statistics.
+
+    Only the required columns are streamed from the database through a server-side cursor and read depths
+    are accumulated as histograms such that memory usage does not depend on the number of variants.
+    """
     # TODO: could be refactored into class with multiple smaller, easier-to-read functions
     samples = variant_set.case.get_members_with_samples()
     transitions = {name: 0 for name in samples}
@@ -58,57 +127,52 @@ def gather_variant_stats(variant_set):
     max_indel_size = 10
     indel_sizes = {name: {} for name in samples}
     read_depths = {name: {} for name in samples}
-    dps = {name: [] for name in samples}
+    dp_counts = {name: {} for name in samples}
     hets = {name: 0 for name in samples}
     homs = {name: 0 for name in samples}
 
     ignore_set = set(IGNORE_EFFECTS)
-    for small_var in SmallVariant.objects.filter(
-        set_id=variant_set.pk, case_id=variant_set.case.pk
-    ).iterator():
-        if not (set(small_var.ensembl_effect) & ignore_set):
-            for sample in samples:
-                if small_var.genotype[sample]["gt"].count("1") == 1:
-                    hets[sample] += 1
-                else:
-                    homs[sample] += 1
-                dps[sample].append(small_var.genotype[sample]["dp"])
-                bin = _get_dp_bin(small_var.genotype[sample]["dp"])
-                read_depths[sample].setdefault(bin, 0)
-                read_depths[sample][bin] += 1
-                for effect in small_var.ensembl_effect:
-                    effect_counts[sample][effect] += small_var.genotype[sample]["gt"].count("1")
-            if small_var.var_type == "snv":
+    engine = engine or get_engine()
+    with stream_connection(engine) as connection:
+        for small_var in connection.execute(_gather_variant_stats_stmt(variant_set)):
+            if not (set(small_var.ensembl_effect) & ignore_set):
                 for sample in samples:
-                    snvs[sample] += small_var.genotype[sample]["gt"].count("1")
-                if (small_var.reference, small_var.alternative) in TRANSITIONS:
+                    if small_var.genotype[sample]["gt"].count("1") == 1:
+                        hets[sample] += 1
+                    else:
+                        homs[sample] += 1
+                    dp = small_var.genotype[sample]["dp"]
+                    dp_counts[sample][dp] = dp_counts[sample].get(dp, 0) + 1
+                    bin = _get_dp_bin(dp)
+                    read_depths[sample].setdefault(bin, 0)
+                    read_depths[sample][bin] += 1
+                    for effect in small_var.ensembl_effect:
+                        effect_counts[sample][effect] += small_var.genotype[sample]["gt"].count("1")
+                if small_var.var_type == "snv":
                     for sample in samples:
-                        transitions[sample] += small_var.genotype[sample]["gt"].count("1")
-                else:
+                        snvs[sample] += small_var.genotype[sample]["gt"].count("1")
+                    if (small_var.reference, small_var.alternative) in TRANSITIONS:
+                        for sample in samples:
+                            transitions[sample] += small_var.genotype[sample]["gt"].count("1")
+                    else:
+                        for sample in samples:
+                            transversions[sample] += small_var.genotype[sample]["gt"].count("1")
+                elif small_var.var_type == "mnvs":
                     for sample in samples:
-                        transversions[sample] += small_var.genotype[sample]["gt"].count("1")
-            elif small_var.var_type == "mnvs":
-                for sample in samples:
-                    mnvs[sample] += small_var.genotype[sample]["gt"].count("1")
-            elif small_var.var_type == "indel":
-                for sample in samples:
-                    count = small_var.genotype[sample]["gt"].count("1")
-                    indels[sample] += count
-                    delta = len(small_var.reference) - len(small_var.alternative)
-                    if delta > max_indel_size:
-                        delta = max_indel_size
-                    elif delta < -max_indel_size:
-                        delta = -max_indel_size
-                    indel_sizes[sample].setdefault(delta, 0)
-                    indel_sizes[sample][delta] += count
-
-    dp_quantiles = {}
-    for sample in samples:
-        if dps[sample]:
-            arr = np.asarray(dps[sample])
-            dp_quantiles[sample] = list(np.percentile(arr, [0, 25, 50, 75, 100]))
-        else:
-            dp_quantiles[sample] = [0] * 5
+                        mnvs[sample] += small_var.genotype[sample]["gt"].count("1")
+                elif small_var.var_type == "indel":
+                    for sample in samples:
+                        count = small_var.genotype[sample]["gt"].count("1")
+                        indels[sample] += count
+                        delta = len(small_var.reference) - len(small_var.alternative)
+                        if delta > max_indel_size:
+                            delta = max_indel_size
+                        elif delta < -max_indel_size:
+                            delta = -max_indel_size
+                        indel_sizes[sample].setdefault(delta, 0)
+                        indel_sizes[sample][delta] += count
+
+    dp_quantiles = {sample: _dp_quantiles(dp_counts[sample]) for sample in samples}
 
     het_ratio = {}
     for sample in samples:
@@ -150,7 +214,7 @@ def rebuild_case_variant_stats(engine, variant_set, logger=lambda _: None):
         read_depths,
         dp_quantiles,
         het_ratio,
-    ) = gather_variant_stats(variant_set)
+    ) = gather_variant_stats(variant_set, engine)
 
     # Rebuild the case variant statistics atomically.
     with transaction.atomic():
@@ -199,7 +263,98 @@ def rebuild_case_variant_stats(engine, variant_set, logger=lambda _: None):
         return stats
 
 
-def rebuild_project_variant_stats(engine, project, user, logger=lambda _: None):
+def get_site_genotypes(engine, variant_set, site_index, recompute=False):
+    """Return the genotype vectors of the samples in ``variant_set`` at the reference sites.
+
+    The vectors are read from ``SampleSiteGenotypes`` if present and computed and stored otherwise (or if
+    ``recompute`` is set).  Return ``dict`` mapping sample name to vector and flag whether the vectors were
+    computed.
+    """
+    samples = variant_set.case.get_members_with_samples()
+    stored = {
+        record.sample_name: record.get_genotypes() for record in variant_set.site_genotypes.all()
+    }
+    if (
+        not recompute
+        and sorted(stored) == samples
+        and all(len(genotypes) == len(site_index) for genotypes in stored.values())
+    ):
+        return stored, False
+    site_genotypes = compute_site_genotypes(
+        engine, SmallVariant, variant_set, site_index=site_index
+    )
+    with transaction.atomic():
+        variant_set.site_genotypes.all().delete()
+        SampleSiteGenotypes.objects.bulk_create(
+            [
+                SampleSiteGenotypes(
+                    variant_set=variant_set, sample_name=sample, genotypes=genotypes.tobytes()
+                )
+                for sample, genotypes in site_genotypes.items()
+            ]
+        )
+    return site_genotypes, True
+
+
+def _update_project_relatedness(engine, project, logger, rebuild):
+    """Update the project-wide relatedness for the samples of added, updated, and removed cases.
+
+    Only the pairs involving samples of variant sets that were not included before are computed and pairs of
+    samples that are not present any more are removed.  If ``rebuild`` is set then all pairs and genotype
+    vectors are computed from scratch.
+    """
+    stats, _ = ProjectVariantStats.objects.get_or_create(project=project)
+    if rebuild:
+        stats.relatedness.all().delete()
+        stats.variant_sets.clear()
+    included_ids = set(stats.variant_sets.values_list("id", flat=True))
+
+    # Obtain genotype vectors of all samples, split into included and new ones, by release.
+    site_indices = {}
+    variant_sets = []
+    included = {}
+    added = {}
+    for case in project.case_set.all():
+        variant_set = case.latest_variant_set
+        if not variant_set:
+            continue
+        variant_sets.append(variant_set)
+        if variant_set.release not in site_indices:
+            site_indices[variant_set.release] = get_reference_site_index(
+                engine, variant_set.release
+            )
+        site_genotypes, computed = get_site_genotypes(
+            engine, variant_set, site_indices[variant_set.release], recompute=rebuild
+        )
+        if computed or variant_set.id not in included_ids:
+            logger("... adding samples of case %s" % case.name)
+            added.setdefault(variant_set.release, {}).update(site_genotypes)
+        else:
+            included.setdefault(variant_set.release, {}).update(site_genotypes)
+
+    # Remove pairs with samples of removed or updated cases.
+    kept_samples = set(chain(*included.values()))
+    stats.relatedness.exclude(sample1__in=kept_samples, sample2__in=kept_samples).delete()
+
+    # Compute pairs of new samples with each other and the included ones.
+    relatedness = {}
+    for release, site_genotypes in added.items():
+        relatedness.update(compute_site_genotype_relatedness(site_genotypes))
+        relatedness.update(
+            compute_site_genotype_relatedness(site_genotypes, included.get(release, {}))
+        )
+    logger("... storing relatedness of %d new sample pairs" % len(relatedness))
+    ProjectRelatedness.objects.bulk_create(
+        [
+            ProjectRelatedness(stats=stats, sample1=sample1, sample2=sample2, **values)
+            for (sample1, sample2), values in relatedness.items()
+        ]
+    )
+    stats.variant_sets.set(variant_sets)
+    return stats
+
+
+def _build_project_variant_stats(engine, project, user, logger, rebuild):
     timeline = get_backend_api("timeline_backend")
     if timeline:
         tl_event = timeline.add_event(
@@ -207,37 +362,13 @@ def rebuild_project_variant_stats(engine, project, user, logger=lambda _: None):
             app_name="variants",
             user=user,
             event_name="project_stats_build",
-            description="build project-wide variant statistics",
+            description="%s project-wide variant statistics" % ("build" if rebuild else "update"),
             status_type="INIT",
         )
-    cases = project.case_set.all()
-    with transaction.atomic():
-        het, het_shared, ibs0, ibs1, ibs2 = compute_relatedness_many(engine, SmallVariant, cases)
-    logger("Done computing relatedness, now saving to DB")
     try:
         with transaction.atomic():
-            # Remove existing record if any.
-            try:
-                project.variant_stats.delete()
-            except ProjectVariantStats.DoesNotExist:
-                pass  # swallow, nothing to delete
-            else:
-                logger("Done removing old statistics")
-
-            # Create statistics object.
-            stats = ProjectVariantStats.objects.create(project=project)
-            # Insert relatedness information
-            for pair in het_shared.keys():
-                stats.relatedness.create(
-                    sample1=pair[0],
-                    sample2=pair[1],
-                    het_1_2=het_shared[pair],
-                    het_1=het[pair[0]],
-                    het_2=het[pair[1]],
-                    n_ibs0=ibs0[pair],
-                    n_ibs1=ibs1[pair],
-                    n_ibs2=ibs2[pair],
-                )
+            stats = _update_project_relatedness(engine, project, logger, rebuild)
+            logger("Done updating relatedness")
             if timeline:
                 tl_event.set_status("OK", "finished storing new project-wide variant statistics")
             return stats
@@ -249,11 +380,25 @@ def rebuild_project_variant_stats(engine, project, user, logger=lambda _: None):
         raise
 
 
+def rebuild_project_variant_stats(engine, project, user, logger=lambda _: None):
+    """Rebuild the ``ProjectVariantStats`` for the given ``project`` from scratch."""
+    return _build_project_variant_stats(engine, project, user, logger, rebuild=True)
+
+
+def update_project_variant_stats(engine, project, user, logger=lambda _: None):
+    """Update the ``ProjectVariantStats`` for the given ``project`` with the changes since the last update.
+
+    Only the relatedness of samples from added or re-imported cases is computed and the relatedness of samples
+    from removed cases is removed.
+    """
+    return _build_project_variant_stats(engine, project, user, logger, rebuild=False)
+
+
 def execute_rebuild_project_variant_stats_job(engine, stats_job):
-    """Rebuild the ``ProjectVariantStats`` for the given ``project"""
+    """Update the ``ProjectVariantStats`` for the given ``project``"""
     stats_job.mark_start()
     try:
-        stats = rebuild_project_variant_stats(
+        stats = update_project_variant_stats(
             engine, stats_job.project, stats_job.bg_job.user, stats_job.add_log_entry
         )
         stats_job.mark_success()
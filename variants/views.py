@@ -8,12 +8,11 @@ import contextlib
 
 import decimal
 
-import binning
-import numpy as np
 import requests
 from base64 import b64encode
 
-from variants.helpers import get_engine
+from variants.helpers import VARIANT_KEYS, get_engine, load_model_records, variant_condition
+from sqlalchemy import and_
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.humanize.templatetags.humanize import naturaltime
@@ -21,7 +20,13 @@ from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db.models import Q
 from django.forms.models import model_to_dict
-from django.http import HttpResponse, Http404, JsonResponse
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    Http404,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404, reverse
 from django.utils import timezone
@@ -35,7 +40,6 @@ from django.views.generic import (
     TemplateView,
 )
 from django.views.generic.detail import SingleObjectMixin, SingleObjectTemplateResponseMixin
-import xlsxwriter
 
 import simplejson as json
 from django.views.generic.edit import FormMixin
@@ -46,6 +50,7 @@ from projectroles.templatetags.projectroles_common_tags import site_version
 from bgjobs.models import BackgroundJob
 from bgjobs.views import DEFAULT_PAGINATION as BGJOBS_DEFAULT_PAGINATION
 from clinvar.models import Clinvar
+from conservation.models import KnowngeneAA
 from cohorts.models import Cohort
 from extra_annos.views import ExtraAnnosMixin, ExtraAnnoField
 from frequencies.models import MT_DB_INFO
@@ -55,8 +60,6 @@ from geneinfo.models import (
     NcbiGeneRif,
     HpoName,
     Hpo,
-    EnsemblToGeneSymbol,
-    Hgnc,
     build_entrez_id_to_symbol,
 )
 from frequencies.views import FrequencyMixin
@@ -70,12 +73,14 @@ from projectroles.views import (
 )
 from projectroles.plugins import get_backend_api, get_active_plugins
 
-from genomicfeatures.models import GeneInterval
 from varfish.users.models import User
+from varfish.utils import LazyModule
+from .variant_set_counts import remove_case_counts
 from .queries import (
     CaseLoadPrefetchedQuery,
     ProjectLoadPrefetchedQuery,
     KnownGeneAAQuery,
+    GeneSymbolsAtPositionsQuery,
     DeleteStructuralVariantsQuery,
     DeleteSmallVariantsQuery,
     SmallVariantUserAnnotationQuery,
@@ -93,6 +98,7 @@ from .models import (
     Project,
     CaseAwareProject,
     SmallVariant,
+    SmallVariantAnnotationSummary,
     SmallVariantFlags,
     SmallVariantComment,
     SmallVariantQuery,
@@ -103,10 +109,12 @@ from .models import (
     annotate_with_joint_scores,
     AcmgCriteriaRating,
     SyncCaseListBgJob,
+    SampleSiteGenotypes,
     SmallVariantSet,
     ImportVariantsBgJob,
     CaseComments,
     CASE_STATUS_CHOICES,
+    EXPORT_FILE_EXTENSIONS,
     RowWithAffectedCasesPerGene,
     SmallVariantSummary,
     KioskAnnotateBgJob,
@@ -156,6 +164,9 @@ from .tasks import (
 from .file_export import RowWithSampleProxy
 from .templatetags.variants_tags import get_term_description, smallvar_description
 
+np = LazyModule("numpy")
+xlsxwriter = LazyModule("xlsxwriter")
+
 
 class UUIDEncoder(json.JSONEncoder):
     """JSON encoder for UUIds"""
@@ -255,12 +266,7 @@ class CaseListGetAnnotationsView(
     def get(self, *args, **kwargs):
         result = dict()
         result["project"] = CaseAwareProject.objects.prefetch_related(
-            "case_set__small_variant_comments",
-            "case_set__small_variant_flags",
-            "case_set__acmg_ratings",
-            "case_set__structural_variant_comments",
-            "case_set__structural_variant_flags",
-            "case_set__acmg_ratings",
+            "case_set__structural_variant_comments", "case_set__structural_variant_flags",
         ).get(sodar_uuid=kwargs["project"])
         result["limit"] = 100
         result["annotation_count"] = result["project"].get_annotation_count()
@@ -271,81 +277,78 @@ class CaseListGetAnnotationsView(
         return render(self.request, self.template_name, self.get_context_data(**result),)
 
     def join_small_var_comments_and_flags(self, project, limit):
-        def get_gene_symbol(release, chromosome, start, end):
-            bins = binning.containing_bins(start - 1, end)
-            gene_intervals = list(
-                GeneInterval.objects.filter(
-                    database="ensembl",
-                    release=release,
-                    chromosome=chromosome,
-                    bin__in=bins,
-                    start__lte=end,
-                    end__gte=start,
-                )
-            )
-            gene_ids = [itv.gene_id for itv in gene_intervals]
-            symbols1 = {
-                o.gene_symbol
-                for o in EnsemblToGeneSymbol.objects.filter(ensembl_gene_id__in=gene_ids)
-            }
-            symbols2 = {o.symbol for o in Hgnc.objects.filter(ensembl_gene_id__in=gene_ids)}
-            return symbols1 | symbols2
-
         result = defaultdict(
             lambda: defaultdict(
                 lambda: dict(flags=None, comments=[], genes=set(), acmg_rating=None)
             )
         )
+        # The positions of the annotations of each variant and case, their genes are resolved in one query below.
+        positions = defaultdict(set)
+
+        # Select the most recently annotated variants from the summaries and load only their annotations.
+        summaries = (
+            SmallVariantAnnotationSummary.objects.filter(case__project=project)
+            .select_related("case")
+            .order_by("-date_modified")
+        )
+        if limit:
+            summaries = summaries[:limit]
+        cases = {}
+        selection = Q(pk__in=[])
+        for summary in summaries:
+            key = (summary.chromosome, summary.start, summary.reference, summary.alternative)
+            # Create the entry such that the variants are ordered by the time of their last annotation.
+            result[key][summary.case]
+            cases[summary.case_id] = summary.case
+            selection |= Q(
+                case_id=summary.case_id,
+                release=summary.release,
+                chromosome=summary.chromosome,
+                start=summary.start,
+                end=summary.end,
+                reference=summary.reference,
+                alternative=summary.alternative,
+            )
+        if not cases:
+            return {}
 
-        gene_symbol_cache = dict()
+        for record in SmallVariantFlags.objects.filter(selection):
+            key = (record.chromosome, record.start, record.reference, record.alternative)
+            case = cases[record.case_id]
+            result[key][case]["flags"] = model_to_dict(record)
+            positions[(key, case)].add(
+                (record.release, record.chromosome, record.start, record.end)
+            )
 
-        for case in project.case_set.all():
-            flags = case.small_variant_flags.all()
-            comments = case.small_variant_comments.all()
-            acmg_ratings = case.acmg_ratings.all()
+        for record in SmallVariantComment.objects.filter(selection).select_related("user"):
+            key = (record.chromosome, record.start, record.reference, record.alternative)
+            case = cases[record.case_id]
+            result[key][case]["comments"].append(
+                {
+                    **model_to_dict(record),
+                    "date_created": record.date_created,
+                    "user": record.user,
+                    "username": record.user.username,
+                }
+            )
+            positions[(key, case)].add(
+                (record.release, record.chromosome, record.start, record.end)
+            )
 
-            for record in flags:
-                position_key = (record.release, record.chromosome, record.start, record.end)
-                if not position_key in gene_symbol_cache:
-                    gene_symbol_cache[position_key] = get_gene_symbol(*position_key)
-                result[(record.chromosome, record.start, record.reference, record.alternative)][
-                    case
-                ]["flags"] = model_to_dict(record)
-                result[(record.chromosome, record.start, record.reference, record.alternative)][
-                    case
-                ]["genes"] |= gene_symbol_cache[position_key]
+        for record in AcmgCriteriaRating.objects.filter(selection):
+            key = (record.chromosome, record.start, record.reference, record.alternative)
+            case = cases[record.case_id]
+            result[key][case]["acmg_rating"] = {"data": record, "class": record.acmg_class}
+            positions[(key, case)].add(
+                (record.release, record.chromosome, record.start, record.end)
+            )
 
-            for record in comments:
-                position_key = (record.release, record.chromosome, record.start, record.end)
-                if not position_key in gene_symbol_cache:
-                    gene_symbol_cache[position_key] = get_gene_symbol(*position_key)
-                result[(record.chromosome, record.start, record.reference, record.alternative)][
-                    case
-                ]["comments"].append(
-                    {
-                        **model_to_dict(record),
-                        "date_created": record.date_created,
-                        "user": record.user,
-                        "username": record.user.username,
-                    }
-                )
-                result[(record.chromosome, record.start, record.reference, record.alternative)][
-                    case
-                ]["genes"] |= gene_symbol_cache[position_key]
-
-            for record in acmg_ratings:
-                position_key = (record.release, record.chromosome, record.start, record.end)
-                if not position_key in gene_symbol_cache:
-                    gene_symbol_cache[position_key] = get_gene_symbol(*position_key)
-                result[(record.chromosome, record.start, record.reference, record.alternative)][
-                    case
-                ]["acmg_rating"] = {"data": record, "class": record.acmg_class}
-                result[(record.chromosome, record.start, record.reference, record.alternative)][
-                    case
-                ]["genes"] |= gene_symbol_cache[position_key]
-
-            if limit and len(result) > limit:
-                break
+        gene_symbols = GeneSymbolsAtPositionsQuery(get_engine()).run(
+            chain.from_iterable(positions.values())
+        )
+        for (key, case), case_positions in positions.items():
+            for position in case_positions:
+                result[key][case]["genes"] |= gene_symbols[position]
 
         for variant, data in result.items():
             result[variant] = dict(data)
@@ -1657,9 +1660,12 @@ class SmallVariantsDeleteView(
                 status_type="OK",
             )
             tl_event.add_object(obj=case, label="case", name=case.name)
+        remove_case_counts(get_engine(), case)
         for query in DeleteSmallVariantsQuery(get_engine()).run(case_id=case.id):
             with contextlib.closing(query):
                 pass
+        # Force recomputation of the case's relatedness in the project-wide statistics.
+        SampleSiteGenotypes.objects.filter(variant_set__case=case).delete()
         update_variant_counts(case)
         with transaction.atomic():
             # Construct background job objects
@@ -3009,48 +3015,57 @@ class SmallVariantDetails(
             )
         return super().get_queryset()
 
-    def _load_knowngene_aa(self, query_kwargs):
-        """Load the UCSC knownGeneAA conservation alignment information."""
-        query = KnownGeneAAQuery(self.get_alchemy_engine())
-        result = []
-        with contextlib.closing(query.run(query_kwargs)) as _result:
-            for entry in _result:
-                result.append(
-                    {
-                        "chromosome": entry.chromosome,
-                        "start": entry.start,
-                        "end": entry.end,
-                        "alignment": entry.alignment,
-                    }
-                )
-        return result
+    def _load_records(self, kwargs):
+        """Load the records of all tables keyed by the variant's coordinates in one query."""
 
-    def _load_clinvar(self, query_kwargs):
-        """Load clinvar information"""
-        filter_args = {
-            "release": query_kwargs["release"],
-            "chromosome": query_kwargs["chromosome"],
-            "start": int(query_kwargs["start"]),
-            "end": int(query_kwargs["end"]),
-            "reference": query_kwargs["reference"],
-            "alternative": query_kwargs["alternative"],
+        def in_case(model):
+            return and_(model.sa.case_id == self.object.pk, variant_condition(model, kwargs))
+
+        selections = {
+            "clinvar": (Clinvar, variant_condition(Clinvar, kwargs)),
+            "knowngeneaa": (KnowngeneAA, KnownGeneAAQuery.condition(kwargs)),
+            "small_var": (SmallVariant, in_case(SmallVariant)),
+            "comments": (SmallVariantComment, in_case(SmallVariantComment)),
+            "flags": (SmallVariantFlags, in_case(SmallVariantFlags)),
+            **self.get_extra_anno_selections(kwargs),
         }
-        records = Clinvar.objects.filter(**filter_args)
-        if records:
-            return records.first()
+        if kwargs["chromosome"] == "MT":
+            # All alleles at the position are loaded from the mitochondrial databases.
+            selections.update(
+                {
+                    dbname: (db, variant_condition(db, kwargs, VARIANT_KEYS[:-1]))
+                    for dbname, db in MT_DB_INFO.items()
+                }
+            )
         else:
-            return None
-
-    def _load_small_var(self, kwargs):
-        return SmallVariant.objects.filter(
-            case_id=self.object.pk,
-            release=kwargs["release"],
-            chromosome=kwargs["chromosome"],
-            start=kwargs["start"],
-            end=kwargs["end"],
-            reference=kwargs["reference"],
-            alternative=kwargs["alternative"],
-        ).first()
+            selections.update(self.get_frequency_selections(kwargs))
+            selections["inhouse"] = (
+                SmallVariantSummary,
+                variant_condition(SmallVariantSummary, kwargs),
+            )
+        return load_model_records(self.get_alchemy_engine(), selections)
+
+    def _load_knowngene_aa(self, records):
+        """Return the UCSC knownGeneAA conservation alignment information, one per position."""
+        result = {}
+        for entry in sorted(records["knowngeneaa"], key=lambda entry: (entry.start, entry.end)):
+            result.setdefault(
+                (entry.release, entry.chromosome, entry.start, entry.end),
+                {
+                    "chromosome": entry.chromosome,
+                    "start": entry.start,
+                    "end": entry.end,
+                    "alignment": entry.alignment,
+                },
+            )
+        return list(result.values())
+
+    def _load_clinvar(self, records):
+        """Return clinvar information"""
+        return min(records["clinvar"], key=lambda record: record.pk, default=None)
+
+    def _load_small_var(self, records):
+        return min(records["small_var"], key=lambda record: record.pk, default=None)
 
     def _load_molecular_impact(self, kwargs):
         """Load molecular impact from Jannovar REST API if configured."""
@@ -3086,7 +3101,7 @@ class SmallVariantDetails(
                 "ERROR: Server at {} not responding.".format(settings.VARFISH_JANNOVAR_REST_API_URL)
             ) from e
 
-    def _get_population_freqs(self, kwargs):
+    def _get_population_freqs(self, kwargs, records):
         if kwargs.get("chromosome") == "MT":
             return {}
         result = {
@@ -3099,7 +3114,7 @@ class SmallVariantDetails(
             "exac": "ExAC",
             "thousandgenomes": "1000GP",
         }
-        frequencies = self.get_frequencies(kwargs)
+        frequencies = self.get_frequencies(kwargs, records)
         for key, label in db_infos.items():
             pop_freqs = {}
             for pop in result["populations"]:
@@ -3145,14 +3160,7 @@ class SmallVariantDetails(
                         0.0,
                     )
             result["pop_freqs"][label] = pop_freqs
-        inhouse = SmallVariantSummary.objects.filter(
-            release=kwargs["release"],
-            chromosome=kwargs["chromosome"],
-            start=int(kwargs["start"]),
-            end=int(kwargs["end"]),
-            reference=kwargs["reference"],
-            alternative=kwargs["alternative"],
-        )
+        inhouse = records["inhouse"]
         result["inhouse_freq"] = {}
         if inhouse and not settings.KIOSK_MODE:
             hom = getattr(inhouse[0], "count_hom_alt", 0)
@@ -3166,7 +3174,7 @@ class SmallVariantDetails(
             }
         return result
 
-    def _get_mitochondrial_freqs(self, kwargs):
+    def _get_mitochondrial_freqs(self, kwargs, records):
         if not kwargs.get("chromosome") == "MT":
             return {}
         result = {
@@ -3188,13 +3196,7 @@ class SmallVariantDetails(
                 if len(kwargs.get("reference")) > 1
                 else {}
             )
-            alts = db.objects.filter(
-                release=kwargs["release"],
-                chromosome=kwargs["chromosome"],
-                start=int(kwargs["start"]),
-                end=int(kwargs["end"]),
-                reference=kwargs["reference"],
-            )
+            alts = records[dbname]
             if alts:
                 an = alts[0].an
                 ref_count = an
@@ -3257,50 +3259,42 @@ class SmallVariantDetails(
             )
         return result
 
-    def _load_variant_comments(self):
-        return SmallVariantComment.objects.select_related("user").filter(
-            case=self.object,
-            release=self.kwargs["release"],
-            chromosome=self.kwargs["chromosome"],
-            start=int(self.kwargs["start"]),
-            end=int(self.kwargs["end"]),
-            reference=self.kwargs["reference"],
-            alternative=self.kwargs["alternative"],
+    def _load_variant_comments(self, records):
+        comments = sorted(
+            records["comments"], key=lambda comment: (comment.date_created, comment.pk)
         )
+        users = User.objects.in_bulk({comment.user_id for comment in comments if comment.user_id})
+        for comment in comments:
+            if comment.user_id:
+                comment.user = users[comment.user_id]
+        return comments
 
-    def _load_variant_flags(self):
-        return SmallVariantFlags.objects.filter(
-            case=self.object,
-            release=self.kwargs["release"],
-            chromosome=self.kwargs["chromosome"],
-            start=int(self.kwargs["start"]),
-            end=int(self.kwargs["end"]),
-            reference=self.kwargs["reference"],
-            alternative=self.kwargs["alternative"],
-        ).first()
+    def _load_variant_flags(self, records):
+        return min(records["flags"], key=lambda record: record.pk, default=None)
 
     def get_context_data(self, object):
         result = super().get_context_data(*self.args, **self.kwargs)
         result["database"] = self.kwargs["database"]
-        result["clinvar"] = self._load_clinvar(self.kwargs)
-        result["knowngeneaa"] = self._load_knowngene_aa(self.kwargs)
-        result["small_var"] = self._load_small_var(self.kwargs)
+        records = self._load_records(self.kwargs)
+        result["clinvar"] = self._load_clinvar(records)
+        result["knowngeneaa"] = self._load_knowngene_aa(records)
+        result["small_var"] = self._load_small_var(records)
         result["effect_details"] = self._load_molecular_impact(self.kwargs)
-        result["extra_annos"] = self.get_extra_annos(self.kwargs)
+        result["extra_annos"] = self.get_extra_annos(self.kwargs, records)
         if self.request.GET.get("render_full", "no").lower() in ("yes", "true"):
             result["base_template"] = "projectroles/base.html"
         else:
             result["base_template"] = "empty_base.html"
-        result.update(self._get_population_freqs(self.kwargs))
-        result["mitochondrial_freqs"] = self._get_mitochondrial_freqs(self.kwargs)
+        result.update(self._get_population_freqs(self.kwargs, records))
+        result["mitochondrial_freqs"] = self._get_mitochondrial_freqs(self.kwargs, records)
         result["gene"] = get_gene_infos(
             self.kwargs["database"], self.kwargs["gene_id"], self.kwargs["ensembl_transcript_id"]
         )
         entrez_id = result["small_var"].refseq_gene_id
         result["ncbi_summary"] = NcbiGeneInfo.objects.filter(entrez_id=entrez_id).first()
         result["ncbi_gene_rifs"] = NcbiGeneRif.objects.filter(entrez_id=entrez_id).order_by("pk")
-        result["comments"] = self._load_variant_comments()
-        result["flags"] = self._load_variant_flags()
+        result["comments"] = self._load_variant_comments(records)
+        result["flags"] = self._load_variant_flags(records)
         result["training_mode"] = int(self.kwargs["training_mode"])
         result["user"] = self.request.user
         return result
@@ -3449,6 +3443,66 @@ class ExportFileJobResubmitView(
         return redirect(export_job.get_absolute_url())
 
 
+#: Content types of the export file types.
+EXPORT_FILE_CONTENT_TYPES = {
+    "tsv": "text/tab-separated-values",
+    "vcf": "text/plain+gzip",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+#: Regular expression for a single byte range in a ``Range`` header.
+RANGE_HEADER_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _iter_file_range(file, length, chunk_size=FileResponse.block_size):
+    """Yield ``length`` bytes from the current position of ``file`` in chunks, then close it."""
+    try:
+        while length > 0:
+            chunk = file.read(min(length, chunk_size))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def export_file_response(request, file, file_type, uuid):
+    """Return response that streams the exported ``file`` from the storage as an attachment.
+
+    A single byte range of the file can be requested with the HTTP ``Range`` header.
+    """
+    size = file.size
+    match = RANGE_HEADER_RE.match(request.META.get("HTTP_RANGE", "").strip())
+    if match and any(match.groups()):
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+        if start > end:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */%d" % size
+            return response
+        file.open("rb")
+        file.seek(start)
+        response = StreamingHttpResponse(
+            _iter_file_range(file, end - start + 1),
+            status=206,
+            content_type=EXPORT_FILE_CONTENT_TYPES[file_type],
+        )
+        response["Content-Range"] = "bytes %d-%d/%d" % (start, end, size)
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        response = FileResponse(file.open("rb"), content_type=EXPORT_FILE_CONTENT_TYPES[file_type])
+    response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = 'attachment; filename="%(name)s%(ext)s"' % {
+        "name": "varfish_%s_%s" % (timezone.now().strftime("%Y-%m-%d_%H:%M:%S.%f"), uuid),
+        "ext": EXPORT_FILE_EXTENSIONS[file_type],
+    }
+    return response
+
+
 class ExportProjectCasesFileJobDownloadView(
     LoginRequiredMixin,
     LoggedInPermissionMixin,
@@ -3471,22 +3525,10 @@ class ExportProjectCasesFileJobDownloadView(
 
     def get(self, *args, **kwargs):
         try:
-            content_types = {
-                "tsv": "text/tab-separated-values",
-                "vcf": "text/plain+gzip",
-                "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            }
-            extensions = {"tsv": ".tsv", "vcf": ".vcf.gz", "xlsx": ".xlsx"}
             obj = self.get_object()
-            response = HttpResponse(
-                obj.export_result.payload, content_type=content_types[obj.file_type]
+            return export_file_response(
+                self.request, obj.export_result.file, obj.file_type, obj.project.sodar_uuid
             )
-            response["Content-Disposition"] = 'attachment; filename="%(name)s%(ext)s"' % {
-                "name": "varfish_%s_%s"
-                % (timezone.now().strftime("%Y-%m-%d_%H:%M:%S.%f"), obj.project.sodar_uuid),
-                "ext": extensions[obj.file_type],
-            }
-            return response
         except ObjectDoesNotExist as e:
             raise Http404("File has not been generated (yet)!") from e
 
@@ -3571,22 +3613,10 @@ class ExportFileJobDownloadView(
 
     def get(self, *args, **kwargs):
         try:
-            content_types = {
-                "tsv": "text/tab-separated-values",
-                "vcf": "text/plain+gzip",
-                "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            }
-            extensions = {"tsv": ".tsv", "vcf": ".vcf.gz", "xlsx": ".xlsx"}
             obj = self.get_object()
-            response = HttpResponse(
-                obj.export_result.payload, content_type=content_types[obj.file_type]
+            return export_file_response(
+                self.request, obj.export_result.file, obj.file_type, obj.case.sodar_uuid
             )
-            response["Content-Disposition"] = 'attachment; filename="%(name)s%(ext)s"' % {
-                "name": "varfish_%s_%s"
-                % (timezone.now().strftime("%Y-%m-%d_%H:%M:%S.%f"), obj.case.sodar_uuid),
-                "ext": extensions[obj.file_type],
-            }
-            return response
         except ObjectDoesNotExist as e:
             raise Http404("File has not been generated (yet)!") from e
 